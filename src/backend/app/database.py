@@ -0,0 +1,96 @@
+import os
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.orm import sessionmaker
+from models import Base, AlbumImage, MusicAudio
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATABASE_URL = os.path.join(BASE_DIR, 'database.db')
+
+# Statement logging is opt-in; it dominates the cost of large uploads
+SQL_ECHO = os.environ.get("SQL_ECHO", "0") == "1"
+
+# WAL lets readers keep going while an upload or sync writes. With WAL,
+# synchronous=NORMAL only syncs at checkpoints, which is still safe
+# against application crashes.
+SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL")
+# Page cache per connection in KiB, and how much of the file to memory-map
+SQLITE_CACHE_SIZE_KB = int(os.environ.get("SQLITE_CACHE_SIZE_KB", 64 * 1024))
+SQLITE_MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+# Seconds a writer waits for another worker's write lock before failing
+SQLITE_BUSY_TIMEOUT = float(os.environ.get("SQLITE_BUSY_TIMEOUT", 30))
+
+# Every uvicorn worker is its own process with its own pool. Size it for
+# one worker's concurrent requests plus the background sync/index threads;
+# SQLite still serialises writers across all of them.
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 8))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 8))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 30))
+
+engine = create_engine(
+    f'sqlite:///{DATABASE_URL}',
+    echo=SQL_ECHO,
+    connect_args={"timeout": SQLITE_BUSY_TIMEOUT, "check_same_thread": False},
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+)
+
+@event.listens_for(engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+    finally:
+        cursor.close()
+
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+MEDIA_MODELS = (AlbumImage, MusicAudio)
+
+def add_file_stat_columns(engine):
+    """Add the size/mtime columns to databases created before they existed."""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for model in MEDIA_MODELS:
+            columns = {column["name"] for column in inspector.get_columns(model.__tablename__)}
+            if "size" not in columns:
+                conn.execute(text(f"ALTER TABLE {model.__tablename__} ADD COLUMN size INTEGER"))
+            if "mtime" not in columns:
+                conn.execute(text(f"ALTER TABLE {model.__tablename__} ADD COLUMN mtime FLOAT"))
+
+def add_unique_name_indexes(engine):
+    """Create the unique name indexes on databases created before they existed.
+
+    Older databases can hold several rows per name; the oldest row (lowest
+    id) is kept so the unique index can be built.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for model in MEDIA_MODELS:
+            table = model.__tablename__
+            index_name = f"ix_{table}_name"
+            if index_name in {index["name"] for index in inspector.get_indexes(table)}:
+                continue
+            removed = conn.execute(text(
+                f"DELETE FROM {table} WHERE id NOT IN (SELECT MIN(id) FROM {table} GROUP BY name)"
+            )).rowcount
+            if removed:
+                print(f"{table}: removed {removed} rows with duplicate names")
+            conn.execute(text(f"CREATE UNIQUE INDEX {index_name} ON {table} (name)"))
+
+def init_db():
+    """Create missing tables and bring existing databases up to the current schema."""
+    Base.metadata.create_all(engine)
+    add_file_stat_columns(engine)
+    add_unique_name_indexes(engine)
+
+def get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
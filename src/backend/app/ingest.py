@@ -0,0 +1,467 @@
+import os
+import time
+import hashlib
+import tempfile
+import zipfile
+from sqlalchemy import select, insert, update, delete
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from models import AlbumImage, MusicAudio, ContentHash, FileAlias
+
+# Rows written per INSERT/UPDATE statement and per commit during uploads
+INGEST_BATCH_SIZE = int(os.environ.get("INGEST_BATCH_SIZE", 1000))
+# Rows per statement when reconciling the tables with the media folders
+SYNC_BATCH_SIZE = 500
+# Buffer used when streaming an archive member to disk
+COPY_BUFFER_SIZE = 1024 * 1024
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif')
+AUDIO_EXTENSIONS = ('.mid', '.midi')
+# Uploads are written to hidden "<.name>.<random>.part" files next to their
+# destination and renamed into place; a crash can leave them behind
+PART_PREFIX, PART_SUFFIX = '.', '.part'
+# Leftover .part files older than this are removed at startup; younger ones
+# may still be written by another worker
+PART_MAX_AGE_SECONDS = float(os.environ.get("PART_MAX_AGE_SECONDS", 3600))
+
+def is_partial_upload(name: str) -> bool:
+    # Also matches the "<name>.part" files earlier versions wrote
+    return name.endswith(PART_SUFFIX)
+
+def remove_partial_uploads(folder: str, max_age: float = PART_MAX_AGE_SECONDS) -> int:
+    """Delete .part files an interrupted upload left in folder; returns how many."""
+    removed = 0
+    cutoff = time.time() - max_age
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if is_partial_upload(entry.name) and entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed += 1
+    if removed:
+        print(f"Removed {removed} partial uploads from {folder}")
+    return removed
+
+def upsert_by_name(model):
+    """INSERT that updates path and stat of an existing row with the same name.
+
+    The check happens inside SQLite, against the unique name index, so two
+    workers inserting the same name can't both pass a SELECT and then fail
+    on the constraint. Existing rows keep their id.
+    """
+    stmt = sqlite_insert(model)
+    return stmt.on_conflict_do_update(
+        index_elements=[model.name],
+        set_={"path": stmt.excluded.path, "size": stmt.excluded.size, "mtime": stmt.excluded.mtime},
+    )
+
+def iter_zip_members(zip_ref: zipfile.ZipFile, extensions):
+    """(member info, base file name) of every file in the archive with one of the extensions.
+
+    Only the central directory is consulted, so members that are filtered
+    out are never read or decompressed. Directory parts of member names
+    are dropped, which also keeps "../" entries inside the destination.
+    """
+    for info in zip_ref.infolist():
+        if info.is_dir():
+            continue
+        filename = os.path.basename(info.filename.replace('\\', '/'))
+        if filename and filename.lower().endswith(extensions):
+            yield info, filename
+
+def copy_hashed(source, target) -> str:
+    """Copy source to target in fixed-size chunks and return the blake2b digest of the data."""
+    digest = hashlib.blake2b(digest_size=20)
+    while True:
+        chunk = source.read(COPY_BUFFER_SIZE)
+        if not chunk:
+            break
+        digest.update(chunk)
+        target.write(chunk)
+    return digest.hexdigest()
+
+def hash_file(path: str) -> str:
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(COPY_BUFFER_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def scan_folder(folder: str, include) -> dict:
+    """name -> (size, mtime) of the regular files in folder accepted by include, minus unfinished uploads."""
+    files = {}
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if include(entry.name) and not is_partial_upload(entry.name) and entry.is_file():
+                stat = entry.stat()
+                files[entry.name] = (stat.st_size, stat.st_mtime)
+    return files
+
+def reconcile_table(db: Session, model, files: dict, url_prefix: str, indexed_names=frozenset()):
+    """Bring one table in line with a folder listing without touching unchanged rows.
+
+    New files are bulk-inserted, vanished ones bulk-deleted and changed
+    ones (size or mtime differs) updated in place, so existing IDs stay
+    stable. Rows from before the stat columns existed only get their stat
+    filled in. Returns (names the indexes must (re)read, removed names);
+    files that only lacked a row and are already in indexed_names are
+    left out, so a lost database doesn't re-index the whole catalogue.
+    """
+    rows = {}
+    duplicate_ids = []
+    for row_id, name, size, mtime in db.query(model.id, model.name, model.size, model.mtime).order_by(model.id):
+        if name in rows:
+            duplicate_ids.append(row_id)
+        else:
+            rows[name] = (row_id, size, mtime)
+
+    new_rows, stat_updates, changed, removed_ids, removed = [], [], [], list(duplicate_ids), []
+    for name, (size, mtime) in files.items():
+        if name not in rows:
+            new_rows.append({"name": name, "path": f"{url_prefix}/{name}", "size": size, "mtime": mtime})
+            if name not in indexed_names:
+                changed.append(name)
+            continue
+        row_id, stored_size, stored_mtime = rows[name]
+        if stored_size is None or stored_mtime is None:
+            stat_updates.append({"id": row_id, "size": size, "mtime": mtime})
+        elif stored_size != size or stored_mtime != mtime:
+            stat_updates.append({"id": row_id, "size": size, "mtime": mtime})
+            changed.append(name)
+    for name, (row_id, _, _) in rows.items():
+        if name not in files:
+            removed_ids.append(row_id)
+            removed.append(name)
+
+    for start in range(0, len(new_rows), SYNC_BATCH_SIZE):
+        # Another worker syncing at the same time may have inserted the row already
+        db.execute(upsert_by_name(model), new_rows[start:start + SYNC_BATCH_SIZE])
+    for start in range(0, len(stat_updates), SYNC_BATCH_SIZE):
+        db.execute(update(model), stat_updates[start:start + SYNC_BATCH_SIZE])
+    for start in range(0, len(removed_ids), SYNC_BATCH_SIZE):
+        db.execute(delete(model).where(model.id.in_(removed_ids[start:start + SYNC_BATCH_SIZE])))
+
+    print(f"{model.__tablename__}: {len(new_rows)} added, {len(stat_updates)} updated, "
+          f"{len(removed)} removed, {len(changed)} to index")
+    return changed, removed
+
+def sync_content_hashes(db: Session, model, folder: str, names, changed):
+    """Bring the content table in line with a folder listing during a sync.
+
+    Files without a digest (added outside an upload, or from before the
+    table existed) and changed files are hashed; rows of files that are
+    gone are dropped. When several files in the folder share content the
+    first one hashed stays canonical. Nothing is committed here.
+
+    Aliases of a canonical file that changed or disappeared move to
+    another file that still holds the old content. Without one, aliases
+    of a changed file stay on it (the name still resolves), while those of
+    a vanished file are dropped, as nothing is left to resolve them to.
+    Alias names that now exist as files themselves stop being aliases.
+    """
+    kind = model.__tablename__
+    names = set(names)
+    stored = dict(db.execute(
+        select(ContentHash.name, ContentHash.digest).where(ContentHash.kind == kind)
+    ).all())
+    aliases = load_aliases(db, model)
+    stale = [name for name in stored if name not in names or name in changed]
+
+    hashed = {
+        name: hash_file(os.path.join(folder, name))
+        for name in sorted(names) if name not in stored or name in changed
+    }
+    claimed = {digest: name for name, digest in stored.items() if name not in stale}
+    heirs = {}
+    for name, digest in hashed.items():
+        if digest not in claimed:
+            claimed[digest] = name
+            heirs[name] = digest
+
+    alias_of = {}
+    for alias, canonical in aliases.items():
+        alias_of.setdefault(canonical, []).append(alias)
+    repointed, dropped = {}, [alias for alias in aliases if alias in names]
+    for name in stale:
+        if name not in alias_of:
+            continue
+        heir = claimed.get(stored[name])
+        if heir is not None and heir != name:
+            repointed.update((alias, heir) for alias in alias_of[name] if alias not in names)
+        elif name not in names:
+            print(f"{kind}: content of {name} is gone, dropping its aliases {sorted(alias_of[name])}")
+            dropped.extend(alias_of[name])
+
+    for start in range(0, len(stale), INGEST_BATCH_SIZE):
+        db.execute(delete(ContentHash).where(
+            ContentHash.kind == kind, ContentHash.name.in_(stale[start:start + INGEST_BATCH_SIZE])))
+    rows = [{"kind": kind, "digest": digest, "name": name} for name, digest in heirs.items()]
+    for start in range(0, len(rows), INGEST_BATCH_SIZE):
+        db.execute(insert(ContentHash), rows[start:start + INGEST_BATCH_SIZE])
+
+    changed_aliases = list(repointed) + dropped
+    for start in range(0, len(changed_aliases), INGEST_BATCH_SIZE):
+        db.execute(delete(FileAlias).where(
+            FileAlias.kind == kind, FileAlias.name.in_(changed_aliases[start:start + INGEST_BATCH_SIZE])))
+    alias_rows = [{"kind": kind, "name": alias, "canonical_name": heir} for alias, heir in repointed.items()]
+    for start in range(0, len(alias_rows), INGEST_BATCH_SIZE):
+        db.execute(insert(FileAlias), alias_rows[start:start + INGEST_BATCH_SIZE])
+    return len(rows)
+
+def load_aliases(db: Session, model) -> dict:
+    """alias name -> canonical name for one kind of media."""
+    return dict(db.execute(
+        select(FileAlias.name, FileAlias.canonical_name).where(FileAlias.kind == model.__tablename__)
+    ).all())
+
+class BulkIngestor:
+    """Buffers uploaded-file rows and writes them in batches with Core statements.
+
+    Rows are keyed by name: a name already in the table has its path and
+    stat updated in place (keeping its id), a new one is inserted. Each
+    full batch is written with one executemany upsert and then committed,
+    so a large archive never holds one huge transaction or thousands of
+    ORM objects. An upload is therefore not atomic: when
+    it fails, the batches already committed stay, and committed /
+    committed_removed tell the caller which files the indexes must learn
+    about.
+
+    store() also deduplicates by content: every file is hashed while it
+    is written, and content already on disk under another name is kept
+    only as an alias of that canonical file, with no media row, so it is
+    never feature-extracted or indexed a second time. The content and
+    alias tables are held in memory for the upload; changed digests and
+    alias names are written back with each batch.
+    """
+
+    def __init__(self, db: Session, batch_size: int = INGEST_BATCH_SIZE):
+        self.db = db
+        self.batch_size = max(1, batch_size)
+        self.pending = {AlbumImage: {}, MusicAudio: {}}
+        self.pending_removed = {AlbumImage: set(), MusicAudio: set()}
+        self.rows_written = 0
+        # Per model, loaded on first store(): digest -> canonical name and
+        # its reverse, alias -> canonical name and canonical -> its aliases
+        self.digests = {}
+        self.digest_of = {}
+        self.aliases = {}
+        self.alias_names = {}
+        # Digests and alias names changed since the last batch, per model
+        self.dirty_digests = {AlbumImage: set(), MusicAudio: set()}
+        self.dirty_aliases = {AlbumImage: set(), MusicAudio: set()}
+        # Names whose row, or whose removal, has been committed, per model
+        self.committed = {AlbumImage: set(), MusicAudio: set()}
+        self.committed_removed = {AlbumImage: set(), MusicAudio: set()}
+        self.duplicates = 0
+
+    def add(self, model, name: str, db_path: str, file_path: str = None):
+        row = {"name": name, "path": db_path, "size": None, "mtime": None}
+        if file_path is not None:
+            stat = os.stat(file_path)
+            row["size"], row["mtime"] = stat.st_size, stat.st_mtime
+        # A name seen twice in one upload keeps its last row
+        self.pending[model][name] = row
+        self.pending_removed[model].discard(name)
+        self._flush_if_full(model)
+
+    def store(self, model, name: str, db_path: str, source, destination_path: str):
+        """Write source to destination_path unless its content is already stored.
+
+        Returns None when the file was written and queued like add(), or
+        the canonical name holding the same content. In that case nothing
+        is written; if name differs it becomes an alias of the canonical
+        file, and a file previously uploaded under name is removed.
+
+        Before a canonical file is overwritten or removed, its content is
+        moved to one of its aliases (see _hand_over), so no alias is left
+        pointing at content that no longer exists.
+        """
+        self._load(model)
+        folder = os.path.dirname(destination_path)
+        fd, part_path = tempfile.mkstemp(dir=folder, prefix=f"{PART_PREFIX}{name}.", suffix=PART_SUFFIX)
+        try:
+            with os.fdopen(fd, 'wb') as target:
+                digest = copy_hashed(source, target)
+            canonical = self.digests[model].get(digest)
+            if canonical is not None and os.path.exists(os.path.join(folder, canonical)):
+                self.duplicates += 1
+                if canonical != name:
+                    if os.path.exists(destination_path):
+                        self._hand_over(model, name, destination_path, db_path)
+                        if os.path.exists(destination_path):
+                            os.remove(destination_path)
+                        self.pending_removed[model].add(name)
+                    self.pending[model].pop(name, None)
+                    self._set_alias(model, name, canonical)
+                    self._flush_if_full(model)
+                return canonical
+            self._hand_over(model, name, destination_path, db_path)
+            os.replace(part_path, destination_path)
+        finally:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+
+        # name now holds this content and nothing else
+        self._set_digest(model, name, digest)
+        self._set_alias(model, name, None)
+        self.add(model, name, db_path, destination_path)
+        return None
+
+    def flush(self):
+        for model in self.pending:
+            self._flush_model(model)
+        return self.rows_written
+
+    def _load(self, model):
+        if model in self.digests:
+            return
+        rows = self.db.execute(
+            select(ContentHash.digest, ContentHash.name).where(ContentHash.kind == model.__tablename__)
+        ).all()
+        self.digests[model] = dict(rows)
+        self.digest_of[model] = {name: digest for digest, name in rows}
+        self.aliases[model] = load_aliases(self.db, model)
+        self.alias_names[model] = {}
+        for alias, canonical in self.aliases[model].items():
+            self.alias_names[model].setdefault(canonical, set()).add(alias)
+
+    def _set_digest(self, model, name, digest):
+        """Make name the canonical file of digest (None: of nothing)."""
+        old_digest = self.digest_of[model].pop(name, None)
+        if old_digest is not None:
+            del self.digests[model][old_digest]
+            self.dirty_digests[model].add(old_digest)
+        if digest is not None:
+            self.digests[model][digest] = name
+            self.digest_of[model][name] = digest
+            self.dirty_digests[model].add(digest)
+
+    def _set_alias(self, model, name, canonical):
+        """Point alias name at canonical (None: name is no alias)."""
+        old = self.aliases[model].pop(name, None)
+        if old is not None:
+            self.alias_names[model][old].discard(name)
+        if canonical is not None:
+            self.aliases[model][name] = canonical
+            self.alias_names[model].setdefault(canonical, set()).add(name)
+        if old != canonical:
+            self.dirty_aliases[model].add(name)
+
+    def _hand_over(self, model, name, path, db_path):
+        """Release name's content before its file at path is overwritten or removed.
+
+        If name has aliases, its file is renamed to the first one, which
+        becomes the canonical file (with a media row), and the other
+        aliases are re-pointed to it.
+        """
+        digest = self.digest_of[model].get(name)
+        self._set_digest(model, name, None)
+        aliases = sorted(self.alias_names[model].get(name, ()))
+        if not aliases:
+            return
+        if not os.path.exists(path):
+            # Their content was already gone; nothing is left to hand over
+            for alias in aliases:
+                self._set_alias(model, alias, None)
+            return
+
+        heir, others = aliases[0], aliases[1:]
+        heir_path = os.path.join(os.path.dirname(path), heir)
+        os.replace(path, heir_path)
+        print(f"{name} is replaced, its content moves to its alias {heir}")
+        self._set_alias(model, heir, None)
+        if digest is not None:
+            self._set_digest(model, heir, digest)
+        for alias in others:
+            self._set_alias(model, alias, heir)
+        self.add(model, heir, f"{db_path.rsplit('/', 1)[0]}/{heir}", heir_path)
+
+    def _flush_if_full(self, model):
+        if len(self.pending[model]) + len(self.dirty_aliases[model]) >= self.batch_size:
+            self._flush_model(model)
+
+    def _flush_model(self, model):
+        rows = self.pending[model]
+        removed = self.pending_removed[model]
+        if not (rows or removed or self.dirty_digests[model] or self.dirty_aliases[model]):
+            return
+        if rows:
+            self.db.execute(upsert_by_name(model), list(rows.values()))
+        if removed:
+            self.db.execute(delete(model).where(model.name.in_(list(removed))))
+        self._write_hashes(model)
+        self.db.commit()
+        self.committed[model] = (self.committed[model] - removed) | set(rows)
+        self.committed_removed[model] = (self.committed_removed[model] - set(rows)) | removed
+
+        self.rows_written += len(rows)
+        self.pending[model] = {}
+        self.pending_removed[model] = set()
+
+    def _write_hashes(self, model):
+        """Write the digests and alias names changed since the last batch."""
+        kind = model.__tablename__
+        digests = list(self.dirty_digests[model])
+        if digests:
+            self.db.execute(delete(ContentHash).where(ContentHash.kind == kind, ContentHash.digest.in_(digests)))
+            rows = [{"kind": kind, "digest": digest, "name": self.digests[model][digest]}
+                    for digest in digests if digest in self.digests[model]]
+            if rows:
+                self.db.execute(insert(ContentHash), rows)
+        aliases = list(self.dirty_aliases[model])
+        if aliases:
+            self.db.execute(delete(FileAlias).where(FileAlias.kind == kind, FileAlias.name.in_(aliases)))
+            rows = [{"kind": kind, "name": name, "canonical_name": self.aliases[model][name]}
+                    for name in aliases if name in self.aliases[model]]
+            if rows:
+                self.db.execute(insert(FileAlias), rows)
+        self.dirty_digests[model] = set()
+        self.dirty_aliases[model] = set()
+
+def benchmark_ingest(n_files: int = 10_000, batch_size: int = INGEST_BATCH_SIZE):
+    """Rows/sec of one-db.add()-per-file vs BulkIngestor for an n_files archive.
+
+    Builds a throwaway ZIP of tiny .mid members and a fresh SQLite file in
+    a temp directory; only the database writes are timed.
+    """
+    import tempfile
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from models import Base
+
+    with tempfile.TemporaryDirectory() as tmp:
+        zip_path = os.path.join(tmp, "archive.zip")
+        with zipfile.ZipFile(zip_path, "w") as archive:
+            for i in range(n_files):
+                archive.writestr(f"songs/song_{i:05d}.mid", b"MThd")
+        with zipfile.ZipFile(zip_path) as archive:
+            names = [filename for _, filename in iter_zip_members(archive, AUDIO_EXTENSIONS)]
+
+        results = {}
+        for label in ("per-row db.add", "bulk"):
+            engine = create_engine(f"sqlite:///{os.path.join(tmp, label.replace(' ', '_'))}.db")
+            Base.metadata.create_all(engine)
+            db = sessionmaker(bind=engine)()
+            start = time.perf_counter()
+            if label == "bulk":
+                ingestor = BulkIngestor(db, batch_size)
+                for name in names:
+                    ingestor.add(MusicAudio, name, f"/music_audios/{name}")
+                ingestor.flush()
+            else:
+                for name in names:
+                    db.add(MusicAudio(name=name, path=f"/music_audios/{name}"))
+                db.commit()
+            elapsed = time.perf_counter() - start
+            db.close()
+            engine.dispose()
+            results[label] = len(names) / elapsed
+            print(f"{label:>15}: {len(names)} rows in {elapsed:.3f}s ({results[label]:,.0f} rows/sec)")
+        return results
+
+if __name__ == "__main__":
+    # python ingest.py [n_files] [batch_size]
+    import sys
+    benchmark_ingest(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 10_000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else INGEST_BATCH_SIZE,
+    )
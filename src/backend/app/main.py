@@ -1,35 +1,33 @@
 import os
-import uuid
-import shutil
 import zipfile
 import traceback
 import re
+import threading
 from fastapi import FastAPI, UploadFile, File, Depends, HTTPException
+from starlette.concurrency import run_in_threadpool
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy import create_engine, Column, Integer, String
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session
-from routes.image import router as image_router
+from sqlalchemy.orm import Session
+from models import AlbumImage, MusicAudio
+from database import SessionLocal, get_db, init_db
+from ingest import BulkIngestor, iter_zip_members, remove_partial_uploads, load_aliases, scan_folder, reconcile_table, sync_content_hashes, IMAGE_EXTENSIONS, AUDIO_EXTENSIONS
+from routes.image import router as image_router, load_or_build_image_index, update_image_index
+from routes.image_index import get_cached_index
+from routes.audio_index import get_cached_audio_index
 from routes.audio_routes import router as audio_router
-from routes.mic.microphone import record_audio
+from routes.mic.jobs import (
+    router as recording_jobs_router, submit_recording_job, get_job, latest_finished_job, shutdown_job_executor, DONE,
+)
+from routes.mic.pitch_model import warm_basic_pitch_model
 from routes.mic.audiomic_router import router as audiomic_router
-from fastapi.responses import FileResponse
-from fastapi import BackgroundTasks
-
-Base = declarative_base()
-
-class AlbumImage(Base):
-    __tablename__ = 'album_images'
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    name = Column(String, nullable=False)
-    path = Column(String, nullable=False)
-
-class MusicAudio(Base):
-    __tablename__ = 'music_audios'
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    name = Column(String, nullable=False)
-    path = Column(String, nullable=False)
+from routes.audio import (
+    load_or_build_audio_index, update_audio_index,
+    load_or_build_window_index, update_window_index,
+    load_or_build_ngram_index, update_ngram_index,
+    load_or_build_lsh_index, update_lsh_index,
+)
+from routes.executor import router as executor_router, shutdown_executor
+from fastapi.responses import FileResponse, PlainTextResponse
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 UPLOAD_DIR = os.path.join(BASE_DIR, 'album_images')
@@ -45,21 +43,10 @@ print(f"BASE_DIR: {BASE_DIR}")
 print(f"UPLOAD_DIR: {UPLOAD_DIR}")
 print(f"AUDIO_DIR: {AUDIO_DIR}")
 
-DATABASE_URL = os.path.join(BASE_DIR, 'database.db')
-engine = create_engine(f'sqlite:///{DATABASE_URL}', echo=True)
-Base.metadata.create_all(engine)
-
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+init_db()
 
 app = FastAPI(title="Music Album API")
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 def sanitize_filename(filename: str) -> str:
     base_name = os.path.splitext(filename)[0]
     extension = os.path.splitext(filename)[1]
@@ -85,34 +72,22 @@ def validate_mapper_line(line: str) -> tuple[bool, str, str]:
     except ValueError:
         return False, "", ""
 
+def index_names(index) -> set:
+    return set(index.names) if index is not None else set()
+
 def sync_folder_to_db(db: Session):
+    """Reconcile the tables with the media folders; returns what changed for the indexes."""
     print("Starting database sync...")
-    
-    # Clear existing data
-    db.query(AlbumImage).delete()
-    db.query(MusicAudio).delete()
-    
-    # Sync images
-    for filename in os.listdir(UPLOAD_DIR):
-        if not filename.lower().endswith('.zip'):
-            file_path = os.path.join(UPLOAD_DIR, filename)
-            db_path = f"/album_images/{filename}"
-            if os.path.isfile(file_path):
-                new_image = AlbumImage(name=filename, path=db_path)
-                db.add(new_image)
-                print(f"Added new image to DB: {filename}")
-
-    # Sync audio files
-    for filename in os.listdir(AUDIO_DIR):
-        if filename.lower().endswith(('.mid', '.midi')):
-            file_path = os.path.join(AUDIO_DIR, filename)
-            db_path = f"/music_audios/{filename}"
-            if os.path.isfile(file_path):
-                new_audio = MusicAudio(name=filename, path=db_path)
-                db.add(new_audio)
-                print(f"Added new audio to DB: {filename}")
+    image_files = scan_folder(UPLOAD_DIR, lambda name: not name.lower().endswith('.zip'))
+    audio_files = scan_folder(AUDIO_DIR, lambda name: name.lower().endswith(('.mid', '.midi')))
 
     try:
+        changed_images, removed_images = reconcile_table(
+            db, AlbumImage, image_files, "/album_images", index_names(get_cached_index()))
+        changed_audios, removed_audios = reconcile_table(
+            db, MusicAudio, audio_files, "/music_audios", index_names(get_cached_audio_index()))
+        sync_content_hashes(db, AlbumImage, UPLOAD_DIR, image_files, set(changed_images))
+        sync_content_hashes(db, MusicAudio, AUDIO_DIR, audio_files, set(changed_audios))
         db.commit()
         print("Database sync completed successfully")
     except Exception as e:
@@ -120,70 +95,82 @@ def sync_folder_to_db(db: Session):
         print(f"Error syncing database: {str(e)}")
         raise
 
-def process_extracted_file(file_path: str, original_filename: str, db: Session):
-    print(f"Processing extracted file: {original_filename}")
-    
-    if original_filename.lower().endswith('.zip'):
-        return None
+    return {
+        "new_image_paths": [os.path.join(UPLOAD_DIR, name) for name in changed_images],
+        "removed_image_names": removed_images,
+        "new_audio_paths": [os.path.join(AUDIO_DIR, name) for name in changed_audios],
+        "removed_audio_names": removed_audios,
+    }
 
-    file_ext = os.path.splitext(original_filename)[1].lower()
-    sanitized_name = sanitize_filename(original_filename)
-    
-    if file_ext in ['.jpg', '.jpeg', '.png', '.gif']:
-        destination_dir = UPLOAD_DIR
-        destination_path = os.path.join(destination_dir, sanitized_name)
-        db_path = f"/album_images/{sanitized_name}"
-        model = AlbumImage
-        file_type = "image"
-    elif file_ext in ['.mid', '.midi']:
-        destination_dir = AUDIO_DIR
-        destination_path = os.path.join(destination_dir, sanitized_name)
-        db_path = f"/music_audios/{sanitized_name}"
-        model = MusicAudio
-        file_type = "audio"
-    else:
-        return None
-
-    print(f"Copying file to: {destination_path}")
+# Uploads and syncs refresh the indexes from threadpool threads; one at a time
+_index_lock = threading.Lock()
+
+def refresh_indexes(new_image_paths: list[str], new_audio_paths: list[str] = (),
+                    removed_image_names: list[str] = (), removed_audio_names: list[str] = ()):
+    with _index_lock:
+        _refresh_indexes(new_image_paths, new_audio_paths, removed_image_names, removed_audio_names)
+
+def _refresh_indexes(new_image_paths, new_audio_paths, removed_image_names, removed_audio_names):
     try:
-        shutil.copy2(file_path, destination_path)
-        print(f"File copied successfully")
-        
-        # Check if entry already exists
-        existing = db.query(model).filter_by(name=sanitized_name).first()
-        if existing:
-            print(f"Updating existing entry: {sanitized_name}")
-            existing.path = db_path
-        else:
-            print(f"Creating new entry: {sanitized_name}")
-            db_entry = model(name=sanitized_name, path=db_path)
-            db.add(db_entry)
-        
-        return {
-            "original_name": original_filename,
-            "stored_name": sanitized_name,
-            "type": file_type,
-            "path": db_path
-        }
+        if new_image_paths or removed_image_names:
+            update_image_index(UPLOAD_DIR, new_paths=new_image_paths, removed_names=removed_image_names)
+        if new_audio_paths or removed_audio_names:
+            changes = {"new_paths": new_audio_paths, "removed_names": removed_audio_names}
+            update_audio_index(AUDIO_DIR, **changes)
+            update_window_index(AUDIO_DIR, **changes)
+            update_ngram_index(AUDIO_DIR, **changes)
+            update_lsh_index(AUDIO_DIR, **changes)
     except Exception as e:
-        print(f"Error processing file {original_filename}: {str(e)}")
+        # The search path will resync the indexes from the folders on the next query
+        print(f"Error updating retrieval indexes: {str(e)}")
         traceback.print_exc()
-        return None
+
+def refresh_committed(ingestor: BulkIngestor):
+    """Update the indexes with every file whose row an upload has committed so far."""
+    refresh_indexes(
+        [os.path.join(UPLOAD_DIR, name) for name in sorted(ingestor.committed[AlbumImage])],
+        [os.path.join(AUDIO_DIR, name) for name in sorted(ingestor.committed[MusicAudio])],
+        removed_image_names=sorted(ingestor.committed_removed[AlbumImage]),
+        removed_audio_names=sorted(ingestor.committed_removed[MusicAudio]),
+    )
 
 @app.on_event("startup")
 async def on_startup():
     print("Starting application...")
     try:
+        for folder in (UPLOAD_DIR, AUDIO_DIR):
+            remove_partial_uploads(folder)
         db = SessionLocal()
         try:
-            sync_folder_to_db(db)
+            changes = sync_folder_to_db(db)
         finally:
             db.close()
+        # Files that changed on disk while the server was down; new and
+        # removed ones are also caught by the folder checks below
+        refresh_indexes(**changes)
+        try:
+            load_or_build_image_index(UPLOAD_DIR)
+        except ValueError as e:
+            print(f"Image index not built: {str(e)}")
+        load_or_build_audio_index(AUDIO_DIR)
+        load_or_build_window_index(AUDIO_DIR)
+        load_or_build_ngram_index(AUDIO_DIR)
+        load_or_build_lsh_index(AUDIO_DIR)
+        try:
+            warm_basic_pitch_model()
+        except Exception as e:
+            # Recordings will load the model on first use instead
+            print(f"Basic Pitch model not preloaded: {str(e)}")
         print("Startup completed successfully")
     except Exception as e:
         print(f"Error during startup: {str(e)}")
         raise
 
+@app.on_event("shutdown")
+async def on_shutdown():
+    shutdown_executor()
+    shutdown_job_executor()
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -199,91 +186,90 @@ app.mount("/temp", StaticFiles(directory=TEMP_DIR), name="temp")
 app.include_router(image_router, prefix="/api")
 app.include_router(audio_router, prefix="/api")
 app.include_router(audiomic_router, prefix="/api")
+app.include_router(executor_router, prefix="/api")
+app.include_router(recording_jobs_router, prefix="/api")
 
 @app.get("/mapper.txt")
-async def get_mapper():
+async def get_mapper(db: Session = Depends(get_db)):
     MAPPER_PATH = os.path.join(BASE_DIR, 'mapper.txt')
-    if os.path.exists(MAPPER_PATH):
-        return FileResponse(MAPPER_PATH)
-    else:
+    if not os.path.exists(MAPPER_PATH):
         raise HTTPException(status_code=404, detail="Mapper file not found")
 
+    # Duplicate uploads only exist as aliases; point their lines at the canonical files
+    audio_aliases = load_aliases(db, MusicAudio)
+    image_aliases = load_aliases(db, AlbumImage)
+    if not audio_aliases and not image_aliases:
+        return FileResponse(MAPPER_PATH)
+    lines = []
+    with open(MAPPER_PATH, encoding='utf-8') as mapper_file:
+        for line in mapper_file:
+            is_valid, audio_file, image_file = validate_mapper_line(line)
+            if is_valid:
+                line = f"{audio_aliases.get(audio_file, audio_file)}\t{image_aliases.get(image_file, image_file)}\n"
+            lines.append(line)
+    return PlainTextResponse(''.join(lines))
+
+# Upload handlers are plain functions: FastAPI runs them in its threadpool,
+# so hashing, file writes and batch commits never block the event loop
 @app.post("/upload-zip")
-async def upload_zip(file: UploadFile = File(...), db: Session = Depends(get_db)):
+def upload_zip(file: UploadFile = File(...), db: Session = Depends(get_db)):
     if not file.filename.lower().endswith('.zip'):
         raise HTTPException(status_code=400, detail="File must be a ZIP archive")
 
-    temp_dir = os.path.join(TEMP_DIR, str(uuid.uuid4()))
-    os.makedirs(temp_dir, exist_ok=True)
-    print(f"Created temp directory: {temp_dir}")
-
+    ingestor = BulkIngestor(db)
     try:
-        # Save ZIP to temp directory
-        zip_path = os.path.join(temp_dir, file.filename)
-        with open(zip_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-
-        if not zipfile.is_zipfile(zip_path):
+        # The upload is already spooled by the server; read members straight from it
+        if not zipfile.is_zipfile(file.file):
             raise HTTPException(status_code=400, detail="Invalid ZIP archive")
+        file.file.seek(0)
 
         processed_files = []
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            # Extract to temp directory
-            zip_ref.extractall(temp_dir)
-            
-            # Process files from extracted content
-            for root, _, files in os.walk(temp_dir):
-                for filename in files:
-                    # Skip the original ZIP file itself
-                    if filename == file.filename:
-                        continue
-                        
-                    file_path = os.path.join(root, filename)
-                    
-                    # Process image files
-                    if filename.lower().endswith(('.jpg', '.jpeg', '.png', '.gif')):
-                        destination_path = os.path.join(UPLOAD_DIR, filename)
-                        shutil.copy2(file_path, destination_path)
-                        db_path = f"/album_images/{filename}"
-                        new_image = AlbumImage(name=filename, path=db_path)
-                        db.add(new_image)
-                        processed_files.append({
-                            "filename": filename,
-                            "type": "image",
-                            "path": db_path
-                        })
-                    
-                    # Process audio files
-                    elif filename.lower().endswith(('.mid', '.midi')):
-                        destination_path = os.path.join(AUDIO_DIR, filename)
-                        shutil.copy2(file_path, destination_path)
-                        db_path = f"/music_audios/{filename}"
-                        new_audio = MusicAudio(name=filename, path=db_path)
-                        db.add(new_audio)
-                        processed_files.append({
-                            "filename": filename,
-                            "type": "audio",
-                            "path": db_path
-                        })
-
-        # Commit changes to database
-        db.commit()
-        print(f"Processed {len(processed_files)} files successfully")
+        with zipfile.ZipFile(file.file, 'r') as zip_ref:
+            for info, filename in iter_zip_members(zip_ref, IMAGE_EXTENSIONS + AUDIO_EXTENSIONS):
+                # Process image files
+                if filename.lower().endswith(IMAGE_EXTENSIONS):
+                    destination_path = os.path.join(UPLOAD_DIR, filename)
+                    db_path = f"/album_images/{filename}"
+                    with zip_ref.open(info) as source:
+                        duplicate_of = ingestor.store(AlbumImage, filename, db_path, source, destination_path)
+                    processed_files.append({
+                        "filename": filename,
+                        "type": "image",
+                        "path": db_path,
+                        "duplicate_of": duplicate_of
+                    })
+                
+                # Process audio files
+                else:
+                    destination_path = os.path.join(AUDIO_DIR, filename)
+                    db_path = f"/music_audios/{filename}"
+                    with zip_ref.open(info) as source:
+                        duplicate_of = ingestor.store(MusicAudio, filename, db_path, source, destination_path)
+                    processed_files.append({
+                        "filename": filename,
+                        "type": "audio",
+                        "path": db_path,
+                        "duplicate_of": duplicate_of
+                    })
+
+        # Write the remaining rows to the database
+        ingestor.flush()
+        refresh_committed(ingestor)
+        print(f"Processed {len(processed_files)} files successfully ({ingestor.duplicates} duplicates)")
         return {
             "message": "ZIP archive processed successfully",
             "processed_files": processed_files
         }
     
     except Exception as e:
+        # Only the unfinished batch is rolled back; index what was committed
         db.rollback()
+        refresh_committed(ingestor)
         print(f"Error processing ZIP: {str(e)}")
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Error processing ZIP archive: {str(e)}")
-    finally:
-        # Clean up temp directory
-        shutil.rmtree(temp_dir, ignore_errors=True)
 
-async def append_to_mapper(file: UploadFile):
+def append_to_mapper(file: UploadFile):
     if not file.filename.endswith('.txt'):
         raise HTTPException(
             status_code=400,
@@ -296,7 +282,7 @@ async def append_to_mapper(file: UploadFile):
         with open(MAPPER_PATH, 'w', encoding='utf-8') as f:
             pass
     
-    content = await file.read()
+    content = file.file.read()
     content_str = content.decode('utf-8')
     
     if not content_str.endswith('\n'):
@@ -308,7 +294,7 @@ async def append_to_mapper(file: UploadFile):
     return {"message": "Mapper content appended successfully"}
 
 @app.post("/submit-all")
-async def submit_all(
+def submit_all(
     images: list[UploadFile] = File(default=[]),
     audios: list[UploadFile] = File(default=[]),
     mapper: UploadFile = File(default=None),
@@ -316,6 +302,7 @@ async def submit_all(
 ):
     print(f"Received {len(images)} images, {len(audios)} audios")
     responses = []
+    ingestor = BulkIngestor(db)
     
     try:
         # Process images
@@ -325,41 +312,24 @@ async def submit_all(
             # Handle ZIP files
             if image.filename.lower().endswith('.zip'):
                 print("Processing image ZIP file")
-                temp_dir = os.path.join(TEMP_DIR, str(uuid.uuid4()))
-                os.makedirs(temp_dir, exist_ok=True)
                 
-                try:
-                    # Save and extract ZIP
-                    zip_path = os.path.join(temp_dir, image.filename)
-                    with open(zip_path, "wb") as buffer:
-                        shutil.copyfileobj(image.file, buffer)
-                    
-                    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                        zip_ref.extractall(temp_dir)
-                    
-                    # Process extracted files
-                    for root, _, files in os.walk(temp_dir):
-                        for filename in files:
-                            if filename.lower().endswith(('.jpg', '.jpeg', '.png', '.gif')):
-                                file_path = os.path.join(root, filename)
-                                sanitized_name = sanitize_filename(filename)
-                                destination_path = os.path.join(UPLOAD_DIR, sanitized_name)
-                                db_path = f"/album_images/{sanitized_name}"
-                                
-                                # Copy file to destination
-                                shutil.copy2(file_path, destination_path)
-                                
-                                # Add to database
-                                new_image = AlbumImage(name=sanitized_name, path=db_path)
-                                db.add(new_image)
-                                responses.append({
-                                    "file": sanitized_name,
-                                    "type": "image",
-                                    "path": db_path
-                                })
-                                print(f"Processed extracted image: {sanitized_name}")
-                finally:
-                    shutil.rmtree(temp_dir, ignore_errors=True)
+                # Stream matching members from the spooled upload into UPLOAD_DIR
+                with zipfile.ZipFile(image.file, 'r') as zip_ref:
+                    for info, filename in iter_zip_members(zip_ref, IMAGE_EXTENSIONS):
+                        sanitized_name = sanitize_filename(filename)
+                        destination_path = os.path.join(UPLOAD_DIR, sanitized_name)
+                        db_path = f"/album_images/{sanitized_name}"
+                        
+                        # Add to database, or alias it if the content is already stored
+                        with zip_ref.open(info) as source:
+                            duplicate_of = ingestor.store(AlbumImage, sanitized_name, db_path, source, destination_path)
+                        responses.append({
+                            "file": sanitized_name,
+                            "type": "image",
+                            "path": db_path,
+                            "duplicate_of": duplicate_of
+                        })
+                        print(f"Processed extracted image: {sanitized_name}")
                     
             # Handle regular image files
             elif image.filename.lower().endswith(('.jpg', '.jpeg', '.png', '.gif')):
@@ -367,15 +337,12 @@ async def submit_all(
                 file_path = os.path.join(UPLOAD_DIR, sanitized_name)
                 db_path = f"/album_images/{sanitized_name}"
                 
-                with open(file_path, "wb") as buffer:
-                    shutil.copyfileobj(image.file, buffer)
-                
-                new_image = AlbumImage(name=sanitized_name, path=db_path)
-                db.add(new_image)
+                duplicate_of = ingestor.store(AlbumImage, sanitized_name, db_path, image.file, file_path)
                 responses.append({
                     "file": sanitized_name,
                     "type": "image",
-                    "path": db_path
+                    "path": db_path,
+                    "duplicate_of": duplicate_of
                 })
                 print(f"Processed single image: {sanitized_name}")
 
@@ -386,41 +353,24 @@ async def submit_all(
             # Handle ZIP files containing audio
             if audio.filename.lower().endswith('.zip'):
                 print("Processing audio ZIP file")
-                temp_dir = os.path.join(TEMP_DIR, str(uuid.uuid4()))
-                os.makedirs(temp_dir, exist_ok=True)
                 
-                try:
-                    # Save and extract ZIP
-                    zip_path = os.path.join(temp_dir, audio.filename)
-                    with open(zip_path, "wb") as buffer:
-                        shutil.copyfileobj(audio.file, buffer)
-                    
-                    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                        zip_ref.extractall(temp_dir)
-                    
-                    # Process extracted files
-                    for root, _, files in os.walk(temp_dir):
-                        for filename in files:
-                            if filename.lower().endswith(('.mid', '.midi')):
-                                file_path = os.path.join(root, filename)
-                                sanitized_name = sanitize_filename(filename)
-                                destination_path = os.path.join(AUDIO_DIR, sanitized_name)
-                                db_path = f"/music_audios/{sanitized_name}"
-                                
-                                # Copy file to destination
-                                shutil.copy2(file_path, destination_path)
-                                
-                                # Add to database
-                                new_audio = MusicAudio(name=sanitized_name, path=db_path)
-                                db.add(new_audio)
-                                responses.append({
-                                    "file": sanitized_name,
-                                    "type": "audio",
-                                    "path": db_path
-                                })
-                                print(f"Processed extracted audio: {sanitized_name}")
-                finally:
-                    shutil.rmtree(temp_dir, ignore_errors=True)
+                # Stream matching members from the spooled upload into AUDIO_DIR
+                with zipfile.ZipFile(audio.file, 'r') as zip_ref:
+                    for info, filename in iter_zip_members(zip_ref, AUDIO_EXTENSIONS):
+                        sanitized_name = sanitize_filename(filename)
+                        destination_path = os.path.join(AUDIO_DIR, sanitized_name)
+                        db_path = f"/music_audios/{sanitized_name}"
+                        
+                        # Add to database, or alias it if the content is already stored
+                        with zip_ref.open(info) as source:
+                            duplicate_of = ingestor.store(MusicAudio, sanitized_name, db_path, source, destination_path)
+                        responses.append({
+                            "file": sanitized_name,
+                            "type": "audio",
+                            "path": db_path,
+                            "duplicate_of": duplicate_of
+                        })
+                        print(f"Processed extracted audio: {sanitized_name}")
             
             # Handle regular audio files
             elif audio.filename.lower().endswith(('.mid', '.midi')):
@@ -428,29 +378,27 @@ async def submit_all(
                 file_path = os.path.join(AUDIO_DIR, sanitized_name)
                 db_path = f"/music_audios/{sanitized_name}"
                 
-                with open(file_path, "wb") as buffer:
-                    shutil.copyfileobj(audio.file, buffer)
-                
-                new_audio = MusicAudio(name=sanitized_name, path=db_path)
-                db.add(new_audio)
+                duplicate_of = ingestor.store(MusicAudio, sanitized_name, db_path, audio.file, file_path)
                 responses.append({
                     "file": sanitized_name,
                     "type": "audio",
-                    "path": db_path
+                    "path": db_path,
+                    "duplicate_of": duplicate_of
                 })
                 print(f"Processed single audio: {sanitized_name}")
 
         # Process mapper file
         if mapper:
             print(f"Processing mapper: {mapper.filename}")
-            await append_to_mapper(mapper)
+            append_to_mapper(mapper)
             responses.append({
                 "file": mapper.filename,
                 "type": "mapper",
                 "status": "appended"
             })
 
-        db.commit()
+        ingestor.flush()
+        refresh_committed(ingestor)
         print("All files processed successfully")
         return {
             "message": "All files submitted successfully",
@@ -458,7 +406,9 @@ async def submit_all(
         }
         
     except Exception as e:
+        # Only the unfinished batch is rolled back; index what was committed
         db.rollback()
+        refresh_committed(ingestor)
         print(f"Error in submit_all: {str(e)}")
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Error processing files: {str(e)}")
@@ -466,8 +416,16 @@ async def submit_all(
 @app.post("/sync-database")
 async def force_sync_database(db: Session = Depends(get_db)):
     try:
-        sync_folder_to_db(db)
-        return {"message": "Database synchronized successfully"}
+        # Hashing and feature extraction can take minutes; keep them off the event loop
+        changes = await run_in_threadpool(sync_folder_to_db, db)
+        await run_in_threadpool(refresh_indexes, **changes)
+        return {
+            "message": "Database synchronized successfully",
+            "images_changed": len(changes["new_image_paths"]),
+            "images_removed": len(changes["removed_image_names"]),
+            "audios_changed": len(changes["new_audio_paths"]),
+            "audios_removed": len(changes["removed_audio_names"]),
+        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -512,10 +470,10 @@ INPUT_DIR = os.path.join(BASE_DIR, "routes/mic/recorded_input")
 OUTPUT_DIR = os.path.join(BASE_DIR, "routes/mic/recorded_output")
 
 @app.post("/start-recording")
-async def start_record(bg_task: BackgroundTasks):
-    """Endpoint to start audio recording"""
-    bg_task.add_task(record_audio)  # Start recording in the background
-    return {"message": "Recording started..."}
+async def start_record():
+    """Queue a recording job; poll /recording-jobs/{job_id} for its status"""
+    job = submit_recording_job()
+    return {"message": "Recording started...", **job.to_dict()}
 
 @app.post("/get-midi-file")
 async def get_midi_file():
@@ -529,33 +487,14 @@ async def get_midi_file():
         raise HTTPException(status_code=500, detail=f"Error retrieving MIDI files: {str(e)}")
 
 @app.get("/get-recorded-audio/")
-async def get_recorded_audio():
-    """Return the most recent recorded MIDI file"""
-    try:
-        # Debugging: Print the contents of the OUTPUT_DIR
-        print("Checking the files in OUTPUT_DIR:", OUTPUT_DIR)
-        midi_files = [file for file in os.listdir(OUTPUT_DIR) if file.endswith('.mid')]
-        
-        # Debugging: Print the list of .mid files found
-        print("MIDI files found:", midi_files)
-        
-        if midi_files:
-            # Sort the MIDI files and get the most recent one by name
-            latest_midi = sorted(midi_files)[-1]
-            file_path = os.path.join(OUTPUT_DIR, latest_midi)
-            
-            # Debugging: Print the file path being returned
-            print("Returning MIDI file:", file_path)
-            
-            # Return the MIDI file as a response
-            return FileResponse(path=file_path, media_type='audio/midi')
-        else:
-            raise HTTPException(status_code=404, detail="No recorded MIDI found")
-    except Exception as e:
-        # Debugging: Print the error message for troubleshooting
-        print(f"Error retrieving recorded MIDI: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error retrieving recorded MIDI: {str(e)}")
-
+async def get_recorded_audio(job_id: str = None):
+    """Return the MIDI file of the given recording job, or of the last one to finish"""
+    job = get_job(job_id) if job_id else latest_finished_job()
+    if job is None or job.status != DONE or not os.path.exists(job.midi_path):
+        raise HTTPException(status_code=404, detail="No recorded MIDI found")
+
+    print("Returning MIDI file:", job.midi_path)
+    return FileResponse(path=job.midi_path, media_type='audio/midi')
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,40 @@
+from sqlalchemy import Column, Integer, String, Float, UniqueConstraint
+from sqlalchemy.ext.declarative import declarative_base
+
+Base = declarative_base()
+
+class AlbumImage(Base):
+    __tablename__ = 'album_images'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    name = Column(String, nullable=False, unique=True, index=True)
+    path = Column(String, nullable=False)
+    # File stat at last sync, used to detect changed files
+    size = Column(Integer, nullable=True)
+    mtime = Column(Float, nullable=True)
+
+class MusicAudio(Base):
+    __tablename__ = 'music_audios'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    name = Column(String, nullable=False, unique=True, index=True)
+    path = Column(String, nullable=False)
+    size = Column(Integer, nullable=True)
+    mtime = Column(Float, nullable=True)
+
+class ContentHash(Base):
+    """Digest of an uploaded file -> the one file on disk holding that content."""
+    __tablename__ = 'content_hashes'
+    __table_args__ = (UniqueConstraint('kind', 'digest'),)
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    # Table name of the media the file belongs to (album_images / music_audios)
+    kind = Column(String, nullable=False)
+    digest = Column(String, nullable=False)
+    name = Column(String, nullable=False)
+
+class FileAlias(Base):
+    """An uploaded name whose content was already stored under canonical_name."""
+    __tablename__ = 'file_aliases'
+    __table_args__ = (UniqueConstraint('kind', 'name'),)
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    kind = Column(String, nullable=False)
+    name = Column(String, nullable=False)
+    canonical_name = Column(String, nullable=False)
@@ -1,10 +1,52 @@
 from fastapi import APIRouter
 from mido import MidiFile, Message, MetaMessage
 import os
+import sys
 import numpy as np
 from typing import List, Tuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+from .midi_scan import read_note_ons, MidiScanError
+from .audio_index import AudioIndex, get_cached_audio_index, set_cached_audio_index
+from .ngram_index import NgramIndex, get_cached_ngram_index, set_cached_ngram_index
+from .similarity import cosine_similarities, top_k_indices
+from .dtw import dtw_rerank
+from .lsh import LSHIndex, lsh_search, get_cached_lsh_index, set_cached_lsh_index, LSH_TABLES, LSH_BITS
+from .window_index import (
+    WindowIndex, get_cached_window_index, set_cached_window_index,
+    WINDOW_SIZE, WINDOW_SLIDE, WINDOW_AGGREGATE,
+)
+
+# "song" compares whole-song histograms, "window" uses the segment-level index,
+# "ngram" reranks interval n-gram candidates with the song histograms,
+# "lsh" reranks the songs sharing a hyperplane-hash bucket with the query
+AUDIO_SEARCH_MODES = ("song", "window", "ngram", "lsh")
+AUDIO_SEARCH_MODE = os.environ.get("AUDIO_SEARCH_MODE", "song")
+# Songs taken from the n-gram posting lists for histogram reranking
+NGRAM_CANDIDATES = int(os.environ.get("NGRAM_CANDIDATES", 100))
+
+# Second-stage DTW over the top DTW_TOP_K first-stage results
+AUDIO_DTW_RERANK = os.environ.get("AUDIO_DTW_RERANK", "0") == "1"
+DTW_TOP_K = int(os.environ.get("DTW_TOP_K", 10))
+DTW_BAND = int(os.environ.get("DTW_BAND", 8))
+DTW_BUDGET_MS = float(os.environ.get("DTW_BUDGET_MS", 200))
+
+# Bulk feature extraction; catalogues smaller than PARALLEL_MIN_FILES are handled inline
+AUDIO_WORKERS = int(os.environ.get("AUDIO_WORKERS", os.cpu_count() or 1))
+AUDIO_CHUNK_SIZE = int(os.environ.get("AUDIO_CHUNK_SIZE", 32))
+PARALLEL_MIN_FILES = 64
 
 def extract_melody(midi_path: str) -> List[Tuple[int, int]]:
+    try:
+        return read_note_ons(midi_path)
+    except MidiScanError as e:
+        print(f"Fast MIDI scan failed for {midi_path} ({str(e)}), falling back to mido")
+        return extract_melody_mido(midi_path)
+    except Exception as e:
+        print(f"Error extracting melody from {midi_path}: {str(e)}")
+        return []
+
+def extract_melody_mido(midi_path: str) -> List[Tuple[int, int]]:
     try:
         midi = MidiFile(midi_path)
         notes = []
@@ -89,48 +131,398 @@ def cosine_similarity(v1: np.ndarray, v2: np.ndarray) -> float:
         return 0
     return np.dot(v1, v2) / (magnitude1 * magnitude2)
 
-def audio_retrieval_main(query_path: str, audio_folder: str, n: int = 50) -> Tuple[List[str], List[float]]:
+def get_midi_files(audio_folder: str) -> List[str]:
+    return [f for f in os.listdir(audio_folder) if f.endswith('.mid')]
+
+def folder_changes(index, audio_folder: str) -> Tuple[List[str], set]:
+    """(paths of MIDI files missing from the index, names indexed but no longer on disk)."""
+    folder_names = set(get_midi_files(audio_folder))
+    indexed_names = set(index.names)
+    added = [os.path.join(audio_folder, name) for name in sorted(folder_names - indexed_names)]
+    return added, indexed_names - folder_names
+
+def map_file_chunks(func, paths: List[str], workers: int = None, chunk_size: int = AUDIO_CHUNK_SIZE):
+    """Run func over chunks of paths, yielding (start, result) as chunks finish.
+
+    Large inputs go through a process pool; a chunk whose worker fails is
+    reported and yields None so the caller can keep its default rows.
+    """
+    workers = AUDIO_WORKERS if workers is None else workers
+    chunks = [(start, paths[start:start + chunk_size]) for start in range(0, len(paths), chunk_size)]
+    total_files = len(paths)
+    done = 0
+
+    if workers > 1 and total_files >= PARALLEL_MIN_FILES:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(func, chunk): (start, len(chunk)) for start, chunk in chunks}
+            for future in as_completed(futures):
+                start, n_files = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"Error processing files {start}-{start + n_files - 1}: {str(e)}")
+                    result = None
+                done += n_files
+                print(f"Processed {done}/{total_files} files")
+                yield start, result
+    else:
+        for start, chunk in chunks:
+            result = func(chunk)
+            done += len(chunk)
+            print(f"Processed {done}/{total_files} files")
+            yield start, result
+
+def _extract_feature_chunk(midi_paths: List[str]) -> np.ndarray:
+    features = np.zeros((len(midi_paths), 638), dtype=np.float32)
+    for i, path in enumerate(midi_paths):
+        try:
+            notes = extract_melody(path)
+            if notes:
+                features[i] = create_feature_vector(notes)
+        except Exception as e:
+            print(f"Error processing {os.path.basename(path)}: {str(e)}")
+    return features
+
+def extract_feature_vectors(midi_paths: List[str], workers: int = None) -> np.ndarray:
+    """Feature matrix for the given MIDI files (all-zero rows for files without notes)."""
+    midi_paths = list(midi_paths)
+    features = np.zeros((len(midi_paths), 638), dtype=np.float32)
+    for start, block in map_file_chunks(_extract_feature_chunk, midi_paths, workers):
+        if block is not None:
+            features[start:start + len(block)] = block
+    return features
+
+def build_audio_index(audio_folder: str) -> AudioIndex:
+    """Extract features for every MIDI file once and persist the matrix."""
+    print("Building audio index...")
+    midi_files = get_midi_files(audio_folder)
+    features = extract_feature_vectors([os.path.join(audio_folder, f) for f in midi_files])
+    return set_cached_audio_index(AudioIndex(midi_files, features))
+
+def update_audio_index(audio_folder: str, new_paths: List[str] = (), removed_names: List[str] = ()) -> AudioIndex:
+    """Add/replace and remove MIDI files in the stored audio index."""
+    index = get_cached_audio_index()
+    if index is None:
+        return build_audio_index(audio_folder)
+
+    new_paths = [path for path in new_paths if path.endswith('.mid')]
+    if removed_names:
+        index.remove(removed_names)
+    if new_paths:
+        print(f"Adding {len(new_paths)} MIDI files to audio index")
+        index.add([os.path.basename(path) for path in new_paths], extract_feature_vectors(new_paths))
+    return set_cached_audio_index(index)
+
+def load_or_build_audio_index(audio_folder: str) -> AudioIndex:
+    """Return the stored audio index, syncing it with the MIDI folder if needed."""
+    index = get_cached_audio_index()
+    if index is None:
+        return build_audio_index(audio_folder)
+
+    added, removed = folder_changes(index, audio_folder)
+    if not added and not removed:
+        return index
+
+    print("Audio index is out of date, updating...")
+    return update_audio_index(audio_folder, new_paths=added, removed_names=removed)
+
+def rank_audio_index(index: AudioIndex, query_vector: np.ndarray, n: int) -> Tuple[List[str], List[float]]:
+    """Top-n files by cosine similarity, skipping files that had no notes."""
+    return rank_audio_index_batch(index, [query_vector], n)[0]
+
+def rank_audio_index_batch(index: AudioIndex, query_vectors: List[np.ndarray], n: int) -> List[Tuple[List[str], List[float]]]:
+    top_indices, top_scores = index.search(np.asarray(query_vectors), n)
+    if top_indices.shape[1] == 0:
+        raise ValueError("No valid comparisons could be made")
+    return [
+        ([index.names[i] for i in row], scores.tolist())
+        for row, scores in zip(top_indices, top_scores)
+    ]
+
+def extract_window_features(notes: List[Tuple[int, int]], window_size: int = WINDOW_SIZE, window_slide: int = WINDOW_SLIDE) -> np.ndarray:
+    """One feature vector per melody window; melodies shorter than a window form a single window."""
+    if not notes:
+        return np.zeros((0, 638), dtype=np.float32)
+    if len(notes) < window_size:
+        windows = [notes]
+    else:
+        windows = windowing(notes, window_size, window_slide)
+    return np.array([create_feature_vector(window) for window in windows], dtype=np.float32)
+
+def _extract_window_chunk(midi_paths: List[str], window_size: int, window_slide: int) -> List[np.ndarray]:
+    window_features = []
+    for path in midi_paths:
+        try:
+            window_features.append(extract_window_features(extract_melody(path), window_size, window_slide))
+        except Exception as e:
+            print(f"Error processing {os.path.basename(path)}: {str(e)}")
+            window_features.append(np.zeros((0, 638), dtype=np.float32))
+    return window_features
+
+def extract_window_feature_list(midi_paths: List[str], window_size: int, window_slide: int, workers: int = None) -> List[np.ndarray]:
+    midi_paths = list(midi_paths)
+    window_features = [np.zeros((0, 638), dtype=np.float32)] * len(midi_paths)
+    chunk_func = partial(_extract_window_chunk, window_size=window_size, window_slide=window_slide)
+    for start, block in map_file_chunks(chunk_func, midi_paths, workers):
+        if block is not None:
+            window_features[start:start + len(block)] = block
+    return window_features
+
+def build_window_index(audio_folder: str, window_size: int = WINDOW_SIZE, window_slide: int = WINDOW_SLIDE) -> WindowIndex:
+    print(f"Building window index (size={window_size}, slide={window_slide})...")
+    index = WindowIndex([], np.zeros((0, 638)), [], window_size, window_slide)
+    midi_files = get_midi_files(audio_folder)
+    index.add(midi_files, extract_window_feature_list(
+        [os.path.join(audio_folder, f) for f in midi_files], window_size, window_slide))
+    return set_cached_window_index(index)
+
+def update_window_index(audio_folder: str, new_paths: List[str] = (), removed_names: List[str] = ()) -> WindowIndex:
+    index = get_cached_window_index()
+    if index is None:
+        return build_window_index(audio_folder)
+
+    new_paths = [path for path in new_paths if path.endswith('.mid')]
+    if removed_names:
+        index.remove(removed_names)
+    if new_paths:
+        print(f"Adding {len(new_paths)} MIDI files to window index")
+        index.add([os.path.basename(path) for path in new_paths],
+                  extract_window_feature_list(new_paths, index.window_size, index.window_slide))
+    return set_cached_window_index(index)
+
+def load_or_build_window_index(audio_folder: str) -> WindowIndex:
+    """Return the stored window index, rebuilding it if the window parameters changed."""
+    index = get_cached_window_index()
+    if index is None or (index.window_size, index.window_slide) != (WINDOW_SIZE, WINDOW_SLIDE):
+        return build_window_index(audio_folder)
+
+    added, removed = folder_changes(index, audio_folder)
+    if not added and not removed:
+        return index
+
+    print("Window index is out of date, updating...")
+    return update_window_index(audio_folder, new_paths=added, removed_names=removed)
+
+def search_window_index(query_notes: List[Tuple[int, int]], audio_folder: str, n: int, aggregate: str = WINDOW_AGGREGATE) -> Tuple[List[str], List[float]]:
+    """Match every query window against every database window in one pass."""
+    index = load_or_build_window_index(audio_folder)
+    query_windows = extract_window_features(query_notes, index.window_size, index.window_slide)
+    top_indices, top_scores = index.search(query_windows, n, aggregate=aggregate)
+    if len(top_indices) == 0:
+        raise ValueError("No valid comparisons could be made")
+    return [index.names[i] for i in top_indices], top_scores.tolist()
+
+def _extract_pitch_chunk(midi_paths: List[str]) -> List[np.ndarray]:
+    pitch_sequences = []
+    for path in midi_paths:
+        try:
+            pitch_sequences.append(np.array([note for _, note in extract_melody(path)], dtype=np.uint8))
+        except Exception as e:
+            print(f"Error processing {os.path.basename(path)}: {str(e)}")
+            pitch_sequences.append(np.zeros(0, dtype=np.uint8))
+    return pitch_sequences
+
+def extract_pitch_sequences(midi_paths: List[str], workers: int = None) -> List[np.ndarray]:
+    midi_paths = list(midi_paths)
+    pitch_sequences = [np.zeros(0, dtype=np.uint8)] * len(midi_paths)
+    for start, block in map_file_chunks(_extract_pitch_chunk, midi_paths, workers):
+        if block is not None:
+            pitch_sequences[start:start + len(block)] = block
+    return pitch_sequences
+
+def build_ngram_index(audio_folder: str) -> NgramIndex:
+    print("Building n-gram index...")
+    midi_files = get_midi_files(audio_folder)
+    index = NgramIndex.empty()
+    index.add(midi_files, extract_pitch_sequences([os.path.join(audio_folder, f) for f in midi_files]))
+    return set_cached_ngram_index(index)
+
+def update_ngram_index(audio_folder: str, new_paths: List[str] = (), removed_names: List[str] = ()) -> NgramIndex:
+    index = get_cached_ngram_index()
+    if index is None:
+        return build_ngram_index(audio_folder)
+
+    new_paths = [path for path in new_paths if path.endswith('.mid')]
+    if removed_names:
+        index.remove(removed_names)
+    if new_paths:
+        print(f"Adding {len(new_paths)} MIDI files to n-gram index")
+        index.add([os.path.basename(path) for path in new_paths], extract_pitch_sequences(new_paths))
+    return set_cached_ngram_index(index)
+
+def load_or_build_ngram_index(audio_folder: str) -> NgramIndex:
+    index = get_cached_ngram_index()
+    # Indexes saved without pitch contours are rebuilt once so DTW can use them
+    if index is None or index.pitches is None:
+        return build_ngram_index(audio_folder)
+
+    added, removed = folder_changes(index, audio_folder)
+    if not added and not removed:
+        return index
+
+    print("N-gram index is out of date, updating...")
+    return update_ngram_index(audio_folder, new_paths=added, removed_names=removed)
+
+def search_ngram_index(query_notes: List[Tuple[int, int]], audio_folder: str, n: int, candidate_limit: int = NGRAM_CANDIDATES) -> Tuple[List[str], List[float]]:
+    """Gather candidates from the interval n-gram postings, then rerank them by histogram cosine."""
+    audio_index = load_or_build_audio_index(audio_folder)
+    query_vector = create_feature_vector(query_notes)
+
+    ngram_index = load_or_build_ngram_index(audio_folder)
+    candidates, _ = ngram_index.candidates([note for _, note in query_notes], candidate_limit)
+    if len(candidates) == 0:
+        print("No n-gram hits, falling back to full scan")
+        return rank_audio_index(audio_index, query_vector, n)
+
+    rows = audio_index.rows_for([ngram_index.names[i] for i in candidates])
+    scores = cosine_similarities(query_vector, audio_index.features[rows])[0]
+    order = top_k_indices(scores, n, largest=True)[0]
+    return [audio_index.names[rows[i]] for i in order], scores[order].tolist()
+
+def build_lsh_index(audio_folder: str) -> LSHIndex:
+    """Hash the stored audio feature matrix; no MIDI file is re-read."""
+    print("Building LSH index...")
+    audio_index = load_or_build_audio_index(audio_folder)
+    index = LSHIndex([], np.zeros((0, LSH_TABLES), dtype=np.int64))
+    index.insert(audio_index.names, audio_index.features)
+    return set_cached_lsh_index(index)
+
+def lsh_index_is_stale(index: LSHIndex) -> bool:
+    """True when the stored LSH index has other parameters or no saved hyperplanes."""
+    return index is None or (index.n_tables, index.n_bits) != (LSH_TABLES, LSH_BITS) or index.planes_from_seed
+
+def update_lsh_index(audio_folder: str, new_paths: List[str] = (), removed_names: List[str] = ()) -> LSHIndex:
+    """Hash the audio index rows of new files; call after update_audio_index."""
+    index = get_cached_lsh_index()
+    if lsh_index_is_stale(index):
+        return build_lsh_index(audio_folder)
+
+    new_names = [os.path.basename(path) for path in new_paths if path.endswith('.mid')]
+    if removed_names:
+        index.remove(removed_names)
+    if new_names:
+        audio_index = load_or_build_audio_index(audio_folder)
+        print(f"Adding {len(new_names)} MIDI files to LSH index")
+        index.insert(new_names, audio_index.features[audio_index.rows_for(new_names)])
+    return set_cached_lsh_index(index)
+
+def load_or_build_lsh_index(audio_folder: str) -> LSHIndex:
+    index = get_cached_lsh_index()
+    if lsh_index_is_stale(index):
+        return build_lsh_index(audio_folder)
+
+    added, removed = folder_changes(index, audio_folder)
+    if not added and not removed:
+        return index
+
+    print("LSH index is out of date, updating...")
+    return update_lsh_index(audio_folder, new_paths=added, removed_names=removed)
+
+def search_lsh_index(query_notes: List[Tuple[int, int]], audio_folder: str, n: int) -> Tuple[List[str], List[float]]:
+    """Rerank the songs sharing an LSH bucket with the query by exact histogram cosine."""
+    audio_index = load_or_build_audio_index(audio_folder)
+    query_vector = create_feature_vector(query_notes)
+
+    names, scores = lsh_search(load_or_build_lsh_index(audio_folder), audio_index, query_vector, n)
+    if not names:
+        print("No LSH bucket hits, falling back to full scan")
+        return rank_audio_index(audio_index, query_vector, n)
+    return names, scores
+
+def rerank_with_dtw(query_notes: List[Tuple[int, int]], audio_folder: str, names: List[str], scores: List[float], top_k: int = DTW_TOP_K) -> Tuple[List[str], List[float]]:
+    """Reorder the first top_k results by DTW between the query and song pitch contours.
+
+    Contours come from the n-gram index, so no MIDI file is parsed per
+    query. Every song keeps its own first-stage score, so after the
+    reorder the head's scores are no longer sorted.
+    """
+    ngram_index = load_or_build_ngram_index(audio_folder)
+
+    def load_pitches(name):
+        pitches = ngram_index.pitch_sequence(name)
+        if pitches is None:
+            # Not indexed yet (e.g. added since the last sync)
+            return [note for _, note in extract_melody(os.path.join(audio_folder, name))]
+        return pitches
+
+    reranked = dtw_rerank(
+        [note for _, note in query_notes], names[:top_k], load_pitches,
+        band=DTW_BAND, budget_ms=DTW_BUDGET_MS,
+    )
+    score_of = dict(zip(names, scores))
+    names = [name for name, _ in reranked] + names[top_k:]
+    return names, [score_of[name] for name in names]
+
+def search_audio(query_notes: List[Tuple[int, int]], audio_folder: str, n: int, mode: str = AUDIO_SEARCH_MODE, rerank: bool = AUDIO_DTW_RERANK) -> Tuple[List[str], List[float]]:
+    """First-stage search in the given mode, optionally followed by DTW reranking."""
+    if mode == "window":
+        print("Searching window index")
+        names, scores = search_window_index(query_notes, audio_folder, n)
+    elif mode == "ngram":
+        print("Searching n-gram index")
+        names, scores = search_ngram_index(query_notes, audio_folder, n)
+    elif mode == "lsh":
+        print("Searching LSH index")
+        names, scores = search_lsh_index(query_notes, audio_folder, n)
+    else:
+        print("Creating query feature vector")
+        query_vector = create_feature_vector(query_notes)
+        
+        print("Loading audio index")
+        index = load_or_build_audio_index(audio_folder)
+        names, scores = rank_audio_index(index, query_vector, n)
+
+    if rerank:
+        print("Reranking with DTW")
+        names, scores = rerank_with_dtw(query_notes, audio_folder, names, scores)
+    return names, scores
+
+def audio_retrieval_main(query_path: str, audio_folder: str, n: int = 50, mode: str = AUDIO_SEARCH_MODE, rerank: bool = AUDIO_DTW_RERANK) -> Tuple[List[str], List[float]]:
     try:
         print(f"Extracting query melody from {query_path}")
         query_notes = extract_melody(query_path)
         if not query_notes:
             raise ValueError("No valid notes found in query file")
-            
-        print("Creating query feature vector")
-        query_vector = create_feature_vector(query_notes)
-        
-        print("Processing database files")
-        similarities = []
-        
-        midi_files = [f for f in os.listdir(audio_folder) if f.endswith('.mid')]
-        total_files = len(midi_files)
-        
-        for i, filename in enumerate(midi_files, 1):
-            if i % 10 == 0:
-                print(f"Processing file {i}/{total_files}")
-                
-            full_path = os.path.join(audio_folder, filename)
-            try:
-                db_notes = extract_melody(full_path)
-                if db_notes:
-                    db_vector = create_feature_vector(db_notes)
-                    similarity = cosine_similarity(query_vector, db_vector)
-                    similarities.append((full_path, similarity))
-            except Exception as e:
-                print(f"Error processing {filename}: {str(e)}")
-                continue
-        
-        if not similarities:
-            raise ValueError("No valid comparisons could be made")
-
-        similarities.sort(key=lambda x: x[1], reverse=True)
-        top_n = similarities[:n]
-        
-        paths = [os.path.basename(path) for path, _ in top_n]
-        scores = [score for _, score in top_n]
         
-        return paths, scores
+        return search_audio(query_notes, audio_folder, n, mode=mode, rerank=rerank)
         
     except Exception as e:
         print(f"Error in audio retrieval: {str(e)}")
-        raise
\ No newline at end of file
+        raise
+
+def audio_retrieval_batch(query_paths: List[str], audio_folder: str, n: int = 50) -> List[Tuple[List[str], List[float]]]:
+    """Score many MIDI queries against the index in one pass.
+
+    Queries without notes get an empty result instead of failing the batch.
+    """
+    try:
+        query_vectors = []
+        valid_queries = []
+        for i, query_path in enumerate(query_paths):
+            query_notes = extract_melody(query_path)
+            if query_notes:
+                query_vectors.append(create_feature_vector(query_notes))
+                valid_queries.append(i)
+            else:
+                print(f"No valid notes found in query file {query_path}")
+
+        results = [([], []) for _ in query_paths]
+        if not query_vectors:
+            return results
+
+        index = load_or_build_audio_index(audio_folder)
+        for i, result in zip(valid_queries, rank_audio_index_batch(index, query_vectors, n)):
+            results[i] = result
+        return results
+
+    except Exception as e:
+        print(f"Error in batch audio retrieval: {str(e)}")
+        raise
+
+if __name__ == "__main__":
+    # Offline index build: python -m routes.audio [audio_folder]
+    folder = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.dirname(__file__)), "music_audios")
+    build_audio_index(folder)
+    build_window_index(folder)
+    build_ngram_index(folder)
+    build_lsh_index(folder)
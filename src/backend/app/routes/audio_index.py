@@ -0,0 +1,89 @@
+import os
+import numpy as np
+from .index_store import INDEX_DIR, CachedIndex, save_npz
+from .similarity import l2_normalize, cosine_similarities, top_k_indices
+
+AUDIO_INDEX_PATH = os.path.join(INDEX_DIR, "audio_index.npz")
+FEATURE_DIM = 638  # 128 ATB + 255 RTB + 255 FTB bins
+
+class AudioIndex:
+    """N x 638 float32 matrix of MIDI feature vectors plus the file name of each row.
+
+    Rows are stored L2-normalized, so cosine similarity is a plain dot product.
+    Files without notes keep an all-zero row and are never returned.
+    """
+
+    def __init__(self, names, features):
+        self.names = list(names)
+        features = np.asarray(features, dtype=np.float32).reshape(len(self.names), FEATURE_DIM)
+        self.features = l2_normalize(features)
+        self._valid = None
+        self._rows = None
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, names, features):
+        """Append rows, replacing any existing rows with the same name."""
+        names = list(names)
+        self.remove(names)
+        features = l2_normalize(np.asarray(features, dtype=np.float32).reshape(len(names), FEATURE_DIM))
+        self.names.extend(names)
+        self.features = np.vstack([self.features, features])
+        self._valid = None
+        self._rows = None
+        return self
+
+    def remove(self, names):
+        removed = set(names)
+        keep = [i for i, name in enumerate(self.names) if name not in removed]
+        if len(keep) != len(self.names):
+            self.names = [self.names[i] for i in keep]
+            self.features = self.features[keep]
+            self._valid = None
+            self._rows = None
+        return self
+
+    @property
+    def valid(self):
+        """Mask of rows that came from files with at least one note."""
+        if self._valid is None:
+            self._valid = np.any(self.features != 0, axis=1)
+        return self._valid
+
+    def rows_for(self, names):
+        """Row index of each name (names must be in the index)."""
+        if self._rows is None:
+            self._rows = {name: i for i, name in enumerate(self.names)}
+        return np.array([self._rows[name] for name in names], dtype=np.intp)
+
+    def cosine_scores(self, query_vectors):
+        """(Q, N) cosine similarities for one or many queries in a single GEMM."""
+        return cosine_similarities(np.asarray(query_vectors, dtype=np.float32), self.features)
+
+    def search(self, query_vectors, k):
+        """Top-k (indices, scores) per query, best first, skipping empty rows."""
+        scores = self.cosine_scores(query_vectors)
+        scores[:, ~self.valid] = -np.inf
+        k = min(k, int(np.count_nonzero(self.valid)))
+        indices = top_k_indices(scores, k, largest=True)
+        return indices, np.take_along_axis(scores, indices, axis=1)
+
+    def save(self, path=AUDIO_INDEX_PATH):
+        save_npz(path, names=np.array(self.names, dtype=str), features=self.features)
+        print(f"Audio index saved to {path} ({len(self)} files)")
+
+    @classmethod
+    def load(cls, path=AUDIO_INDEX_PATH):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(names=data["names"].tolist(), features=data["features"])
+
+_cache = CachedIndex(AudioIndex.load, "audio")
+
+def get_cached_audio_index(path=AUDIO_INDEX_PATH):
+    """Load the audio index from disk, reloading only when the file has changed."""
+    return _cache.get(path)
+
+def set_cached_audio_index(index, path=AUDIO_INDEX_PATH):
+    """Persist the audio index and make it the active index for this process."""
+    return _cache.set(index, path)
@@ -5,7 +5,8 @@ import shutil
 from tempfile import NamedTemporaryFile
 import time
 import traceback
-from .audio import audio_retrieval_main
+from .audio import audio_retrieval_main, audio_retrieval_batch, AUDIO_SEARCH_MODE, AUDIO_SEARCH_MODES, AUDIO_DTW_RERANK
+from .executor import run_retrieval
 
 router = APIRouter(tags=["audio-retrieval"])
 
@@ -16,7 +17,7 @@ print(f"Audio Route - BASE_DIR: {BASE_DIR}")
 print(f"Audio Route - AUDIO_FOLDER: {AUDIO_FOLDER}")
 
 @router.post("/audio-search")
-async def search_similar_audio(file: UploadFile = File(...)):
+async def search_similar_audio(file: UploadFile = File(...), mode: str = AUDIO_SEARCH_MODE, rerank: bool = AUDIO_DTW_RERANK):
     print(UploadFile)
     temp = None
     try:
@@ -28,6 +29,12 @@ async def search_similar_audio(file: UploadFile = File(...)):
                 content={"error": "File must be an audio file"}
             )
         
+        if mode not in AUDIO_SEARCH_MODES:
+            return JSONResponse(
+                status_code=400,
+                content={"error": f"mode must be one of {', '.join(AUDIO_SEARCH_MODES)}"}
+            )
+        
         start_time = time.time()
         
         print("Creating temporary file...")
@@ -42,7 +49,7 @@ async def search_similar_audio(file: UploadFile = File(...)):
         print(f"Audio folder path: {AUDIO_FOLDER}")
         
         print("Starting audio retrieval main function...")
-        top_similar, distances = audio_retrieval_main(temp_path, AUDIO_FOLDER)
+        top_similar, distances = await run_retrieval(audio_retrieval_main, temp_path, AUDIO_FOLDER, mode=mode, rerank=rerank)
         
         print("Processing results...")
         relative_paths = [os.path.basename(path) for path in top_similar]
@@ -80,4 +87,55 @@ async def search_similar_audio(file: UploadFile = File(...)):
                 if os.path.exists(temp.name):
                     os.unlink(temp.name)
         except Exception as cleanup_error:
-            print(f"Warning: Error during cleanup: {cleanup_error}")
\ No newline at end of file
+            print(f"Warning: Error during cleanup: {cleanup_error}")
+
+@router.post("/audio-search-batch")
+async def search_similar_audio_batch(files: list[UploadFile] = File(...)):
+    temp_paths = []
+    try:
+        print(f"Starting batch audio search for {len(files)} files...")
+        start_time = time.time()
+        
+        for file in files:
+            temp = NamedTemporaryFile(delete=False)
+            temp_paths.append(temp.name)
+            with temp:
+                shutil.copyfileobj(file.file, temp)
+        
+        results = await run_retrieval(audio_retrieval_batch, temp_paths, AUDIO_FOLDER)
+        
+        execution_time = (time.time() - start_time) * 1000  # Convert to milliseconds
+        print(f"Batch search completed in {execution_time}ms")
+        
+        return JSONResponse(content={
+            "results": [
+                {
+                    "query": file.filename,
+                    "similar_audios": names,
+                    "similarity_scores": scores
+                }
+                for file, (names, scores) in zip(files, results)
+            ],
+            "execution_time": execution_time
+        })
+        
+    except Exception as e:
+        print(f"Error in search_similar_audio_batch: {str(e)}")
+        print(f"Full traceback: {traceback.format_exc()}")
+        return JSONResponse(
+            status_code=500,
+            content={
+                "error": str(e),
+                "traceback": traceback.format_exc()
+            }
+        )
+        
+    finally:
+        for file in files:
+            file.file.close()
+        for temp_path in temp_paths:
+            try:
+                if os.path.exists(temp_path):
+                    os.unlink(temp_path)
+            except Exception as cleanup_error:
+                print(f"Warning: Error during cleanup: {cleanup_error}")
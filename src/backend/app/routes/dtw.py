@@ -0,0 +1,88 @@
+import time
+import numpy as np
+
+def normalize_pitches(pitches):
+    """Z-score a pitch sequence so transposition and vocal range don't matter."""
+    pitches = np.asarray(pitches, dtype=np.float32)
+    std = pitches.std()
+    return (pitches - pitches.mean()) / (std if std > 0 else 1)
+
+def sliding_windows(sequence, length, hop):
+    """(W, length) view of every window of the sequence, stepping by hop."""
+    sequence = np.asarray(sequence)
+    if len(sequence) < length:
+        return np.zeros((0, length), dtype=sequence.dtype)
+    windows = np.lib.stride_tricks.sliding_window_view(sequence, length)
+    return windows[::hop]
+
+def banded_dtw(query, windows, band):
+    """DTW distance between one query and a batch of equal-length windows.
+
+    The recurrence D[i, j] = cost[i, j] + min(D[i-1, j-1], D[i-1, j], D[i, j-1])
+    is evaluated one anti-diagonal (i + j = d) at a time: every cell on a
+    diagonal depends only on the two previous diagonals, so each step is a
+    single vectorized update over all windows and all in-band cells.
+    Cells further than band from the (scaled) main diagonal are never
+    visited (Sakoe-Chiba band). Distances are normalized by path length.
+    """
+    query = np.asarray(query, dtype=np.float32)
+    windows = np.atleast_2d(np.asarray(windows, dtype=np.float32))
+    n_windows, n = windows.shape
+    m = len(query)
+    if n_windows == 0 or m == 0 or n == 0:
+        return np.full(n_windows, np.inf, dtype=np.float32)
+
+    # Keep the band wide enough to reach the end cell when lengths differ
+    band = max(band, abs(m - n))
+    cost = np.abs(query[None, :, None] - windows[:, None, :])
+    D = np.full((n_windows, m + 1, n + 1), np.inf, dtype=np.float32)
+    D[:, 0, 0] = 0
+
+    for d in range(2, m + n + 1):
+        i = np.arange(max(1, d - n), min(m, d - 1) + 1)
+        j = d - i
+        in_band = np.abs(i * (n / m) - j) <= band
+        i, j = i[in_band], j[in_band]
+        if len(i) == 0:
+            continue
+        best = np.minimum(np.minimum(D[:, i - 1, j - 1], D[:, i - 1, j]), D[:, i, j - 1])
+        D[:, i, j] = cost[:, i - 1, j - 1] + best
+
+    return D[:, m, n] / (m + n)
+
+def dtw_rerank(query_pitches, candidates, load_pitches, band, max_query_notes=64, budget_ms=200.0):
+    """Rerank candidate songs by their best-matching window under banded DTW.
+
+    candidates are song names in first-stage order; load_pitches(name)
+    returns that song's pitch sequence. Songs are processed in order until
+    the latency budget runs out; the rest keep their first-stage order
+    after the reranked ones, followed by songs without notes. Returns
+    [(name, score)], score = 1 / (1 + dtw) for reranked songs and None
+    for the rest.
+    """
+    start = time.perf_counter()
+    query = normalize_pitches(query_pitches[:max_query_notes])
+    length = len(query)
+    hop = max(1, length // 4)
+
+    reranked = []
+    unmatched = []
+    remaining = list(candidates)
+    while remaining and (time.perf_counter() - start) * 1000 < budget_ms:
+        name = remaining.pop(0)
+        pitches = np.asarray(load_pitches(name), dtype=np.float32)
+        if len(pitches) == 0:
+            unmatched.append(name)
+            continue
+        # Songs shorter than the query are matched whole
+        windows = sliding_windows(pitches, length, hop) if len(pitches) >= length else pitches[None, :]
+        # Normalize each window like the query so matching ignores key
+        means = windows.mean(axis=1, keepdims=True)
+        stds = windows.std(axis=1, keepdims=True)
+        windows = (windows - means) / np.where(stds > 0, stds, 1)
+        reranked.append((name, float(banded_dtw(query, windows, band).min())))
+
+    if remaining:
+        print(f"DTW budget of {budget_ms}ms exhausted, {len(remaining)} candidates not reranked")
+    reranked.sort(key=lambda item: item[1])
+    return [(name, 1 / (1 + distance)) for name, distance in reranked] + [(name, None) for name in remaining + unmatched]
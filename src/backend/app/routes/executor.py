@@ -0,0 +1,77 @@
+import os
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from fastapi import APIRouter
+
+router = APIRouter(tags=["retrieval"])
+
+# Process pool for NumPy-heavy retrieval so the event loop keeps serving requests
+RETRIEVAL_WORKERS = int(os.environ.get("RETRIEVAL_WORKERS", max(1, (os.cpu_count() or 1) // 2)))
+# Searches allowed in flight at once; the rest wait in the queue
+RETRIEVAL_MAX_CONCURRENCY = int(os.environ.get("RETRIEVAL_MAX_CONCURRENCY", RETRIEVAL_WORKERS * 2))
+
+_executor = None
+_semaphore = None
+_stats = {"queued": 0, "running": 0, "completed": 0, "failed": 0}
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        print(f"Starting retrieval pool with {RETRIEVAL_WORKERS} workers")
+        _executor = ProcessPoolExecutor(max_workers=RETRIEVAL_WORKERS)
+    return _executor
+
+def _get_semaphore():
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(RETRIEVAL_MAX_CONCURRENCY)
+    return _semaphore
+
+async def run_retrieval(func, *args, **kwargs):
+    """Run a module-level retrieval function in the process pool.
+
+    At most RETRIEVAL_MAX_CONCURRENCY calls run at once; callers beyond
+    that wait here and are counted in the queue depth.
+    """
+    loop = asyncio.get_running_loop()
+    started = False
+    _stats["queued"] += 1
+    try:
+        async with _get_semaphore():
+            started = True
+            _stats["queued"] -= 1
+            _stats["running"] += 1
+            try:
+                result = await loop.run_in_executor(get_executor(), partial(func, *args, **kwargs))
+                _stats["completed"] += 1
+                return result
+            except Exception:
+                _stats["failed"] += 1
+                raise
+            finally:
+                _stats["running"] -= 1
+    finally:
+        # Cancelled while still waiting for a slot
+        if not started:
+            _stats["queued"] -= 1
+
+def retrieval_stats():
+    return {
+        "workers": RETRIEVAL_WORKERS,
+        "max_concurrency": RETRIEVAL_MAX_CONCURRENCY,
+        "queue_depth": _stats["queued"],
+        "running": _stats["running"],
+        "completed": _stats["completed"],
+        "failed": _stats["failed"],
+    }
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+@router.get("/retrieval-stats")
+async def get_retrieval_stats():
+    return retrieval_stats()
@@ -7,12 +7,33 @@ import shutil
 from tempfile import NamedTemporaryFile
 import time
 import traceback
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from .image_index import ImageIndex, get_cached_index, set_cached_index
+from .image_cache import ImageFeatureCache
+from .ivf import IVFIndex, get_cached_ivf_index, set_cached_ivf_index, IVF_NPROBE
+from .pca import truncated_svd
+from .executor import run_retrieval
 
 router = APIRouter(tags=["image-retrieval"])
 
 BASE_DIR = os.path.dirname(os.path.dirname(__file__))
 IMAGE_FOLDER = os.path.join(BASE_DIR, "album_images")
 
+IMAGE_WIDTH, IMAGE_HEIGHT = 300, 300
+N_COMPONENTS = 50
+
+# Preprocessing pool; folders smaller than PARALLEL_MIN_IMAGES are handled inline
+IMAGE_WORKERS = int(os.environ.get("IMAGE_WORKERS", os.cpu_count() or 1))
+PARALLEL_MIN_IMAGES = 32
+MAX_CHUNK_SIZE = 64
+
+# Probe an IVF coarse quantizer instead of scanning every projected album
+IMAGE_SEARCH_IVF = os.environ.get("IMAGE_SEARCH_IVF", "0") == "1"
+# Rebuild instead of updating when more than this fraction of the index changes:
+# partial_fit never takes removed images out of the PCA basis
+IMAGE_REBUILD_FRACTION = float(os.environ.get("IMAGE_REBUILD_FRACTION", 0.25))
+
 os.makedirs(IMAGE_FOLDER, exist_ok=True)
 
 print(f"Current working directory: {os.getcwd()}")
@@ -23,9 +44,10 @@ if os.path.exists(IMAGE_FOLDER):
     print(f"Images in folder: {os.listdir(IMAGE_FOLDER)}")
 
 # [Semua fungsi helper tetap sama sampai image_retrieval_main]
+VALID_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
 def get_paths(folder):
-    valid = ('.png', '.jpg', '.jpeg')
-    paths = [os.path.join(folder, f) for f in os.listdir(folder) if f.endswith(valid)]
+    paths = [os.path.join(folder, f) for f in os.listdir(folder) if f.endswith(VALID_EXTENSIONS)]
     if not paths:
         raise ValueError(f"No valid images found in {folder}")
     return paths
@@ -63,6 +85,80 @@ def flatten_image(image):
         print(f"Error flattening image: {str(e)}")
         raise
 
+def load_image_vector(image_path, width, height):
+    """Decode, grayscale, resize and flatten one image into a uint8 vector.
+
+    JPEG draft mode lets the decoder downscale by a power of two while
+    decoding, and convert('L') uses the same 299/587/114 luma weights as
+    convert_grayscale without the float64 round trip.
+    """
+    with Image.open(image_path) as image:
+        image.draft('L', (width, height))
+        if image.mode not in ('L', 'RGB'):
+            image = image.convert('RGB')
+        grayscale_image = image.convert('L')
+        resized_image = grayscale_image.resize((width, height), Image.Resampling.LANCZOS)
+        return np.asarray(resized_image, dtype=np.uint8).reshape(-1)
+
+def _load_image_vector_safe(image_path, width, height):
+    try:
+        return load_image_vector(image_path, width, height)
+    except Exception as e:
+        print(f"Error processing image {image_path}: {str(e)}")
+        return None
+
+def process_image_paths(image_paths, width, height, workers=None, use_cache=True):
+    """Process images into an (N, width*height) matrix, returning it with the paths that succeeded.
+
+    Vectors are served from the content-hash feature cache when possible;
+    only cache misses are decoded.
+    """
+    image_paths = list(image_paths)
+    workers = IMAGE_WORKERS if workers is None else workers
+    cache = ImageFeatureCache(width, height) if use_cache else None
+
+    vectors = [None] * len(image_paths)
+    missing = []
+    for i, path in enumerate(image_paths):
+        if cache is not None:
+            try:
+                vectors[i] = cache.get(path)
+            except OSError as e:
+                print(f"Error reading image cache for {path}: {str(e)}")
+        if vectors[i] is None:
+            missing.append(i)
+
+    if missing:
+        print(f"Decoding {len(missing)} images ({len(image_paths) - len(missing)} cached)")
+        missing_paths = [image_paths[i] for i in missing]
+        loader = partial(_load_image_vector_safe, width=width, height=height)
+        if workers > 1 and len(missing_paths) >= PARALLEL_MIN_IMAGES:
+            chunk_size = max(1, min(MAX_CHUNK_SIZE, len(missing_paths) // (workers * 4)))
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                decoded = list(executor.map(loader, missing_paths, chunksize=chunk_size))
+        else:
+            decoded = [loader(path) for path in missing_paths]
+
+        for i, vector in zip(missing, decoded):
+            vectors[i] = vector
+            if cache is not None and vector is not None:
+                cache.put(image_paths[i], vector)
+
+    if cache is not None:
+        cache.save_manifest()
+
+    return _collect_vectors(image_paths, vectors, width * height)
+
+def _collect_vectors(image_paths, vectors, n_features):
+    arr_images = np.empty((len(image_paths), n_features), dtype=np.uint8)
+    processed_paths = []
+    for path, vector in zip(image_paths, vectors):
+        if vector is None:
+            continue
+        arr_images[len(processed_paths)] = vector
+        processed_paths.append(path)
+    return arr_images[:len(processed_paths)], processed_paths
+
 def image_processing(image_folder, width, height):
     if not os.path.exists(image_folder):
         raise ValueError(f"Image folder does not exist: {image_folder}")
@@ -71,21 +167,12 @@ def image_processing(image_folder, width, height):
     if not image_paths:
         raise ValueError("No valid images found in the database")
     
-    arr_images = []
-    for path in image_paths:
-        try:
-            grayscaled_image = convert_grayscale(path)
-            resized_image = resize_image(grayscaled_image, width, height)
-            flattened_image = flatten_image(resized_image)
-            arr_images.append(flattened_image)
-        except Exception as e:
-            print(f"Error processing image {path}: {str(e)}")
-            continue
+    arr_images, _ = process_image_paths(image_paths, width, height)
             
-    if not arr_images:
+    if len(arr_images) == 0:
         raise ValueError("No images could be processed")
         
-    return np.array(arr_images)
+    return arr_images
 
 def center_data(arr_images):
     try:
@@ -96,10 +183,9 @@ def center_data(arr_images):
         print(f"Error in center_data: {str(e)}")
         raise
 
-def compute_PCA(arr_images_standardized, n_components):
+def compute_PCA(arr_images_standardized, n_components, solver="auto"):
     try:
-        U, S, Ut = np.linalg.svd(arr_images_standardized, full_matrices=False)
-        top_component = Ut[:n_components]
+        top_component, _ = truncated_svd(arr_images_standardized, n_components, solver=solver)
         projected = np.dot(arr_images_standardized, top_component.T)
         return projected, top_component
     except Exception as e:
@@ -108,10 +194,8 @@ def compute_PCA(arr_images_standardized, n_components):
 
 def preprocess_query(query_path, width, height):
     try:
-        query_grayscale = convert_grayscale(query_path)
-        query_resized = resize_image(query_grayscale, width, height)
-        flatten_query = flatten_image(query_resized)
-        return flatten_query
+        # Same decode path as the index so query and album vectors are comparable
+        return load_image_vector(query_path, width, height)
     except Exception as e:
         print(f"Error in preprocess_query: {str(e)}")
         raise
@@ -132,42 +216,146 @@ def euclidean_distance(query_vector, image_vector):
         print(f"Error in euclidean_distance: {str(e)}")
         raise
 
-def image_retrieval_main(query_path, image_folder, n):
+def build_image_index(image_folder, width=IMAGE_WIDTH, height=IMAGE_HEIGHT, n_components=N_COMPONENTS):
+    """Run the full preprocessing + PCA pipeline once and persist the result."""
+    if not os.path.exists(image_folder):
+        raise ValueError(f"Image folder does not exist: {image_folder}")
+
+    print("Building image index...")
+    images_array, processed_paths = process_image_paths(get_paths(image_folder), width, height)
+    if len(images_array) == 0:
+        raise ValueError("No images could be processed")
+
+    standardized_vector, mean_images = center_data(images_array)
+    projected_vector, top_components = compute_PCA(standardized_vector, n_components)
+
+    index = ImageIndex(
+        names=[os.path.basename(path) for path in processed_paths],
+        mean=mean_images,
+        components=top_components,
+        projected=projected_vector,
+        width=width,
+        height=height,
+    )
+    ImageFeatureCache(width, height).evict(index.names)
+    return set_cached_index(index)
+
+def update_image_index(image_folder, new_paths=(), removed_names=()):
+    """Incrementally add/remove album images in the stored index."""
+    index = get_cached_index()
+    if index is None:
+        return build_image_index(image_folder)
+
+    new_paths = [path for path in new_paths if path.endswith(VALID_EXTENSIONS)]
+    new_names = {os.path.basename(path) for path in new_paths}
+    # Files re-uploaded under an existing name replace their old row
+    stale_names = set(removed_names) | (new_names & set(index.names))
+    if len(stale_names) > IMAGE_REBUILD_FRACTION * len(index.names):
+        print(f"{len(stale_names)} of {len(index.names)} indexed images changed, rebuilding")
+        index = build_image_index(image_folder)
+        if IMAGE_SEARCH_IVF or get_cached_ivf_index() is not None:
+            build_ivf_index(index)
+        return index
+
+    if stale_names:
+        print(f"Removing {len(stale_names)} images from index")
+        index.remove(stale_names)
+
+    if new_paths:
+        print(f"Adding {len(new_paths)} images to index")
+        images_array, processed_paths = process_image_paths(list(new_paths), index.width, index.height)
+        if len(processed_paths) > 0:
+            index.partial_fit([os.path.basename(path) for path in processed_paths], images_array)
+
+    if stale_names:
+        ImageFeatureCache(index.width, index.height).evict(index.names)
+    set_cached_index(index)
+    # Keep the IVF index in step here, off the search path
+    if IMAGE_SEARCH_IVF or get_cached_ivf_index() is not None:
+        load_or_build_ivf_index(index, recluster=True)
+    return index
+
+def load_or_build_image_index(image_folder):
+    """Return the stored image index, syncing it with the album folder if needed."""
+    index = get_cached_index()
+    if index is None:
+        return build_image_index(image_folder)
+
+    folder_names = {os.path.basename(path) for path in get_paths(image_folder)}
+    indexed_names = set(index.names)
+    if folder_names == indexed_names:
+        if IMAGE_SEARCH_IVF:
+            load_or_build_ivf_index(index, recluster=True)
+        return index
+
+    print("Image index is out of date, updating...")
+    added = sorted(folder_names - indexed_names)
+    removed = indexed_names - folder_names
+    return update_image_index(
+        image_folder,
+        new_paths=[os.path.join(image_folder, name) for name in added],
+        removed_names=removed,
+    )
+
+def build_ivf_index(image_index):
+    print("Building IVF index...")
+    return set_cached_ivf_index(IVFIndex.build(image_index))
+
+def load_or_build_ivf_index(image_index, recluster=False):
+    """Return the IVF index for image_index.
+
+    When the image index has changed since the IVF index was saved, the
+    cells follow it incrementally (IVFIndex.follow). k-means only runs when
+    there is no IVF index yet, or with recluster=True once too many rows
+    were placed incrementally. Only index updates call this, never searches.
+    """
+    ivf_index = get_cached_ivf_index()
+    if ivf_index is None:
+        return build_ivf_index(image_index)
+    if ivf_index.matches(image_index):
+        return ivf_index
+
+    ivf_index = ivf_index.follow(image_index)
+    if recluster and ivf_index.needs_recluster():
+        print(f"{ivf_index.n_assigned} of {len(ivf_index)} images placed incrementally, re-clustering")
+        return build_ivf_index(image_index)
+    return set_cached_ivf_index(ivf_index)
+
+def get_search_index():
+    """The image index as last saved by an index update.
+
+    Searches run in the retrieval pool and only read it: building or
+    updating it there would stay private to one worker and race with
+    refresh_indexes over the same file.
+    """
+    index = get_cached_index()
+    if index is None:
+        raise ValueError("Image index has not been built yet")
+    return index
+
+def image_retrieval_main(query_path, image_folder, n, use_ivf=IMAGE_SEARCH_IVF, nprobe=IVF_NPROBE):
     try:
         print("Starting image retrieval process...")
-        width, height = 300, 300
         
-        print("Getting image paths...")
-        images_path = get_paths(image_folder)
-        
-        print("Processing images...")
-        images_array = image_processing(image_folder, width, height)
-        
-        print("Centering data...")
-        standardized_vector, mean_images = center_data(images_array)
-        
-        print("Computing PCA...")
-        n_component = 50
-        projected_vector, top_components = compute_PCA(standardized_vector, n_component)
+        print("Loading image index...")
+        index = get_search_index()
         
         print("Processing query image...")
-        flattened_query = preprocess_query(query_path, width, height)
-        proj_query = projected_query(flattened_query, mean_images, top_components)
+        flattened_query = preprocess_query(query_path, index.width, index.height)
+        proj_query = projected_query(flattened_query, index.mean, index.components)
         
         print("Computing distances...")
-        distances = np.array([euclidean_distance(proj_query, projected_vector[i]) 
-                            for i in range(len(projected_vector))])
-        
-        # Normalisasi distances ke similarity score (0-100%)
-        max_distance = np.max(distances)
-        similarity_scores = (1 - (distances / max_distance))
+        # Similarity = 1 - distance/max_distance, hasil sudah terurut dari tertinggi
+        ivf_index = get_cached_ivf_index() if use_ivf else None
+        if ivf_index is not None and ivf_index.matches(index):
+            top_indices, similarity_scores = ivf_index.search(index, proj_query, n, nprobe=nprobe)
+        else:
+            if use_ivf:
+                print("IVF index missing or behind the image index, scanning all images")
+            top_indices, similarity_scores = index.search(proj_query, n)
         
-        # Sort berdasarkan similarity (tertinggi ke terendah)
-        sort_indices = np.argsort(similarity_scores)[::-1]  # Reverse untuk descending
-        top_indices = sort_indices[:n]
-        
-        top_similar = [images_path[i] for i in top_indices]
-        top_similarities = similarity_scores[top_indices]
+        top_similar = [os.path.join(image_folder, index.names[i]) for i in top_indices[0]]
+        top_similarities = similarity_scores[0]
         
         return top_similar, top_similarities
         
@@ -175,6 +363,25 @@ def image_retrieval_main(query_path, image_folder, n):
         print(f"Error in image_retrieval_main: {str(e)}")
         raise
 
+def image_retrieval_batch(query_paths, image_folder, n):
+    """Score many query images against the index in a single distance computation."""
+    try:
+        index = get_search_index()
+        
+        flattened_queries = np.array([preprocess_query(path, index.width, index.height) for path in query_paths])
+        proj_queries = projected_query(flattened_queries, index.mean, index.components)
+        
+        top_indices, similarity_scores = index.search(proj_queries, n)
+        
+        return [
+            ([os.path.join(image_folder, index.names[i]) for i in row], scores)
+            for row, scores in zip(top_indices, similarity_scores)
+        ]
+        
+    except Exception as e:
+        print(f"Error in image_retrieval_batch: {str(e)}")
+        raise
+
 @router.post("/image-search")
 async def search_similar_images(file: UploadFile = File(...)):
     temp = None
@@ -201,7 +408,7 @@ async def search_similar_images(file: UploadFile = File(...)):
         print(f"Image folder path: {IMAGE_FOLDER}")
         
         print("Starting image retrieval main function...")
-        top_similar, distances = image_retrieval_main(temp_path, IMAGE_FOLDER, n=len(IMAGE_FOLDER))
+        top_similar, distances = await run_retrieval(image_retrieval_main, temp_path, IMAGE_FOLDER, n=len(IMAGE_FOLDER))
         
         print("Processing results...")
         # Perbaikan pembentukan relative paths
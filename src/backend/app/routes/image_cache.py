@@ -0,0 +1,94 @@
+import os
+import json
+import hashlib
+import numpy as np
+from .index_store import INDEX_DIR, atomic_open
+
+IMAGE_CACHE_DIR = os.path.join(INDEX_DIR, "image_cache")
+HASH_CHUNK_SIZE = 1 << 20
+
+def file_content_hash(path):
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class ImageFeatureCache:
+    """On-disk cache of preprocessed (flattened uint8) album vectors.
+
+    Vectors are stored as <content hash>.npy, so renamed or re-uploaded
+    copies of the same file reuse one entry. manifest.json maps each file
+    name to its (size, mtime, hash) so unchanged files skip re-hashing.
+    """
+
+    def __init__(self, width, height, cache_dir=IMAGE_CACHE_DIR):
+        self.width = width
+        self.height = height
+        self.cache_dir = os.path.join(cache_dir, f"{width}x{height}")
+        self.manifest_path = os.path.join(self.cache_dir, "manifest.json")
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {}
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable image cache manifest: {str(e)}")
+            return {}
+
+    def save_manifest(self):
+        with atomic_open(self.manifest_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f)
+
+    def _vector_path(self, content_hash):
+        return os.path.join(self.cache_dir, f"{content_hash}.npy")
+
+    def content_hash(self, path):
+        """Hash of the file, reusing the manifest entry when size and mtime are unchanged."""
+        name = os.path.basename(path)
+        stat = os.stat(path)
+        entry = self.manifest.get(name)
+        if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+            return entry["hash"]
+
+        content_hash = file_content_hash(path)
+        self.manifest[name] = {"size": stat.st_size, "mtime": stat.st_mtime, "hash": content_hash}
+        return content_hash
+
+    def get(self, path):
+        """Cached vector for path, or None on a miss."""
+        vector_path = self._vector_path(self.content_hash(path))
+        if not os.path.exists(vector_path):
+            return None
+        try:
+            vector = np.load(vector_path)
+        except (OSError, ValueError):
+            return None
+        return vector if vector.shape == (self.width * self.height,) else None
+
+    def put(self, path, vector):
+        vector_path = self._vector_path(self.content_hash(path))
+        with atomic_open(vector_path) as f:
+            np.save(f, np.asarray(vector, dtype=np.uint8))
+
+    def evict(self, keep_names):
+        """Drop manifest entries for deleted files and vectors nobody references anymore."""
+        keep_names = set(keep_names)
+        for name in [name for name in self.manifest if name not in keep_names]:
+            del self.manifest[name]
+
+        referenced = {entry["hash"] for entry in self.manifest.values()}
+        removed = 0
+        for filename in os.listdir(self.cache_dir):
+            content_hash, ext = os.path.splitext(filename)
+            if ext == ".npy" and content_hash not in referenced:
+                os.remove(os.path.join(self.cache_dir, filename))
+                removed += 1
+        self.save_manifest()
+        if removed:
+            print(f"Evicted {removed} cached image vectors")
+        return removed
@@ -0,0 +1,173 @@
+import os
+import numpy as np
+from .similarity import squared_norms, squared_euclidean_distances, top_k_indices
+from .index_store import INDEX_DIR, CachedIndex, save_npz
+
+IMAGE_INDEX_PATH = os.path.join(INDEX_DIR, "image_index.npz")
+
+class ImageIndex:
+    """PCA model (mean, top components) and the projected album matrix."""
+
+    def __init__(self, names, mean, components, projected, width, height,
+                 singular_values=None, n_samples=None):
+        self.names = list(names)
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.components = np.asarray(components, dtype=np.float64)
+        self.projected = np.asarray(projected, dtype=np.float64)
+        self.width = int(width)
+        self.height = int(height)
+        # projected = U * S, so the column norms recover the singular values
+        if singular_values is None:
+            singular_values = np.linalg.norm(self.projected, axis=0)
+        self.singular_values = np.asarray(singular_values, dtype=np.float64)
+        self.n_samples = len(self.names) if n_samples is None else int(n_samples)
+        self._sq_norms = None
+        self._by_norm = None
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def n_components(self):
+        return self.components.shape[0]
+
+    @property
+    def sq_norms(self):
+        """Cached ||x||^2 of every projected row, reset whenever rows change."""
+        if self._sq_norms is None:
+            self._sq_norms = squared_norms(self.projected)
+        return self._sq_norms
+
+    def max_distances(self, query_vectors, block_size=1024):
+        """(Q, 1) distance from each query to its farthest row: the normaliser of search().
+
+        Rows are visited in blocks of decreasing norm. Since
+        ||x||^2 - 2 q.x <= ||x||^2 + 2 ||q|| ||x||, a query stops once the
+        next block cannot beat its best so far, which usually leaves most
+        rows unread. Structures that only score some rows (IVF) use this to
+        report scores on the exact-scan scale.
+        """
+        if self._by_norm is None:
+            order = np.argsort(-self.sq_norms, kind='stable')
+            self._by_norm = (self.projected[order], self.sq_norms[order])
+        rows, sq_norms = self._by_norm
+        norms = np.sqrt(sq_norms)
+
+        query_vectors = np.atleast_2d(query_vectors)
+        max_distances = np.ones((len(query_vectors), 1))
+        for q, query in enumerate(query_vectors):
+            query_norm = np.sqrt(query @ query)
+            best = -np.inf
+            for start in range(0, len(rows), block_size):
+                if sq_norms[start] + 2 * query_norm * norms[start] <= best:
+                    break
+                block = slice(start, start + block_size)
+                best = max(best, float((sq_norms[block] - 2 * (rows[block] @ query)).max()))
+            farthest = np.sqrt(max(best + query_norm ** 2, 0)) if len(rows) else 0
+            if farthest > 0:
+                max_distances[q, 0] = farthest
+        return max_distances
+
+    def search(self, query_vectors, k):
+        """Top-k nearest rows for one or many projected queries.
+
+        Returns (indices, scores), both shaped (Q, k); scores are
+        1 - distance / max_distance per query, highest first.
+        """
+        sq_distances = squared_euclidean_distances(query_vectors, self.projected, self.sq_norms)
+        indices = top_k_indices(sq_distances, k, largest=False)
+        distances = np.sqrt(np.take_along_axis(sq_distances, indices, axis=1))
+        max_distances = np.sqrt(sq_distances.max(axis=1, keepdims=True))
+        max_distances[max_distances == 0] = 1
+        return indices, 1 - distances / max_distances
+
+    def partial_fit(self, names, images_array, batch_size=64):
+        """Fold new images into the PCA model without recomputing the full SVD.
+
+        Each batch updates mean/components from an SVD of the small
+        (k + batch + 1) x D matrix [S*V; X_batch - mean_batch; mean correction],
+        then the stored projections are rotated into the new basis.
+        """
+        images_array = np.asarray(images_array, dtype=np.float64)
+        names = list(names)
+        for start in range(0, len(names), batch_size):
+            batch = images_array[start:start + batch_size]
+            n_old, n_batch = self.n_samples, len(batch)
+            n_total = n_old + n_batch
+
+            batch_mean = np.mean(batch, axis=0)
+            new_mean = (n_old * self.mean + n_batch * batch_mean) / n_total
+            mean_correction = np.sqrt(n_old * n_batch / n_total) * (self.mean - batch_mean)
+
+            stacked = np.vstack([
+                self.singular_values[:, None] * self.components,
+                batch - batch_mean,
+                mean_correction,
+            ])
+            _, S, Vt = np.linalg.svd(stacked, full_matrices=False)
+            k = min(self.n_components, Vt.shape[0])
+            new_components = Vt[:k]
+
+            # x - new_mean ~= projected @ old_components + (old_mean - new_mean)
+            rotation = self.components @ new_components.T
+            shift = (self.mean - new_mean) @ new_components.T
+            old_projected = self.projected @ rotation + shift
+            new_projected = (batch - new_mean) @ new_components.T
+
+            self.projected = np.vstack([old_projected, new_projected])
+            self.components = new_components
+            self.singular_values = S[:k]
+            self.mean = new_mean
+            self.n_samples = n_total
+            self.names.extend(names[start:start + batch_size])
+            self._sq_norms = None
+            self._by_norm = None
+        return self
+
+    def remove(self, names):
+        """Drop rows from the projected matrix; the PCA basis is kept as is."""
+        removed = set(names)
+        keep = [i for i, name in enumerate(self.names) if name not in removed]
+        self.names = [self.names[i] for i in keep]
+        self.projected = self.projected[keep]
+        self._sq_norms = None
+        self._by_norm = None
+        return self
+
+    def save(self, path=IMAGE_INDEX_PATH):
+        save_npz(
+            path,
+            names=np.array(self.names, dtype=str),
+            mean=self.mean,
+            components=self.components,
+            projected=self.projected,
+            shape=np.array([self.width, self.height]),
+            singular_values=self.singular_values,
+            n_samples=np.array(self.n_samples),
+        )
+        print(f"Image index saved to {path} ({len(self)} images)")
+
+    @classmethod
+    def load(cls, path=IMAGE_INDEX_PATH):
+        with np.load(path, allow_pickle=False) as data:
+            width, height = data["shape"].tolist()
+            return cls(
+                names=data["names"].tolist(),
+                mean=data["mean"],
+                components=data["components"],
+                projected=data["projected"],
+                width=width,
+                height=height,
+                singular_values=data["singular_values"] if "singular_values" in data else None,
+                n_samples=int(data["n_samples"]) if "n_samples" in data else None,
+            )
+
+_cache = CachedIndex(ImageIndex.load, "image")
+
+def get_cached_index(path=IMAGE_INDEX_PATH):
+    """Load the index from disk, reloading only when the file has changed."""
+    return _cache.get(path)
+
+def set_cached_index(index, path=IMAGE_INDEX_PATH):
+    """Persist the index and make it the active index for this process."""
+    return _cache.set(index, path)
@@ -0,0 +1,71 @@
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(__file__))
+INDEX_DIR = os.path.join(BASE_DIR, "index")
+
+os.makedirs(INDEX_DIR, exist_ok=True)
+
+@contextmanager
+def atomic_open(path, mode="wb", **kwargs):
+    """Open a uniquely named temp file next to path and rename it over path on success.
+
+    Readers never see a half-written file, and concurrent writers (one per
+    uvicorn worker) never share a temp file: the last rename wins whole.
+    """
+    directory, filename = os.path.split(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f"{filename}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode, **kwargs) as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def save_npz(path, **arrays):
+    with atomic_open(path) as f:
+        np.savez(f, **arrays)
+
+def _file_version(path):
+    stat = os.stat(path)
+    # os.replace gives every save a new inode, even within one mtime tick
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+class CachedIndex:
+    """The process-wide instance of one persisted index.
+
+    get() loads the file on first use and again whenever another process
+    has replaced it; set() saves an index and makes it the active one
+    without reading it back.
+    """
+
+    def __init__(self, loader, label):
+        self.loader = loader
+        self.label = label
+        self.index = None
+        self.path = None
+        self.version = None
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        with self._lock:
+            if not os.path.exists(path):
+                return None
+            version = _file_version(path)
+            if self.index is None or self.path != path or self.version != version:
+                print(f"Loading {self.label} index from {path}")
+                self.index = self.loader(path)
+                self.path, self.version = path, version
+            return self.index
+
+    def set(self, index, path):
+        with self._lock:
+            index.save(path)
+            self.index = index
+            self.path, self.version = path, _file_version(path)
+            return index
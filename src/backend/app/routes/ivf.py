@@ -0,0 +1,214 @@
+import os
+import time
+import numpy as np
+from .index_store import INDEX_DIR, CachedIndex, save_npz
+from .similarity import squared_norms, squared_euclidean_distances, top_k_indices
+
+IVF_INDEX_PATH = os.path.join(INDEX_DIR, "image_ivf.npz")
+
+# 0 picks sqrt(N) cells at build time
+IVF_CELLS = int(os.environ.get("IVF_CELLS", 0))
+IVF_NPROBE = int(os.environ.get("IVF_NPROBE", 4))
+# Re-run k-means once more than this fraction of the rows joined cells incrementally
+IVF_RECLUSTER_FRACTION = float(os.environ.get("IVF_RECLUSTER_FRACTION", 0.25))
+KMEANS_ITERATIONS = 25
+KMEANS_SEED = 2123
+
+def kmeans(data, n_clusters, n_iter=KMEANS_ITERATIONS, seed=KMEANS_SEED):
+    """Lloyd's k-means with k-means++ seeding; returns (centroids, labels).
+
+    Clusters that lose all their points are reseeded with the point
+    furthest from its centroid.
+    """
+    data = np.asarray(data, dtype=np.float64)
+    n_clusters = max(1, min(n_clusters, len(data)))
+    rng = np.random.default_rng(seed)
+    data_sq_norms = squared_norms(data)
+
+    centroids = np.empty((n_clusters, data.shape[1]))
+    centroids[0] = data[rng.integers(len(data))]
+    closest = squared_euclidean_distances(centroids[:1], data, data_sq_norms)[0]
+    for c in range(1, n_clusters):
+        total = closest.sum()
+        pick = rng.choice(len(data), p=closest / total) if total > 0 else rng.integers(len(data))
+        centroids[c] = data[pick]
+        np.minimum(closest, squared_euclidean_distances(centroids[c:c + 1], data, data_sq_norms)[0], out=closest)
+
+    labels = None
+    for _ in range(n_iter):
+        distances = squared_euclidean_distances(data, centroids, squared_norms(centroids))
+        new_labels = distances.argmin(axis=1)
+        if labels is not None and np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+
+        counts = np.bincount(labels, minlength=n_clusters)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, data)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+
+        point_distances = distances[np.arange(len(data)), labels]
+        for c in np.flatnonzero(~filled):
+            far = int(point_distances.argmax())
+            centroids[c] = data[far]
+            point_distances[far] = 0
+    return centroids, labels
+
+def _cell_means(data, labels, n_cells):
+    counts = np.bincount(labels, minlength=n_cells)
+    sums = np.zeros((n_cells, data.shape[1]))
+    np.add.at(sums, labels, data)
+    return sums / np.maximum(counts, 1)[:, None]
+
+class IVFIndex:
+    """Inverted-file index over the projected rows of an ImageIndex.
+
+    Rows are grouped by their nearest k-means centroid; cell c holds
+    rows[starts[c]:starts[c + 1]]. names and n_samples record which
+    ImageIndex state the cells belong to, since partial_fit rotates every
+    projection; follow() carries the cells over to a newer state without
+    re-clustering. n_assigned counts the rows placed that way since the
+    last k-means.
+    """
+
+    def __init__(self, names, n_samples, centroids, labels, n_assigned=0):
+        self.names = list(names)
+        self.n_samples = int(n_samples)
+        self.n_assigned = int(n_assigned)
+        self.centroids = np.asarray(centroids, dtype=np.float64)
+        self.labels = np.asarray(labels, dtype=np.int32)
+        self.rows = np.argsort(self.labels, kind='stable')
+        counts = np.bincount(self.labels, minlength=self.n_cells)
+        self.starts = np.concatenate([[0], np.cumsum(counts)])
+        self._centroid_sq_norms = squared_norms(self.centroids)
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def n_cells(self):
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, image_index, n_cells=IVF_CELLS):
+        n_cells = n_cells or int(round(np.sqrt(len(image_index))))
+        centroids, labels = kmeans(image_index.projected, n_cells)
+        return cls(image_index.names, image_index.n_samples, centroids, labels)
+
+    def matches(self, image_index):
+        return self.n_samples == image_index.n_samples and self.names == image_index.names
+
+    def needs_recluster(self, fraction=IVF_RECLUSTER_FRACTION):
+        return self.n_assigned > fraction * max(len(self), 1)
+
+    def follow(self, image_index):
+        """IVF index for a newer state of image_index, without running k-means.
+
+        Rows that are still present keep their cell, and each centroid is
+        recomputed as the mean of its rows in the current projection
+        (cells left empty are dropped). New rows join their nearest
+        centroid, then the centroids are recomputed once more with them.
+        """
+        label_of = dict(zip(self.names, self.labels.tolist()))
+        labels = np.array([label_of.get(name, -1) for name in image_index.names], dtype=np.int64)
+        known = labels >= 0
+        if not known.any():
+            return IVFIndex.build(image_index, self.n_cells)
+
+        projected = image_index.projected
+        counts = np.bincount(labels[known], minlength=self.n_cells)
+        filled = counts > 0
+        labels[known] = (np.cumsum(filled) - 1)[labels[known]]
+        centroids = _cell_means(projected[known], labels[known], int(filled.sum()))
+
+        new_rows = np.flatnonzero(~known)
+        if len(new_rows):
+            distances = squared_euclidean_distances(projected[new_rows], centroids, squared_norms(centroids))
+            labels[new_rows] = distances.argmin(axis=1)
+            centroids = _cell_means(projected, labels, len(centroids))
+        return IVFIndex(image_index.names, image_index.n_samples, centroids, labels,
+                        n_assigned=self.n_assigned + len(new_rows))
+
+    def search(self, image_index, query_vector, k, nprobe=IVF_NPROBE):
+        """Top-k rows of image_index among the nprobe cells closest to one projected query.
+
+        Returns (indices, scores) shaped like ImageIndex.search, scaled by
+        the same farthest-row distance so the two are comparable.
+        """
+        centroid_distances = squared_euclidean_distances(query_vector, self.centroids, self._centroid_sq_norms)
+        cells = top_k_indices(centroid_distances, nprobe, largest=False)[0]
+        candidates = np.concatenate([self.rows[self.starts[c]:self.starts[c + 1]] for c in cells])
+
+        sq_distances = squared_euclidean_distances(
+            query_vector, image_index.projected[candidates], image_index.sq_norms[candidates]
+        )
+        order = top_k_indices(sq_distances, k, largest=False)
+        distances = np.sqrt(np.take_along_axis(sq_distances, order, axis=1))
+        return candidates[order], 1 - distances / image_index.max_distances(query_vector)
+
+    def save(self, path=IVF_INDEX_PATH):
+        save_npz(
+            path,
+            names=np.array(self.names, dtype=str),
+            n_samples=np.array(self.n_samples),
+            centroids=self.centroids,
+            labels=self.labels,
+            n_assigned=np.array(self.n_assigned),
+        )
+        print(f"IVF index saved to {path} ({len(self)} images, {self.n_cells} cells)")
+
+    @classmethod
+    def load(cls, path=IVF_INDEX_PATH):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                names=data["names"].tolist(),
+                n_samples=int(data["n_samples"]),
+                centroids=data["centroids"],
+                labels=data["labels"],
+                n_assigned=int(data["n_assigned"]) if "n_assigned" in data else 0,
+            )
+
+def benchmark_ivf(image_index, ivf_index, k=10, nprobes=(1, 2, 4, 8, 16)):
+    """Recall@k and mean latency of IVF search vs the exact scan, per nprobe.
+
+    Every album projection is used as a query, so each query's own row is
+    always part of its exact top-k.
+    """
+    queries = image_index.projected
+    start = time.perf_counter()
+    exact = [set(image_index.search(query, k)[0][0].tolist()) for query in queries]
+    exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+    print(f"exact: {exact_ms:.3f}ms/query over {len(image_index)} images")
+
+    results = []
+    for nprobe in nprobes:
+        if nprobe > ivf_index.n_cells:
+            break
+        found = 0
+        start = time.perf_counter()
+        for query, truth in zip(queries, exact):
+            indices, _ = ivf_index.search(image_index, query, k, nprobe=nprobe)
+            found += len(truth & set(indices[0].tolist()))
+        ivf_ms = (time.perf_counter() - start) * 1000 / len(queries)
+        recall = found / sum(len(truth) for truth in exact)
+        print(f"nprobe={nprobe:<3} recall@{k}={recall:.3f} {ivf_ms:.3f}ms/query")
+        results.append({"nprobe": nprobe, "recall": recall, "ivf_ms": ivf_ms})
+    return {"exact_ms": exact_ms, "ivf": results}
+
+_cache = CachedIndex(IVFIndex.load, "IVF")
+
+def get_cached_ivf_index(path=IVF_INDEX_PATH):
+    """Load the IVF index from disk, reloading only when the file has changed."""
+    return _cache.get(path)
+
+def set_cached_ivf_index(index, path=IVF_INDEX_PATH):
+    """Persist the IVF index and make it the active index for this process."""
+    return _cache.set(index, path)
+
+if __name__ == "__main__":
+    # Recall vs latency against the exact scan: python -m routes.ivf
+    from .image import IMAGE_FOLDER, load_or_build_image_index, load_or_build_ivf_index
+
+    image_index = load_or_build_image_index(IMAGE_FOLDER)
+    benchmark_ivf(image_index, load_or_build_ivf_index(image_index))
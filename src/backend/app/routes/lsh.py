@@ -0,0 +1,191 @@
+import os
+import time
+import numpy as np
+from .index_store import INDEX_DIR, CachedIndex, save_npz
+from .audio_index import FEATURE_DIM
+from .similarity import cosine_similarities, top_k_indices
+
+LSH_INDEX_PATH = os.path.join(INDEX_DIR, "audio_lsh.npz")
+
+LSH_TABLES = int(os.environ.get("LSH_TABLES", 16))
+LSH_BITS = int(os.environ.get("LSH_BITS", 12))
+# Also probe the buckets one bit flip away from the query code (multi-probe LSH)
+LSH_MULTIPROBE = os.environ.get("LSH_MULTIPROBE", "1") == "1"
+LSH_SEED = 2123
+
+class LSHIndex:
+    """Random-hyperplane LSH for cosine similarity over the audio feature vectors.
+
+    Each of n_tables tables hashes a vector to an n_bits code (one sign bit
+    per random hyperplane); vectors with a small angle between them tend to
+    share a bucket in at least one table. The codes and the hyperplanes that
+    produced them are persisted together (NumPy does not promise the same
+    random stream across versions); buckets are rebuilt from the codes.
+    Files from before the hyperplanes were saved load with
+    planes_from_seed set and should be rebuilt.
+    """
+
+    def __init__(self, names, codes, n_tables=LSH_TABLES, n_bits=LSH_BITS, seed=LSH_SEED, hyperplanes=None):
+        if not 0 < n_bits < 64:
+            raise ValueError("n_bits must be between 1 and 63")
+        self.names = list(names)
+        self.n_tables = int(n_tables)
+        self.n_bits = int(n_bits)
+        self.seed = int(seed)
+        self.codes = np.asarray(codes, dtype=np.int64).reshape(len(self.names), self.n_tables)
+        self.planes_from_seed = hyperplanes is None
+        if hyperplanes is None:
+            rng = np.random.default_rng(self.seed)
+            hyperplanes = rng.standard_normal((self.n_tables * self.n_bits, FEATURE_DIM))
+        self.hyperplanes = np.asarray(hyperplanes, dtype=np.float32).reshape(self.n_tables * self.n_bits, FEATURE_DIM)
+        self._bit_weights = (1 << np.arange(self.n_bits, dtype=np.int64))
+        self._build_buckets()
+
+    def __len__(self):
+        return len(self.names)
+
+    def hash(self, vectors):
+        """(N, n_tables) bucket codes of the given vectors."""
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        bits = (vectors @ self.hyperplanes.T > 0).reshape(len(vectors), self.n_tables, self.n_bits)
+        return bits.astype(np.int64) @ self._bit_weights
+
+    def _build_buckets(self):
+        self.buckets = []
+        for table in range(self.n_tables):
+            column = self.codes[:, table]
+            order = np.argsort(column, kind='stable')
+            keys, starts = np.unique(column[order], return_index=True)
+            self.buckets.append(dict(zip(keys.tolist(), np.split(order, starts[1:]))))
+
+    def insert(self, names, vectors):
+        """Hash and add new rows; existing rows with the same names are replaced."""
+        names = list(names)
+        new_codes = self.hash(vectors)
+        self.remove(names)
+        first_row = len(self.names)
+        self.names.extend(names)
+        self.codes = np.vstack([self.codes, new_codes])
+        for table, bucket in enumerate(self.buckets):
+            for offset, code in enumerate(new_codes[:, table].tolist()):
+                rows = bucket.get(code)
+                row = np.array([first_row + offset])
+                bucket[code] = row if rows is None else np.concatenate([rows, row])
+        return self
+
+    def remove(self, names):
+        removed = set(names)
+        keep = [i for i, name in enumerate(self.names) if name not in removed]
+        if len(keep) != len(self.names):
+            self.names = [self.names[i] for i in keep]
+            self.codes = self.codes[keep]
+            self._build_buckets()
+        return self
+
+    def candidates(self, query_vector, multiprobe=LSH_MULTIPROBE):
+        """Rows sharing a bucket with the query in any table.
+
+        With multiprobe the n_bits neighbouring buckets (Hamming distance 1)
+        of every table are visited too, which raises recall far more cheaply
+        than adding tables.
+        """
+        query_codes = self.hash(query_vector)[0].tolist()
+        flips = [0] + (self._bit_weights.tolist() if multiprobe else [])
+        hits = [
+            self.buckets[table].get(code ^ flip)
+            for table, code in enumerate(query_codes)
+            for flip in flips
+        ]
+        hits = [rows for rows in hits if rows is not None]
+        if not hits:
+            return np.zeros(0, dtype=np.intp)
+        return np.unique(np.concatenate(hits))
+
+    def save(self, path=LSH_INDEX_PATH):
+        save_npz(
+            path,
+            names=np.array(self.names, dtype=str),
+            codes=self.codes,
+            hyperplanes=self.hyperplanes,
+            params=np.array([self.n_tables, self.n_bits, self.seed]),
+        )
+        print(f"LSH index saved to {path} ({len(self)} vectors, {self.n_tables}x{self.n_bits} bits)")
+
+    @classmethod
+    def load(cls, path=LSH_INDEX_PATH):
+        with np.load(path, allow_pickle=False) as data:
+            n_tables, n_bits, seed = data["params"].tolist()
+            index = cls(data["names"].tolist(), data["codes"], n_tables=n_tables, n_bits=n_bits, seed=seed,
+                        hyperplanes=data["hyperplanes"] if "hyperplanes" in data else None)
+            # The codes on disk came from planes we can no longer reproduce for sure
+            index.planes_from_seed = "hyperplanes" not in data
+            return index
+
+def lsh_search(lsh_index, audio_index, query_vector, k):
+    """Exact cosine rerank of the LSH candidates; returns (names, scores), best first."""
+    candidate_rows = lsh_index.candidates(query_vector)
+    if len(candidate_rows) == 0:
+        return [], []
+    names = [lsh_index.names[i] for i in candidate_rows]
+    rows = audio_index.rows_for(names)
+    valid = audio_index.valid[rows]
+    rows = rows[valid]
+    scores = cosine_similarities(query_vector, audio_index.features[rows])[0]
+    order = top_k_indices(scores, k, largest=True)[0]
+    return [audio_index.names[rows[i]] for i in order], scores[order].tolist()
+
+def recall_at_k(lsh_index, audio_index, query_vectors, k=10):
+    """Fraction of the exact top-k found by the LSH search, plus mean latency of each."""
+    query_vectors = np.atleast_2d(query_vectors)
+    found = 0
+    total = 0
+    exact_time = 0.0
+    lsh_time = 0.0
+    candidates = 0
+    for query_vector in query_vectors:
+        start = time.perf_counter()
+        exact_indices, _ = audio_index.search(query_vector, k)
+        exact_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        lsh_names, _ = lsh_search(lsh_index, audio_index, query_vector, k)
+        lsh_time += time.perf_counter() - start
+        candidates += len(lsh_index.candidates(query_vector))
+
+        exact_names = {audio_index.names[i] for i in exact_indices[0]}
+        found += len(exact_names & set(lsh_names))
+        total += len(exact_names)
+
+    n_queries = max(len(query_vectors), 1)
+    report = {
+        "recall": found / total if total else 0.0,
+        "mean_candidates": candidates / n_queries,
+        "exact_ms": exact_time * 1000 / n_queries,
+        "lsh_ms": lsh_time * 1000 / n_queries,
+    }
+    print(f"recall@{k}={report['recall']:.3f} candidates={report['mean_candidates']:.1f}/{len(audio_index)} "
+          f"exact={report['exact_ms']:.3f}ms lsh={report['lsh_ms']:.3f}ms")
+    return report
+
+_cache = CachedIndex(LSHIndex.load, "LSH")
+
+def get_cached_lsh_index(path=LSH_INDEX_PATH):
+    """Load the LSH index from disk, reloading only when the file has changed."""
+    return _cache.get(path)
+
+def set_cached_lsh_index(index, path=LSH_INDEX_PATH):
+    """Persist the LSH index and make it the active index for this process."""
+    return _cache.set(index, path)
+
+if __name__ == "__main__":
+    # Recall vs the exact scan, using one window per song as partial queries:
+    # python -m routes.lsh
+    from .audio import load_or_build_audio_index, load_or_build_window_index, load_or_build_lsh_index
+
+    folder = os.path.join(os.path.dirname(os.path.dirname(__file__)), "music_audios")
+    audio_index = load_or_build_audio_index(folder)
+    window_index = load_or_build_window_index(folder)
+    lsh_index = load_or_build_lsh_index(folder)
+    _, first_windows = np.unique(window_index.song_ids, return_index=True)
+    for k in (1, 10):
+        recall_at_k(lsh_index, audio_index, window_index.features[first_windows], k=k)
@@ -3,9 +3,23 @@ from mido import MidiFile, Message, MetaMessage
 import os
 import numpy as np
 from typing import List, Tuple
+from ..midi_scan import read_note_ons, MidiScanError
+from ..audio import search_audio, AUDIO_SEARCH_MODE, AUDIO_SEARCH_MODES, AUDIO_DTW_RERANK
+from .transcribe import decode_wav_bytes, decode_pcm_bytes, notes_from_buffer
 
 def extract_melody(midi_path: str) -> List[int]:
     """Extract melody notes from MIDI file."""
+    try:
+        return [note for _, note in read_note_ons(midi_path)]
+    except MidiScanError as e:
+        print(f"Fast MIDI scan failed for {midi_path} ({str(e)}), falling back to mido")
+        return extract_melody_mido(midi_path)
+    except Exception as e:
+        print(f"Error extracting melody from {midi_path}: {str(e)}")
+        return []
+
+def extract_melody_mido(midi_path: str) -> List[int]:
+    """Extract melody notes from MIDI file with mido."""
     try:
         midi = MidiFile(midi_path)
         notes = []
@@ -61,51 +75,37 @@ def cosine_similarity(v1: np.ndarray, v2: np.ndarray) -> float:
         return 0
     return np.dot(v1, v2) / (norm1 * norm2)
 
-def audio_retrieval_main_mic(query_path: str, audio_folder: str, n: int = 10) -> Tuple[List[str], List[float]]:
+def audio_retrieval_main_mic(query_path: str, audio_folder: str, n: int = 10, mode: str = AUDIO_SEARCH_MODE, rerank: bool = AUDIO_DTW_RERANK) -> Tuple[List[str], List[float]]:
     """Main function for audio retrieval."""
     try:
         print(f"Extracting query melody from {query_path}")
         query_notes = extract_melody(query_path)
         if not query_notes:
             raise ValueError("No valid notes found in query file")
-            
-        print("Creating query feature vector")
-        query_vector = create_feature_vector(query_notes)
-        
-        print("Processing database files")
-        similarities = []
-        
-        # Get all MIDI files
-        midi_files = [f for f in os.listdir(audio_folder) if f.endswith('.mid')]
-        total_files = len(midi_files)
         
-        for i, filename in enumerate(midi_files, 1):
-            if i % 10 == 0:
-                print(f"Processing file {i}/{total_files}")
-                
-            full_path = os.path.join(audio_folder, filename)
-            try:
-                db_notes = extract_melody(full_path)
-                if db_notes:
-                    db_vector = create_feature_vector(db_notes)
-                    similarity = cosine_similarity(query_vector, db_vector)
-                    similarities.append((full_path, similarity))
-            except Exception as e:
-                print(f"Error processing {filename}: {str(e)}")
-                continue
-        
-        if not similarities:
-            raise ValueError("No valid comparisons could be made")
-            
-        # Sort by similarity and get top N
-        similarities.sort(key=lambda x: x[1], reverse=True)
-        top_n = similarities[:n]
-        
-        paths = [os.path.basename(path) for path, _ in top_n]
-        scores = [score for _, score in top_n]
-        
-        return paths, scores
+        # Shared search expects (time, pitch); note order stands in for time
+        return search_audio(list(enumerate(query_notes)), audio_folder, n, mode=mode, rerank=rerank)
         
     except Exception as e:
         print(f"Error in audio retrieval: {str(e)}")
-        raise
\ No newline at end of file
+        raise
+
+def query_notes_from_bytes(data: bytes, sample_rate: int = None) -> List[Tuple[int, int]]:
+    """Transcribe a WAV file or raw 16-bit PCM held in memory, without writing WAV or MIDI files.
+
+    Bytes starting with a RIFF header are decoded as WAV; anything else is
+    read as mono PCM at sample_rate. Call this in the process that warmed
+    the Basic Pitch model, not in the retrieval pool.
+    """
+    if data[:4] == b'RIFF':
+        audio, sample_rate = decode_wav_bytes(data)
+    elif sample_rate:
+        audio, sample_rate = decode_pcm_bytes(data, sample_rate)
+    else:
+        raise ValueError("sample_rate is required for raw PCM input")
+
+    print(f"Transcribing {len(audio) / sample_rate:.1f}s of audio")
+    query_notes = notes_from_buffer(audio, sample_rate)
+    if not query_notes:
+        raise ValueError("No valid notes found in query audio")
+    return query_notes
@@ -1,11 +1,19 @@
-from fastapi import APIRouter, File, UploadFile
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, File, UploadFile, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 import os
+import json
+import queue
 import shutil
+import threading
 from tempfile import NamedTemporaryFile
 import time
 import traceback
-from .audiomic import audio_retrieval_main_mic
+from .audiomic import audio_retrieval_main_mic, query_notes_from_bytes, search_audio, AUDIO_SEARCH_MODE, AUDIO_SEARCH_MODES, AUDIO_DTW_RERANK
+from .microphone import SAMPLE_RATE, capture_stream
+from .streaming import StreamingRecognizer, STREAM_MAX_SECONDS
+from .transcribe import to_float_mono, decode_pcm_bytes
+from ..executor import run_retrieval
 
 router = APIRouter(tags=["audio-retrieval-mic"])
 
@@ -16,7 +24,7 @@ print(f"Audio Route - BASE_DIR: {BASE_DIR}")
 print(f"Audio Route - AUDIO_FOLDER: {AUDIO_FOLDER}")
 
 @router.post("/audio-search-mic")
-async def search_similar_audio(file: UploadFile = File(...)):
+async def search_similar_audio(file: UploadFile = File(...), mode: str = AUDIO_SEARCH_MODE, rerank: bool = AUDIO_DTW_RERANK):
     print(UploadFile)
     temp = None
     try:
@@ -28,6 +36,12 @@ async def search_similar_audio(file: UploadFile = File(...)):
                 content={"error": "File must be an audio file"}
             )
         
+        if mode not in AUDIO_SEARCH_MODES:
+            return JSONResponse(
+                status_code=400,
+                content={"error": f"mode must be one of {', '.join(AUDIO_SEARCH_MODES)}"}
+            )
+        
         start_time = time.time()
         
         print("Creating temporary file...")
@@ -42,7 +56,7 @@ async def search_similar_audio(file: UploadFile = File(...)):
         print(f"Audio folder path: {AUDIO_FOLDER}")
         
         print("Starting audio retrieval main function...")
-        top_similar, distances = audio_retrieval_main_mic(temp_path, AUDIO_FOLDER)
+        top_similar, distances = await run_retrieval(audio_retrieval_main_mic, temp_path, AUDIO_FOLDER, mode=mode, rerank=rerank)
         
         print("Processing results...")
         relative_paths = [os.path.basename(path) for path in top_similar]
@@ -82,4 +96,151 @@ async def search_similar_audio(file: UploadFile = File(...)):
                 if os.path.exists(temp.name):
                     os.unlink(temp.name)
         except Exception as cleanup_error:
-            print(f"Warning: Error during cleanup: {cleanup_error}")
\ No newline at end of file
+            print(f"Warning: Error during cleanup: {cleanup_error}")
+
+@router.post("/audio-search-wav")
+async def search_similar_audio_wav(file: UploadFile = File(...), sample_rate: int = SAMPLE_RATE, mode: str = AUDIO_SEARCH_MODE, rerank: bool = AUDIO_DTW_RERANK):
+    """Search with an uploaded WAV file or raw 16-bit mono PCM (at sample_rate), transcribed in memory.
+
+    Transcription runs in this worker's threadpool so it reuses the model
+    warmed at startup; the retrieval pool never loads TensorFlow.
+    """
+    try:
+        if mode not in AUDIO_SEARCH_MODES:
+            return JSONResponse(
+                status_code=400,
+                content={"error": f"mode must be one of {', '.join(AUDIO_SEARCH_MODES)}"}
+            )
+
+        if sample_rate <= 0:
+            return JSONResponse(
+                status_code=400,
+                content={"error": "sample_rate must be positive"}
+            )
+
+        start_time = time.time()
+        data = await file.read()
+        if not data:
+            return JSONResponse(
+                status_code=400,
+                content={"error": "Audio upload is empty"}
+            )
+
+        query_notes = await run_in_threadpool(query_notes_from_bytes, data, sample_rate)
+        top_similar, distances = await run_retrieval(
+            search_audio, query_notes, AUDIO_FOLDER, mode=mode, rerank=rerank,
+        )
+        relative_paths = [os.path.basename(path) for path in top_similar]
+        execution_time = (time.time() - start_time) * 1000  # Convert to milliseconds
+
+        print(f"Search completed in {execution_time}ms")
+        return JSONResponse(content={
+            "similar_audios": relative_paths,
+            "similarity_scores": distances,
+            "execution_time": execution_time
+        })
+
+    except Exception as e:
+        print(f"Error in search_similar_audio_wav: {str(e)}")
+        print(f"Full traceback: {traceback.format_exc()}")
+        return JSONResponse(
+            status_code=500,
+            content={
+                "error": str(e),
+                "traceback": traceback.format_exc()
+            }
+        )
+
+    finally:
+        file.file.close()
+
+@router.get("/audio-search-stream")
+async def stream_microphone_search(mode: str = AUDIO_SEARCH_MODE, n: int = 10, max_seconds: float = STREAM_MAX_SECONDS, stop_when_confident: bool = True):
+    """Record from the server microphone and push refined top-n results as Server-Sent Events.
+
+    Every event carries the current ranking; the last one has done=true.
+    Inference runs in a thread so the model loaded in this worker is reused.
+    """
+    if mode not in AUDIO_SEARCH_MODES:
+        return JSONResponse(
+            status_code=400,
+            content={"error": f"mode must be one of {', '.join(AUDIO_SEARCH_MODES)}"}
+        )
+
+    recognizer = StreamingRecognizer(AUDIO_FOLDER, SAMPLE_RATE, n=n, mode=mode)
+
+    async def events():
+        blocks = queue.Queue()
+        stop = threading.Event()
+        threading.Thread(target=capture_stream, args=(blocks, stop, max_seconds), daemon=True).start()
+        try:
+            while True:
+                block = await run_in_threadpool(blocks.get)
+                if isinstance(block, Exception):
+                    raise block
+                if block is None:
+                    results = await run_in_threadpool(recognizer.finish)
+                    result = results[-1] if results else recognizer.final_result()
+                    yield f"data: {json.dumps(dict(result, done=True))}\n\n"
+                    return
+
+                for result in await run_in_threadpool(recognizer.feed, to_float_mono(block)):
+                    done = recognizer.should_stop(stop_when_confident, max_seconds)
+                    yield f"data: {json.dumps(dict(result, done=done))}\n\n"
+                    if done:
+                        return
+        except Exception as e:
+            print(f"Error in stream_microphone_search: {str(e)}")
+            yield f"data: {json.dumps({'error': str(e), 'done': True})}\n\n"
+        finally:
+            # Stops the microphone when the client disconnects or results are confident
+            stop.set()
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+@router.websocket("/ws/audio-search-stream")
+async def websocket_audio_search(websocket: WebSocket, sample_rate: int = SAMPLE_RATE, mode: str = AUDIO_SEARCH_MODE, n: int = 10, max_seconds: float = STREAM_MAX_SECONDS, stop_when_confident: bool = True):
+    """Client-side capture: binary frames of 16-bit mono PCM in, JSON rankings out.
+
+    Send the text "stop" to flush the last partial chunk; the server sends
+    a result with done=true and closes once it stops.
+    """
+    await websocket.accept()
+    if mode not in AUDIO_SEARCH_MODES:
+        await websocket.send_json({"error": f"mode must be one of {', '.join(AUDIO_SEARCH_MODES)}", "done": True})
+        await websocket.close()
+        return
+    if sample_rate <= 0:
+        await websocket.send_json({"error": "sample_rate must be positive", "done": True})
+        await websocket.close()
+        return
+
+    recognizer = StreamingRecognizer(AUDIO_FOLDER, sample_rate, n=n, mode=mode)
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+
+            if message.get("bytes"):
+                audio, _ = decode_pcm_bytes(message["bytes"], sample_rate)
+                for result in await run_in_threadpool(recognizer.feed, audio):
+                    done = recognizer.should_stop(stop_when_confident, max_seconds)
+                    await websocket.send_json(dict(result, done=done))
+                    if done:
+                        await websocket.close()
+                        return
+            elif message.get("text") == "stop":
+                results = await run_in_threadpool(recognizer.finish)
+                result = results[-1] if results else recognizer.final_result()
+                await websocket.send_json(dict(result, done=True))
+                await websocket.close()
+                return
+
+    except WebSocketDisconnect:
+        print("Audio stream client disconnected")
+    except Exception as e:
+        print(f"Error in websocket_audio_search: {str(e)}")
+        print(f"Full traceback: {traceback.format_exc()}")
+        await websocket.send_json({"error": str(e), "done": True})
+        await websocket.close()
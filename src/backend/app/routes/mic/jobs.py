@@ -0,0 +1,213 @@
+import os
+import time
+import uuid
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from functools import partial
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse
+from .microphone import record_wav, INPUT_DIR, OUTPUT_DIR, DURATION
+from .pitch_model import warm_basic_pitch_model
+from .wav_midi_converter import wav_to_midi
+
+router = APIRouter(tags=["recording-jobs"])
+
+# Recording runs on threads here, not in the HTTP worker's threadpool; it
+# only waits on the microphone, and a thread can watch the cancel event.
+RECORDING_WORKERS = int(os.environ.get("RECORDING_WORKERS", 1))
+# WAV->MIDI conversion runs in its own processes, each holding a warmed
+# Basic Pitch model, so TensorFlow never competes with request handling.
+# They are spawned, not forked: TensorFlow is already loaded in this process.
+CONVERSION_WORKERS = int(os.environ.get("CONVERSION_WORKERS", 1))
+# Jobs allowed to wait for a worker; further requests are rejected
+RECORDING_MAX_PENDING = int(os.environ.get("RECORDING_MAX_PENDING", 4))
+# Finished jobs kept for status/result lookups; older ones are dropped with their files
+RECORDING_JOB_HISTORY = int(os.environ.get("RECORDING_JOB_HISTORY", 50))
+
+QUEUED, RECORDING, CONVERTING, DONE, FAILED, CANCELLED = "queued", "recording", "converting", "done", "failed", "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+class RecordingJob:
+    def __init__(self, duration):
+        self.id = uuid.uuid4().hex
+        self.duration = duration
+        self.status = QUEUED
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.wav_path = os.path.join(INPUT_DIR, f"{self.id}.wav")
+        self.midi_path = None
+        self.cancel_event = threading.Event()
+        self.future = None
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "duration": self.duration,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "midi_file": os.path.basename(self.midi_path) if self.midi_path else None,
+        }
+
+    def remove_files(self):
+        for path in (self.wav_path, self.midi_path):
+            if path and os.path.exists(path):
+                os.remove(path)
+
+_executor = None
+_conversion_executor = None
+_jobs = OrderedDict()
+# Held for every status change, so a cancel can't race a job finishing
+_lock = threading.Lock()
+
+def get_job_executor():
+    global _executor
+    if _executor is None:
+        print(f"Starting recording pool with {RECORDING_WORKERS} workers")
+        _executor = ThreadPoolExecutor(max_workers=RECORDING_WORKERS, thread_name_prefix="recording")
+    return _executor
+
+def _init_conversion_worker():
+    try:
+        warm_basic_pitch_model()
+    except Exception as e:
+        # Conversions will load the model on first use instead
+        print(f"Basic Pitch model not preloaded in conversion worker: {str(e)}")
+
+def get_conversion_executor():
+    global _conversion_executor
+    if _conversion_executor is None:
+        print(f"Starting conversion pool with {CONVERSION_WORKERS} workers")
+        _conversion_executor = ProcessPoolExecutor(
+            max_workers=CONVERSION_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_conversion_worker,
+        )
+    return _conversion_executor
+
+def _finish(job, status, error=None):
+    """Move a job to a finished status; the caller holds _lock."""
+    job.status = status
+    job.error = error
+    job.finished_at = time.time()
+    if status == CANCELLED:
+        job.remove_files()
+
+def _run_job(job):
+    with _lock:
+        if job.status != QUEUED:
+            return
+        if job.cancel_event.is_set():
+            _finish(job, CANCELLED)
+            return
+        job.status = RECORDING
+    try:
+        recorded = record_wav(job.wav_path, duration=job.duration, cancel_event=job.cancel_event)
+        with _lock:
+            if recorded is None or job.cancel_event.is_set():
+                _finish(job, CANCELLED)
+                return
+            job.status = CONVERTING
+        future = get_conversion_executor().submit(wav_to_midi, job.wav_path, OUTPUT_DIR)
+        future.add_done_callback(partial(_conversion_done, job))
+    except Exception as e:
+        print(f"Recording job {job.id} failed: {str(e)}")
+        with _lock:
+            _finish(job, FAILED, str(e))
+    finally:
+        if job.status in FINISHED:
+            _prune_history()
+
+def _conversion_done(job, future):
+    with _lock:
+        if job.status != CONVERTING:
+            return
+        if future.cancelled():
+            _finish(job, CANCELLED)
+        elif future.exception() is not None:
+            print(f"Recording job {job.id} failed: {str(future.exception())}")
+            _finish(job, FAILED, str(future.exception()))
+        else:
+            job.midi_path = future.result()
+            # Conversion can't be interrupted; a cancelled job discards its output instead
+            _finish(job, CANCELLED if job.cancel_event.is_set() else DONE)
+    _prune_history()
+
+def _prune_history():
+    with _lock:
+        finished = [job for job in _jobs.values() if job.status in FINISHED]
+        for job in finished[:max(0, len(finished) - RECORDING_JOB_HISTORY)]:
+            job.remove_files()
+            del _jobs[job.id]
+
+def submit_recording_job(duration=DURATION):
+    with _lock:
+        pending = sum(job.status == QUEUED for job in _jobs.values())
+        if pending >= RECORDING_MAX_PENDING:
+            raise HTTPException(status_code=429, detail="Too many recordings waiting, try again later")
+        job = RecordingJob(duration)
+        _jobs[job.id] = job
+        job.future = get_job_executor().submit(_run_job, job)
+    return job
+
+def get_job(job_id):
+    job = _jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Recording job not found")
+    return job
+
+def cancel_job(job_id):
+    job = get_job(job_id)
+    with _lock:
+        if job.status in FINISHED:
+            return job
+        job.cancel_event.set()
+        if job.future.cancel():
+            # Never started
+            _finish(job, CANCELLED)
+    return job
+
+def latest_finished_job():
+    with _lock:
+        done = [job for job in _jobs.values() if job.status == DONE]
+    return max(done, key=lambda job: job.finished_at) if done else None
+
+def shutdown_job_executor():
+    global _executor, _conversion_executor
+    with _lock:
+        for job in _jobs.values():
+            if job.status not in FINISHED:
+                job.cancel_event.set()
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+    if _conversion_executor is not None:
+        _conversion_executor.shutdown(wait=False, cancel_futures=True)
+        _conversion_executor = None
+
+@router.post("/recording-jobs")
+async def create_recording_job(duration: float = DURATION):
+    if not 0 < duration <= DURATION:
+        raise HTTPException(status_code=400, detail=f"duration must be between 0 and {DURATION} seconds")
+    return submit_recording_job(duration).to_dict()
+
+@router.get("/recording-jobs/{job_id}")
+async def get_recording_job(job_id: str):
+    return get_job(job_id).to_dict()
+
+@router.get("/recording-jobs/{job_id}/result")
+async def get_recording_job_result(job_id: str):
+    job = get_job(job_id)
+    if job.status != DONE:
+        raise HTTPException(status_code=409, detail=f"Recording job is {job.status}")
+    if not job.midi_path or not os.path.exists(job.midi_path):
+        raise HTTPException(status_code=404, detail="Recorded MIDI not found")
+    return FileResponse(path=job.midi_path, media_type='audio/midi', filename=os.path.basename(job.midi_path))
+
+@router.delete("/recording-jobs/{job_id}")
+async def cancel_recording_job(job_id: str):
+    return cancel_job(job_id).to_dict()
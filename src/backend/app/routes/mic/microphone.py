@@ -4,7 +4,7 @@ import time
 from scipy.io.wavfile import write
 from threading import Thread
 import os
-from .wav_midi_converter import batch_wav_to_midi
+from .wav_midi_converter import wav_to_midi
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
@@ -27,15 +27,61 @@ def save_audio(audio, output_name):
     print(f"Audio saved to {output_name}")
 
 # Fungsi merekam audio
-def record_audio():
-    chunk_counter = 0
-    audio = sd.rec(int(DURATION * SAMPLE_RATE), samplerate=SAMPLE_RATE, channels=CHANNEL, dtype='int16')
-    sd.wait()
-    
-    chunk_name = os.path.join(INPUT_DIR, f"recorded_mic.wav")
-    save_audio(audio, chunk_name)
-    
-    chunk_counter += 1
-    
-    batch_wav_to_midi(INPUT_DIR, OUTPUT_DIR)
-    print("Mic audio conversion completed!")
\ No newline at end of file
+def record_audio(wav_path=None, duration=DURATION, cancel_event=None):
+    """Record duration seconds to wav_path and convert it to MIDI in OUTPUT_DIR.
+
+    Recording runs in blocks so a set cancel_event stops it early; returns
+    the MIDI path, or None when cancelled.
+    """
+    wav_path = record_wav(wav_path, duration=duration, cancel_event=cancel_event)
+    if wav_path is None:
+        return None
+    midi_path = wav_to_midi(wav_path, OUTPUT_DIR)
+    print("Mic audio conversion completed!")
+    return midi_path
+
+# Fungsi merekam audio ke file WAV saja, tanpa konversi
+def record_wav(wav_path=None, duration=DURATION, cancel_event=None):
+    """Record duration seconds to wav_path; returns the path, or None when cancelled."""
+    wav_path = wav_path or os.path.join(INPUT_DIR, "recorded_mic.wav")
+    blocks = []
+    for block in record_stream(max_duration=duration):
+        if cancel_event is not None and cancel_event.is_set():
+            print("Recording cancelled")
+            return None
+        blocks.append(block)
+
+    save_audio(np.concatenate(blocks), wav_path)
+    return wav_path
+
+# Fungsi merekam audio per blok untuk pencarian streaming
+def record_stream(max_duration=DURATION, block_seconds=0.5):
+    """Yield int16 mono blocks of block_seconds from the microphone until max_duration.
+
+    Closing the generator stops the input stream, so callers can stop early.
+    """
+    block_size = int(block_seconds * SAMPLE_RATE)
+    n_blocks = int(np.ceil(max_duration / block_seconds))
+    with sd.InputStream(samplerate=SAMPLE_RATE, channels=CHANNEL, dtype='int16', blocksize=block_size) as stream:
+        for _ in range(n_blocks):
+            block, overflowed = stream.read(block_size)
+            if overflowed:
+                print("Warning: microphone input overflowed")
+            yield block[:, 0].copy()
+
+# Fungsi merekam audio di thread tersendiri untuk pencarian streaming
+def capture_stream(blocks, stop_event, max_duration=DURATION):
+    """Put record_stream() blocks on the blocks queue until stop_event is set or max_duration passes.
+
+    Meant to run in its own thread: the generator is only ever advanced and
+    closed here, so other threads stop it through stop_event. None is put
+    last, or the exception that ended the recording.
+    """
+    try:
+        for block in record_stream(max_duration=max_duration):
+            if stop_event.is_set():
+                break
+            blocks.put(block)
+        blocks.put(None)
+    except Exception as e:
+        blocks.put(e)
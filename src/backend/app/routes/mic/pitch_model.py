@@ -0,0 +1,40 @@
+import os
+import time
+import threading
+import numpy as np
+from basic_pitch.constants import AUDIO_N_SAMPLES
+from basic_pitch.inference import Model, ICASSP_2022_MODEL_PATH
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# SavedModel checked in at the repository root; falls back to the copy bundled with basic-pitch
+REPO_MODEL_PATH = os.path.abspath(os.path.join(BASE_DIR, "..", "..", "..", "..", "..", "model"))
+BASIC_PITCH_MODEL_PATH = os.environ.get(
+    "BASIC_PITCH_MODEL_PATH",
+    REPO_MODEL_PATH if os.path.isdir(REPO_MODEL_PATH) else str(ICASSP_2022_MODEL_PATH),
+)
+
+_model = None
+_model_lock = threading.Lock()
+
+def get_basic_pitch_model():
+    """The Basic Pitch model of this process, loaded from disk on first use only."""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                start = time.perf_counter()
+                _model = Model(BASIC_PITCH_MODEL_PATH)
+                print(f"Basic Pitch model loaded from {BASIC_PITCH_MODEL_PATH} in {time.perf_counter() - start:.2f}s")
+    return _model
+
+def warm_basic_pitch_model():
+    """Load the model and run one silent window through it.
+
+    The first inference builds the TensorFlow graph, so doing it at
+    startup keeps that cost out of the first recording.
+    """
+    model = get_basic_pitch_model()
+    start = time.perf_counter()
+    model.predict(np.zeros((1, AUDIO_N_SAMPLES, 1), dtype=np.float32))
+    print(f"Basic Pitch model warmed up in {time.perf_counter() - start:.2f}s")
+    return model
@@ -0,0 +1,114 @@
+import os
+import numpy as np
+from typing import List, Tuple
+from ..audio import search_audio, AUDIO_SEARCH_MODE
+from .transcribe import notes_from_buffer, seconds_to_ticks
+
+# Each inference covers STREAM_CHUNK_SECONDS of new audio plus STREAM_OVERLAP_SECONDS
+# of the previous chunk, so notes cut at a chunk edge are seen whole once
+STREAM_CHUNK_SECONDS = float(os.environ.get("STREAM_CHUNK_SECONDS", 2.0))
+STREAM_OVERLAP_SECONDS = float(os.environ.get("STREAM_OVERLAP_SECONDS", 0.5))
+STREAM_MAX_SECONDS = float(os.environ.get("STREAM_MAX_SECONDS", 20))
+# Results are confident once the top song leads the runner-up by STREAM_MARGIN
+# and has stayed on top for STREAM_STABLE_UPDATES consecutive updates
+STREAM_MARGIN = float(os.environ.get("STREAM_MARGIN", 0.02))
+STREAM_STABLE_UPDATES = int(os.environ.get("STREAM_STABLE_UPDATES", 3))
+STREAM_MIN_NOTES = 8
+
+class StreamingRecognizer:
+    """Incremental query-by-humming over a stream of audio samples.
+
+    feed() buffers samples and, for every full chunk, transcribes it,
+    merges its notes into the running query and rescores the catalogue.
+    Notes starting in the overlap are taken from whichever chunk saw them
+    whole: before the middle of the overlap from the earlier chunk, after
+    it from the later one.
+    """
+
+    def __init__(self, audio_folder: str, sample_rate: int, n: int = 10, mode: str = AUDIO_SEARCH_MODE,
+                 chunk_seconds: float = STREAM_CHUNK_SECONDS, overlap_seconds: float = STREAM_OVERLAP_SECONDS):
+        if sample_rate <= 0:
+            raise ValueError("sample_rate must be positive")
+        self.audio_folder = audio_folder
+        self.sample_rate = int(sample_rate)
+        self.n = n
+        self.mode = mode
+        # At least one sample, or feed() would never leave its loop
+        self.chunk_samples = max(1, int(chunk_seconds * self.sample_rate))
+        self.overlap_samples = min(int(overlap_seconds * self.sample_rate), self.chunk_samples)
+
+        self.buffer = np.zeros(0, dtype=np.float32)
+        self.buffer_start = 0  # stream position of buffer[0], in samples
+        self.processed = 0  # samples transcribed as new audio so far
+        self.notes: List[Tuple[int, int]] = []
+        self.updates = 0
+        self.stable_updates = 0
+        self.names: List[str] = []
+        self.scores: List[float] = []
+
+    @property
+    def seconds(self):
+        return self.processed / self.sample_rate
+
+    def feed(self, samples: np.ndarray) -> List[dict]:
+        """Add float mono samples; returns one result per chunk completed by them."""
+        self.buffer = np.concatenate([self.buffer, np.asarray(samples, dtype=np.float32)])
+        results = []
+        while len(self.buffer) - self._new_audio_offset() >= self.chunk_samples:
+            results.append(self._process(self._new_audio_offset() + self.chunk_samples))
+        return results
+
+    def finish(self) -> List[dict]:
+        """Transcribe whatever is left after the last full chunk."""
+        if len(self.buffer) - self._new_audio_offset() < self.sample_rate // 4:
+            return []
+        return [self._process(len(self.buffer))]
+
+    def _new_audio_offset(self):
+        return self.processed - self.buffer_start
+
+    def _process(self, end: int) -> dict:
+        start = max(0, self._new_audio_offset() - self.overlap_samples)
+        chunk_start = self.buffer_start + start
+        chunk_notes = notes_from_buffer(self.buffer[start:end], self.sample_rate, start_time=chunk_start / self.sample_rate)
+
+        if self.processed > 0:
+            boundary = seconds_to_ticks((self.processed - self.overlap_samples / 2) / self.sample_rate)
+            self.notes = [note for note in self.notes if note[0] < boundary]
+            chunk_notes = [note for note in chunk_notes if note[0] >= boundary]
+        self.notes.extend(chunk_notes)
+
+        self.processed = self.buffer_start + end
+        # Keep only the tail the next chunk overlaps with
+        keep_from = max(0, end - self.overlap_samples)
+        self.buffer = self.buffer[keep_from:]
+        self.buffer_start += keep_from
+        return self._rescore()
+
+    def _rescore(self) -> dict:
+        self.updates += 1
+        top_before = self.names[0] if self.names else None
+        if len(self.notes) >= STREAM_MIN_NOTES:
+            self.names, self.scores = search_audio(self.notes, self.audio_folder, self.n, mode=self.mode, rerank=False)
+        self.stable_updates = self.stable_updates + 1 if self.names and self.names[0] == top_before else 0
+        return self.final_result()
+
+    def should_stop(self, stop_when_confident: bool = True, max_seconds: float = STREAM_MAX_SECONDS) -> bool:
+        return self.seconds >= max_seconds or (stop_when_confident and self.confident)
+
+    def final_result(self) -> dict:
+        """The current ranking and how much audio it is based on."""
+        return {
+            "update": self.updates,
+            "seconds": round(self.seconds, 2),
+            "notes": len(self.notes),
+            "similar_audios": [os.path.basename(name) for name in self.names],
+            "similarity_scores": [float(score) for score in self.scores],
+            "confident": self.confident,
+        }
+
+    @property
+    def confident(self):
+        if len(self.scores) < 2 or self.stable_updates + 1 < STREAM_STABLE_UPDATES:
+            return False
+        return self.scores[0] - self.scores[1] >= STREAM_MARGIN
@@ -0,0 +1,90 @@
+import io
+import numpy as np
+import librosa
+from typing import List, Tuple
+from scipy.io import wavfile
+from basic_pitch import note_creation
+from basic_pitch.constants import AUDIO_SAMPLE_RATE, AUDIO_N_SAMPLES, FFT_HOP
+from basic_pitch.inference import unwrap_output
+from .pitch_model import get_basic_pitch_model
+from ..midi_scan import MAX_NOTES
+
+# Same windowing and note thresholds as basic_pitch.inference.predict
+N_OVERLAPPING_FRAMES = 30
+OVERLAP_LEN = N_OVERLAPPING_FRAMES * FFT_HOP
+HOP_SIZE = AUDIO_N_SAMPLES - OVERLAP_LEN
+ONSET_THRESHOLD = 0.5
+FRAME_THRESHOLD = 0.3
+MIN_NOTE_LENGTH_MS = 127.70
+MIDI_TEMPO = 120
+# pretty_midi's default resolution, which Basic Pitch's MIDI files are written with
+MIDI_RESOLUTION = 220
+TICKS_PER_SECOND = MIDI_TEMPO / 60 * MIDI_RESOLUTION
+
+def to_float_mono(audio: np.ndarray) -> np.ndarray:
+    """float32 mono samples in [-1, 1] from int PCM or float, mono or (n, channels)."""
+    audio = np.asarray(audio)
+    if np.issubdtype(audio.dtype, np.integer):
+        info = np.iinfo(audio.dtype)
+        # 8-bit WAV is unsigned, centre it first
+        offset = (int(info.max) + 1) // 2 if info.min == 0 else 0
+        audio = (audio.astype(np.float32) - offset) / max(abs(info.min + offset), info.max - offset)
+    audio = audio.astype(np.float32, copy=False)
+    return audio.mean(axis=1) if audio.ndim == 2 else audio
+
+def decode_wav_bytes(data: bytes) -> Tuple[np.ndarray, int]:
+    sample_rate, audio = wavfile.read(io.BytesIO(data))
+    return to_float_mono(audio), int(sample_rate)
+
+def decode_pcm_bytes(data: bytes, sample_rate: int, channels: int = 1) -> Tuple[np.ndarray, int]:
+    """Raw little-endian 16-bit PCM, interleaved when channels > 1."""
+    if sample_rate <= 0:
+        raise ValueError("sample_rate must be positive")
+    audio = np.frombuffer(data[:len(data) - len(data) % (2 * channels)], dtype='<i2')
+    return to_float_mono(audio.reshape(-1, channels)), int(sample_rate)
+
+def predict_buffer(audio: np.ndarray, sample_rate: int) -> dict:
+    """Basic Pitch model output (note/onset/contour frames) for an in-memory mono buffer."""
+    audio = to_float_mono(audio)
+    if sample_rate != AUDIO_SAMPLE_RATE:
+        audio = librosa.resample(audio, orig_sr=sample_rate, target_sr=AUDIO_SAMPLE_RATE)
+    original_length = len(audio)
+
+    padded = np.concatenate([np.zeros(OVERLAP_LEN // 2, dtype=np.float32), audio])
+    n_windows = max(1, int(np.ceil(len(padded) / HOP_SIZE)))
+    padded = np.pad(padded, (0, (n_windows - 1) * HOP_SIZE + AUDIO_N_SAMPLES - len(padded)))
+    windows = np.lib.stride_tricks.sliding_window_view(padded, AUDIO_N_SAMPLES)[::HOP_SIZE][:n_windows]
+
+    # All windows go through the model as one batch
+    output = get_basic_pitch_model().predict(np.ascontiguousarray(windows)[:, :, None])
+    return {
+        key: unwrap_output(np.asarray(output[key]), original_length, N_OVERLAPPING_FRAMES)
+        for key in ("note", "onset", "contour")
+    }
+
+def transcribe_buffer(audio: np.ndarray, sample_rate: int):
+    """(pretty_midi object, note events) exactly as predict() would build them, without any file."""
+    model_output = predict_buffer(audio, sample_rate)
+    min_note_len = int(np.round(MIN_NOTE_LENGTH_MS / 1000 * (AUDIO_SAMPLE_RATE / FFT_HOP)))
+    return note_creation.model_output_to_notes(
+        model_output,
+        onset_thresh=ONSET_THRESHOLD,
+        frame_thresh=FRAME_THRESHOLD,
+        min_note_len=min_note_len,
+        midi_tempo=MIDI_TEMPO,
+    )
+
+def seconds_to_ticks(seconds: float) -> int:
+    return int(round(seconds * TICKS_PER_SECOND))
+
+def notes_from_buffer(audio: np.ndarray, sample_rate: int, max_notes: int = MAX_NOTES, start_time: float = 0.0) -> List[Tuple[int, int]]:
+    """(tick, pitch) note-ons in the order the written MIDI file would give them.
+
+    Ticks use the resolution of the MIDI file Basic Pitch would have
+    saved, so the result can go straight to create_feature_vector or the
+    window/n-gram search instead of a .mid round trip. start_time shifts
+    every onset, for buffers cut from a longer stream.
+    """
+    _, note_events = transcribe_buffer(audio, sample_rate)
+    notes = sorted((seconds_to_ticks(start + start_time), int(pitch)) for start, _, pitch, *_ in note_events)
+    return notes[:max_notes]
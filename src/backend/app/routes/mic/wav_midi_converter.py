@@ -1,9 +1,47 @@
-from basic_pitch.inference import predict_and_save, ICASSP_2022_MODEL_PATH
+from basic_pitch.inference import predict_and_save
 import os
 import glob
+from .pitch_model import get_basic_pitch_model
+
+# Fungsi untuk mengonversi satu file WAV ke MIDI
+def wav_to_midi(wav_file_path, output_directory, model=None):
+    """
+    Mengonversi satu file WAV ke MIDI dan mengembalikan path file MIDI-nya.
+
+    Args:
+        wav_file_path (str): Path ke file WAV.
+        output_directory (str): Direktori output untuk file MIDI.
+        model: Model Basic Pitch atau path-nya; default memakai model yang sudah dimuat.
+
+    """
+    model = get_basic_pitch_model() if model is None else model
+    os.makedirs(output_directory, exist_ok=True)
+    print(f"Memproses file: {wav_file_path}")
+
+    # Tentukan nama output MIDI
+    base_filename = os.path.splitext(os.path.basename(wav_file_path))[0]
+    midi_file_path = os.path.join(output_directory, f"{base_filename}_basic_pitch.mid")
+
+    # Hapus file MIDI yang sudah ada jika ada, untuk overwrite
+    if os.path.exists(midi_file_path):
+        os.remove(midi_file_path)
+        print(f"File lama ditemukan dan dihapus: {midi_file_path}")
+
+    # Fungsi Basic Pitch untuk mengonversi dan menyimpan hasilnya
+    predict_and_save(
+        audio_path_list=[wav_file_path],
+        output_directory=output_directory,
+        save_midi=True,
+        sonify_midi=False,
+        save_model_outputs=False,
+        save_notes=False,
+        model_or_model_path=model,
+    )
+    print(f"Berhasil dikonversi: {wav_file_path}")
+    return midi_file_path
 
 # Fungsi untuk mengonversi semua file WAV dalam folder ke MIDI
-def batch_wav_to_midi(input_directory, output_directory, model_path=ICASSP_2022_MODEL_PATH):
+def batch_wav_to_midi(input_directory, output_directory, model_path=None):
     """
     Mengonversi semua file WAV dalam folder ke MIDI menggunakan Basic Pitch.
 
@@ -11,8 +49,12 @@ def batch_wav_to_midi(input_directory, output_directory, model_path=ICASSP_2022_
         input_directory (str): Path ke folder yang berisi file WAV.
         output_directory (str): Path ke direktori output untuk menyimpan file MIDI.
         model_path (str): Path ke model yang digunakan untuk prediksi.
+            Default None memakai model yang sudah dimuat di proses ini.
 
     """
+    # Model dimuat sekali per proses, bukan setiap kali ada rekaman
+    model = get_basic_pitch_model() if model_path is None else model_path
+
     # Pastikan direktori output ada
     if not os.path.exists(output_directory):
         os.makedirs(output_directory)
@@ -28,29 +70,8 @@ def batch_wav_to_midi(input_directory, output_directory, model_path=ICASSP_2022_
 
     # Proses setiap file WAV
     for wav_file_path in wav_files:
-        print(f"Memproses file: {wav_file_path}")
         try:
-            # Tentukan nama output MIDI
-            base_filename = os.path.basename(wav_file_path).replace('.wav', '')
-            midi_filename = f"{base_filename}_basic_pitch.mid"
-            midi_file_path = os.path.join(output_directory, midi_filename)
-            
-            # Hapus file MIDI yang sudah ada jika ada, untuk overwrite
-            if os.path.exists(midi_file_path):
-                os.remove(midi_file_path)
-                print(f"File lama ditemukan dan dihapus: {midi_file_path}")
-                
-            # Fungsi Basic Pitch untuk mengonversi dan menyimpan hasilnya
-            predict_and_save(
-                audio_path_list=[wav_file_path],
-                output_directory=output_directory,
-                save_midi=True,
-                sonify_midi=False,
-                save_model_outputs=False,
-                save_notes=False,
-                model_or_model_path=model_path,
-            )
-            print(f"Berhasil dikonversi: {wav_file_path}")
+            wav_to_midi(wav_file_path, output_directory, model)
         except Exception as e:
             print(f"Gagal memroses file {wav_file_path}. Error: {e}")
 
@@ -0,0 +1,128 @@
+import os
+import time
+from typing import List, Tuple
+
+MAX_NOTES = 1000
+
+# Data bytes that follow each channel-message status (high nibble)
+CHANNEL_DATA_LENGTH = {0x80: 2, 0x90: 2, 0xA0: 2, 0xB0: 2, 0xC0: 1, 0xD0: 1, 0xE0: 2}
+# System common / realtime messages that may appear inside a track
+SYSTEM_DATA_LENGTH = {0xF1: 1, 0xF2: 2, 0xF3: 1, 0xF6: 0, 0xF8: 0, 0xFA: 0, 0xFB: 0, 0xFC: 0, 0xFE: 0}
+
+class MidiScanError(ValueError):
+    pass
+
+def _read_varlen(data, pos):
+    value = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value = (value << 7) | (byte & 0x7F)
+        if byte < 0x80:
+            return value, pos
+
+def scan_note_ons(data, channel: int = 0, max_notes: int = MAX_NOTES) -> List[Tuple[int, int]]:
+    """(time, pitch) of every note_on with velocity > 0 on the given channel.
+
+    Walks the raw Standard MIDI File bytes without building message
+    objects: only delta times and channel/meta/sysex lengths are decoded,
+    running status is honoured, and scanning stops at max_notes. Time is
+    the running sum of delta ticks across tracks, matching the mido loop
+    in extract_melody.
+    """
+    data = memoryview(data)
+    if bytes(data[:4]) != b'MThd':
+        raise MidiScanError("Not a MIDI file (missing MThd header)")
+
+    notes = []
+    current_time = 0
+    note_on_status = 0x90 | channel
+    pos = 8 + int.from_bytes(data[4:8], 'big')
+    size = len(data)
+
+    try:
+        while pos + 8 <= size:
+            chunk_type = bytes(data[pos:pos + 4])
+            chunk_end = min(pos + 8 + int.from_bytes(data[pos + 4:pos + 8], 'big'), size)
+            pos += 8
+            if chunk_type != b'MTrk':
+                pos = chunk_end
+                continue
+
+            last_status = None
+            while pos < chunk_end:
+                delta, pos = _read_varlen(data, pos)
+                current_time += delta
+
+                status = data[pos]
+                if status < 0x80:
+                    # Running status: this byte is already the first data byte
+                    if last_status is None:
+                        raise MidiScanError("Running status without a previous status byte")
+                    status = last_status
+                else:
+                    pos += 1
+                    if status != 0xFF:
+                        # Meta events don't change running status
+                        last_status = status
+
+                if status == 0xFF:
+                    length, pos = _read_varlen(data, pos + 1)
+                    pos += length
+                elif status == 0xF0 or status == 0xF7:
+                    length, pos = _read_varlen(data, pos)
+                    pos += length
+                elif status >= 0xF0:
+                    pos += SYSTEM_DATA_LENGTH.get(status, 0)
+                else:
+                    if status == note_on_status and data[pos + 1] > 0:
+                        notes.append((current_time, data[pos]))
+                        if len(notes) >= max_notes:
+                            return notes
+                    pos += CHANNEL_DATA_LENGTH[status & 0xF0]
+            pos = chunk_end
+    except IndexError:
+        raise MidiScanError("Truncated MIDI data")
+
+    return notes
+
+def read_note_ons(midi_path: str, channel: int = 0, max_notes: int = MAX_NOTES) -> List[Tuple[int, int]]:
+    with open(midi_path, 'rb') as f:
+        return scan_note_ons(f.read(), channel=channel, max_notes=max_notes)
+
+def benchmark_against_mido(audio_folder: str):
+    """Compare output and runtime of the scanner and mido over a folder of MIDI files."""
+    from mido import MidiFile, Message
+
+    def mido_note_ons(path):
+        notes = []
+        current_time = 0
+        for track in MidiFile(path).tracks:
+            for msg in track:
+                current_time += msg.time
+                if isinstance(msg, Message) and msg.type == 'note_on' and msg.velocity > 0 and msg.channel == 0:
+                    notes.append((current_time, msg.note))
+                    if len(notes) >= MAX_NOTES:
+                        return notes
+        return notes
+
+    paths = [os.path.join(audio_folder, f) for f in os.listdir(audio_folder) if f.endswith('.mid')]
+
+    start = time.perf_counter()
+    mido_results = [mido_note_ons(path) for path in paths]
+    mido_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    scan_results = [read_note_ons(path) for path in paths]
+    scan_time = time.perf_counter() - start
+
+    mismatches = [os.path.basename(p) for p, a, b in zip(paths, mido_results, scan_results) if a != b]
+    print(f"Files: {len(paths)}")
+    print(f"mido:    {mido_time:.3f}s")
+    print(f"scanner: {scan_time:.3f}s ({mido_time / scan_time:.1f}x faster)")
+    print(f"Mismatches: {len(mismatches)} {mismatches[:5]}")
+    return {"files": len(paths), "mido_time": mido_time, "scan_time": scan_time, "mismatches": mismatches}
+
+if __name__ == "__main__":
+    # python -m routes.midi_scan
+    benchmark_against_mido(os.path.join(os.path.dirname(os.path.dirname(__file__)), "music_audios"))
@@ -0,0 +1,220 @@
+import os
+import numpy as np
+from .index_store import INDEX_DIR, CachedIndex, save_npz
+
+NGRAM_INDEX_PATH = os.path.join(INDEX_DIR, "ngram_index.npz")
+
+NGRAM_LENGTH = int(os.environ.get("NGRAM_LENGTH", 4))  # intervals per gram
+INTERVAL_CLIP = 12  # jumps beyond an octave share one bucket
+INTERVAL_ALPHABET = 2 * INTERVAL_CLIP + 1
+# Grams found in more than this fraction of songs carry no signal (e.g. repeated notes)
+MAX_DOCUMENT_FREQUENCY = 0.5
+
+def interval_ngrams(pitches, n=NGRAM_LENGTH):
+    """Integer key of every n-gram of quantized pitch intervals.
+
+    Intervals don't change when a melody is transposed, so a hummed query
+    in another key produces the same keys. Key i starts at note i.
+    """
+    pitches = np.asarray(pitches, dtype=np.int64)
+    if len(pitches) < n + 1:
+        return np.zeros(0, dtype=np.int64)
+    intervals = np.clip(np.diff(pitches), -INTERVAL_CLIP, INTERVAL_CLIP) + INTERVAL_CLIP
+    keys = np.zeros(len(intervals) - n + 1, dtype=np.int64)
+    for j in range(n):
+        keys = keys * INTERVAL_ALPHABET + intervals[j:len(intervals) - n + 1 + j]
+    return keys
+
+class NgramIndex:
+    """Inverted index: interval n-gram -> posting list of (song, note offset).
+
+    Postings are kept in CSR form: keys are the sorted distinct grams and
+    posting_song/posting_offset[starts[i]:starts[i + 1]] belong to keys[i].
+    The pitch contour of every song is kept alongside, also in CSR form
+    (pitches[pitch_starts[s]:pitch_starts[s + 1]]), so DTW reranking never
+    has to re-read MIDI files. Indexes saved before that have pitches None.
+    """
+
+    def __init__(self, names, keys, starts, posting_song, posting_offset, n=NGRAM_LENGTH,
+                 pitches=None, pitch_starts=None):
+        self.names = list(names)
+        self.keys = np.asarray(keys, dtype=np.int64)
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.posting_song = np.asarray(posting_song, dtype=np.int32)
+        self.posting_offset = np.asarray(posting_offset, dtype=np.int32)
+        self.n = int(n)
+        if pitches is None and not self.names:
+            pitches, pitch_starts = [], [0]
+        self.pitches = None if pitches is None else np.asarray(pitches, dtype=np.uint8)
+        self.pitch_starts = None if pitch_starts is None else np.asarray(pitch_starts, dtype=np.int64)
+        self._rows = None
+
+    def __len__(self):
+        return len(self.names)
+
+    @classmethod
+    def empty(cls, n=NGRAM_LENGTH):
+        return cls([], [], [0], [], [], n=n)
+
+    def pitch_sequence(self, name):
+        """Stored pitch contour of a song, or None if the song or the contours are missing."""
+        if self.pitches is None:
+            return None
+        if self._rows is None:
+            self._rows = {song: i for i, song in enumerate(self.names)}
+        row = self._rows.get(name)
+        if row is None:
+            return None
+        return self.pitches[self.pitch_starts[row]:self.pitch_starts[row + 1]]
+
+    def _postings(self):
+        """Flat (key, song, offset) triples."""
+        flat_keys = np.repeat(self.keys, np.diff(self.starts))
+        return flat_keys, self.posting_song, self.posting_offset
+
+    def _set_postings(self, flat_keys, songs, offsets):
+        """Store flat postings that are already sorted by (key, song, offset)."""
+        boundaries = np.flatnonzero(flat_keys[1:] != flat_keys[:-1]) + 1
+        first = np.concatenate([[0], boundaries]) if len(flat_keys) else np.zeros(0, dtype=np.int64)
+        self.keys = flat_keys[first].astype(np.int64)
+        self.starts = np.append(first, len(flat_keys)).astype(np.int64)
+        self.posting_song = songs.astype(np.int32)
+        self.posting_offset = offsets.astype(np.int32)
+
+    def add(self, names, pitch_sequences):
+        """Append songs, merging their postings into the sorted CSR arrays.
+
+        Only the new postings are sorted. New songs get ids above every
+        existing one, so within a gram they go after the old postings and
+        the merge is one searchsorted plus a linear copy.
+        """
+        names = list(names)
+        self.remove(names)
+        pitch_sequences = [np.asarray(pitches, dtype=np.uint8) for pitches in pitch_sequences]
+        new_keys, new_songs, new_offsets = [], [], []
+        for i, pitches in enumerate(pitch_sequences):
+            grams = interval_ngrams(pitches, self.n)
+            new_keys.append(grams)
+            new_songs.append(np.full(len(grams), len(self.names) + i, dtype=np.int32))
+            new_offsets.append(np.arange(len(grams), dtype=np.int32))
+        self.names.extend(names)
+        self._rows = None
+        if self.pitches is not None and pitch_sequences:
+            lengths = [len(pitches) for pitches in pitch_sequences]
+            self.pitches = np.concatenate([self.pitches] + pitch_sequences)
+            self.pitch_starts = np.concatenate([self.pitch_starts, self.pitch_starts[-1] + np.cumsum(lengths)])
+        if not new_keys:
+            return self
+
+        new_keys = np.concatenate(new_keys)
+        new_songs = np.concatenate(new_songs)
+        new_offsets = np.concatenate(new_offsets)
+        order = np.lexsort((new_offsets, new_songs, new_keys))
+        new_keys, new_songs, new_offsets = new_keys[order], new_songs[order], new_offsets[order]
+
+        flat_keys, songs, offsets = self._postings()
+        # Slot of each new posting in the merged arrays
+        slots = np.searchsorted(flat_keys, new_keys, side='right') + np.arange(len(new_keys))
+        is_new = np.zeros(len(flat_keys) + len(new_keys), dtype=bool)
+        is_new[slots] = True
+
+        def merge(old, new):
+            merged = np.empty(len(is_new), dtype=np.result_type(old, new))
+            merged[slots] = new
+            merged[~is_new] = old
+            return merged
+
+        self._set_postings(merge(flat_keys, new_keys), merge(songs, new_songs), merge(offsets, new_offsets))
+        return self
+
+    def remove(self, names):
+        removed = set(names)
+        keep_song = np.array([name not in removed for name in self.names], dtype=bool)
+        if keep_song.all():
+            return self
+        # Renumbering keeps the song order, so the postings stay sorted
+        new_id = np.cumsum(keep_song) - 1
+        flat_keys, songs, offsets = self._postings()
+        keep = keep_song[songs]
+        self.names = [name for name, keep_name in zip(self.names, keep_song) if keep_name]
+        self._rows = None
+        self._set_postings(flat_keys[keep], new_id[songs[keep]], offsets[keep])
+        if self.pitches is not None:
+            lengths = np.diff(self.pitch_starts)
+            self.pitches = self.pitches[np.repeat(keep_song, lengths)]
+            self.pitch_starts = np.concatenate([[0], np.cumsum(lengths[keep_song])])
+        return self
+
+    def candidate_scores(self, query_pitches):
+        """Per-song score: idf-weighted count of distinct query grams the song contains.
+
+        Only the posting lists of the query's own grams are touched, so the
+        cost grows with the hits, not with the catalogue size.
+        """
+        n_songs = len(self.names)
+        query_keys = np.unique(interval_ngrams(query_pitches, self.n))
+        if len(query_keys) == 0 or len(self.keys) == 0:
+            return np.zeros(n_songs, dtype=np.float32)
+
+        pos = np.searchsorted(self.keys, query_keys)
+        in_range = pos < len(self.keys)
+        pos, query_keys = pos[in_range], query_keys[in_range]
+        found = pos[self.keys[pos] == query_keys]
+
+        # Gather every posting of the matched grams without a Python loop
+        lengths = self.starts[found + 1] - self.starts[found]
+        gram_of_posting = np.repeat(np.arange(len(found), dtype=np.int64), lengths)
+        posting_idx = np.repeat(self.starts[found] - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+
+        # Count each (gram, song) pair once, however often the song repeats the gram
+        pairs = np.unique(gram_of_posting * n_songs + self.posting_song[posting_idx])
+        pair_gram, pair_song = pairs // n_songs, pairs % n_songs
+
+        document_frequency = np.bincount(pair_gram, minlength=len(found))
+        idf = np.log(n_songs / np.maximum(document_frequency, 1))
+        idf[document_frequency > max(1, int(MAX_DOCUMENT_FREQUENCY * n_songs))] = 0
+        return np.bincount(pair_song, weights=idf[pair_gram], minlength=n_songs).astype(np.float32)
+
+    def candidates(self, query_pitches, limit):
+        """Indices of up to limit songs with posting-list hits, best first."""
+        scores = self.candidate_scores(query_pitches)
+        hit = np.flatnonzero(scores > 0)
+        order = hit[np.argsort(-scores[hit], kind='stable')][:limit]
+        return order, scores[order]
+
+    def save(self, path=NGRAM_INDEX_PATH):
+        save_npz(
+            path,
+            names=np.array(self.names, dtype=str),
+            keys=self.keys,
+            starts=self.starts,
+            posting_song=self.posting_song,
+            posting_offset=self.posting_offset,
+            n=np.array(self.n),
+            **({} if self.pitches is None else {"pitches": self.pitches, "pitch_starts": self.pitch_starts}),
+        )
+        print(f"N-gram index saved to {path} ({len(self)} songs, {len(self.keys)} grams)")
+
+    @classmethod
+    def load(cls, path=NGRAM_INDEX_PATH):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                names=data["names"].tolist(),
+                keys=data["keys"],
+                starts=data["starts"],
+                posting_song=data["posting_song"],
+                posting_offset=data["posting_offset"],
+                n=int(data["n"]),
+                pitches=data["pitches"] if "pitches" in data else None,
+                pitch_starts=data["pitch_starts"] if "pitch_starts" in data else None,
+            )
+
+_cache = CachedIndex(NgramIndex.load, "n-gram")
+
+def get_cached_ngram_index(path=NGRAM_INDEX_PATH):
+    """Load the n-gram index from disk, reloading only when the file has changed."""
+    return _cache.get(path)
+
+def set_cached_ngram_index(index, path=NGRAM_INDEX_PATH):
+    """Persist the n-gram index and make it the active index for this process."""
+    return _cache.set(index, path)
@@ -0,0 +1,105 @@
+import time
+import numpy as np
+
+PCA_SOLVERS = ("full", "gram", "randomized")
+
+# Above this many samples the N x N Gram matrix stops being cheap
+GRAM_MAX_SAMPLES = 4000
+
+def choose_solver(n_samples, n_features, n_components):
+    """Pick a solver from the matrix shape.
+
+    - gram: N << D, eigendecomposition of the N x N matrix X X^T
+    - randomized: both N and D large, only a few components needed
+    - full: everything else (small matrices or most components requested)
+    """
+    rank = min(n_samples, n_features)
+    if n_components >= 0.5 * rank:
+        return "full"
+    if n_samples * 4 <= n_features and n_samples <= GRAM_MAX_SAMPLES:
+        return "gram"
+    return "randomized"
+
+def svd_full(X, n_components):
+    _, S, Vt = np.linalg.svd(X, full_matrices=False)
+    return Vt[:n_components], S[:n_components]
+
+def svd_gram(X, n_components):
+    """Top right singular vectors from the eigendecomposition of X X^T."""
+    gram = X @ X.T
+    eigvals, eigvecs = np.linalg.eigh(gram)
+    # eigh returns ascending eigenvalues
+    order = np.argsort(eigvals)[::-1][:n_components]
+    eigvals = np.clip(eigvals[order], 0, None)
+    eigvecs = eigvecs[:, order]
+
+    S = np.sqrt(eigvals)
+    # Drop null directions, they have no well-defined right singular vector
+    keep = S > (S.max() * 1e-10 if S.size else 0)
+    S, eigvecs = S[keep], eigvecs[:, keep]
+    # v_i = X^T u_i / s_i
+    components = (eigvecs.T @ X) / S[:, None]
+    return components, S
+
+def svd_randomized(X, n_components, n_oversamples=10, n_iter=4, random_state=0):
+    """Halko et al. randomized range finder with power iterations."""
+    rng = np.random.default_rng(random_state)
+    n_random = min(n_components + n_oversamples, min(X.shape))
+
+    Q = X @ rng.standard_normal((X.shape[1], n_random))
+    Q, _ = np.linalg.qr(Q)
+    for _ in range(n_iter):
+        # Re-orthonormalize each half-step to keep small singular directions from vanishing
+        Q, _ = np.linalg.qr(X.T @ Q)
+        Q, _ = np.linalg.qr(X @ Q)
+
+    B = Q.T @ X
+    _, S, Vt = np.linalg.svd(B, full_matrices=False)
+    return Vt[:n_components], S[:n_components]
+
+def truncated_svd(X, n_components, solver="auto"):
+    """Return (components, singular_values) of the centered matrix X."""
+    if solver == "auto":
+        solver = choose_solver(X.shape[0], X.shape[1], n_components)
+    if solver == "full":
+        return svd_full(X, n_components)
+    if solver == "gram":
+        return svd_gram(X, n_components)
+    if solver == "randomized":
+        return svd_randomized(X, n_components)
+    raise ValueError(f"Unknown PCA solver: {solver}. Choose from {('auto',) + PCA_SOLVERS}")
+
+def reconstruction_error(X, components):
+    """Relative Frobenius error of projecting X onto the given components."""
+    reconstructed = (X @ components.T) @ components
+    denom = np.linalg.norm(X)
+    return float(np.linalg.norm(X - reconstructed) / denom) if denom else 0.0
+
+def compare_pca_solvers(X, n_components):
+    """Reconstruction error and runtime of every solver, relative to the exact SVD."""
+    report = {}
+    for solver in PCA_SOLVERS:
+        start = time.perf_counter()
+        components, _ = truncated_svd(X, n_components, solver=solver)
+        elapsed = time.perf_counter() - start
+        report[solver] = {
+            "reconstruction_error": reconstruction_error(X, components),
+            "time": elapsed,
+        }
+
+    exact = report["full"]["reconstruction_error"]
+    for solver, result in report.items():
+        result["error_vs_full"] = result["reconstruction_error"] - exact
+        print(f"{solver:>10}: error={result['reconstruction_error']:.6f} "
+              f"(+{result['error_vs_full']:.2e} vs full) time={result['time']:.3f}s")
+    return report
+
+if __name__ == "__main__":
+    # Parity report on the bundled album covers: python -m routes.pca
+    from .image import IMAGE_FOLDER, IMAGE_WIDTH, IMAGE_HEIGHT, N_COMPONENTS, get_paths, process_image_paths, center_data
+
+    images_array, _ = process_image_paths(get_paths(IMAGE_FOLDER), IMAGE_WIDTH, IMAGE_HEIGHT)
+    centered, _ = center_data(images_array)
+    print(f"Matrix shape: {centered.shape}, auto solver: "
+          f"{choose_solver(centered.shape[0], centered.shape[1], N_COMPONENTS)}")
+    compare_pca_solvers(centered, N_COMPONENTS)
@@ -0,0 +1,49 @@
+import numpy as np
+
+def squared_norms(matrix):
+    """Row-wise ||x||^2 without materializing x * x."""
+    matrix = np.atleast_2d(matrix)
+    return np.einsum('ij,ij->i', matrix, matrix)
+
+def squared_euclidean_distances(queries, data, data_sq_norms=None):
+    """(Q, N) matrix of ||q - x||^2 using ||q||^2 - 2 q.x + ||x||^2."""
+    queries = np.atleast_2d(queries)
+    if data_sq_norms is None:
+        data_sq_norms = squared_norms(data)
+
+    distances = queries @ data.T
+    distances *= -2
+    distances += squared_norms(queries)[:, None]
+    distances += data_sq_norms[None, :]
+    # Cancellation can leave tiny negatives for near-identical vectors
+    np.maximum(distances, 0, out=distances)
+    return distances
+
+def top_k_indices(scores, k, largest=True):
+    """Per-row indices of the k best scores, sorted best first.
+
+    Uses argpartition so only the selected k entries are sorted.
+    """
+    scores = np.atleast_2d(scores)
+    n = scores.shape[1]
+    k = max(0, min(k, n))
+    if k == 0:
+        return np.empty((scores.shape[0], 0), dtype=np.intp)
+
+    keyed = -scores if largest else scores
+    if k < n:
+        candidates = np.argpartition(keyed, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.broadcast_to(np.arange(n), scores.shape)
+    order = np.argsort(np.take_along_axis(keyed, candidates, axis=1), axis=1, kind='stable')
+    return np.take_along_axis(candidates, order, axis=1)
+
+def l2_normalize(matrix):
+    """Unit-length rows; all-zero rows stay zero."""
+    matrix = np.atleast_2d(np.asarray(matrix))
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+def cosine_similarities(queries, normalized_data):
+    """(Q, N) cosine similarities against rows that are already L2-normalized."""
+    return l2_normalize(queries).astype(normalized_data.dtype, copy=False) @ normalized_data.T
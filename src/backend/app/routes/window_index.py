@@ -0,0 +1,133 @@
+import os
+import numpy as np
+from .index_store import INDEX_DIR, CachedIndex, save_npz
+from .audio_index import FEATURE_DIM
+from .similarity import l2_normalize, cosine_similarities, top_k_indices
+
+WINDOW_INDEX_PATH = os.path.join(INDEX_DIR, "window_index.npz")
+
+# Defaults follow windowing() in audio.py; override per deployment via env
+WINDOW_SIZE = int(os.environ.get("WINDOW_SIZE", 40))
+WINDOW_SLIDE = int(os.environ.get("WINDOW_SLIDE", 8))
+WINDOW_AGGREGATE = os.environ.get("WINDOW_AGGREGATE", "max")  # "max" or "topm"
+WINDOW_TOP_M = int(os.environ.get("WINDOW_TOP_M", 3))
+
+class WindowIndex:
+    """Per-window feature vectors of every song in one contiguous W x 638 array.
+
+    song_ids[w] is the row in names that window w belongs to; windows are
+    kept grouped by song (song_ids is non-decreasing) so per-song
+    aggregation can work on contiguous segments.
+    """
+
+    def __init__(self, names, features, song_ids, window_size, window_slide):
+        self.names = list(names)
+        self.features = l2_normalize(np.asarray(features, dtype=np.float32).reshape(-1, FEATURE_DIM))
+        self.song_ids = np.asarray(song_ids, dtype=np.int32)
+        self.window_size = int(window_size)
+        self.window_slide = int(window_slide)
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def n_windows(self):
+        return len(self.song_ids)
+
+    def add(self, names, window_features):
+        """Append songs; window_features holds one (k_i, 638) array per song."""
+        names = list(names)
+        self.remove(names)
+        new_ids = [
+            np.full(len(features), len(self.names) + i, dtype=np.int32)
+            for i, features in enumerate(window_features)
+        ]
+        self.names.extend(names)
+        if new_ids:
+            self.features = np.vstack([self.features] + [
+                l2_normalize(np.asarray(f, dtype=np.float32).reshape(-1, FEATURE_DIM)) for f in window_features
+            ])
+            self.song_ids = np.concatenate([self.song_ids] + new_ids)
+        return self
+
+    def remove(self, names):
+        removed = set(names)
+        keep_song = np.array([name not in removed for name in self.names], dtype=bool)
+        if keep_song.all():
+            return self
+        # Renumber the surviving songs; order (and therefore grouping) is preserved
+        new_id = np.cumsum(keep_song) - 1
+        keep_window = keep_song[self.song_ids]
+        self.names = [name for name, keep in zip(self.names, keep_song) if keep]
+        self.features = self.features[keep_window]
+        self.song_ids = new_id[self.song_ids[keep_window]].astype(np.int32)
+        return self
+
+    def song_scores(self, query_windows, aggregate=WINDOW_AGGREGATE, top_m=WINDOW_TOP_M):
+        """Score every song against a query given as one or more window vectors.
+
+        Each database window takes its best match over the query windows,
+        then windows are aggregated per song by max or by the mean of the
+        top-m windows. Songs without windows score -inf.
+        """
+        scores = np.full(len(self.names), -np.inf, dtype=np.float32)
+        if self.n_windows == 0:
+            return scores
+
+        window_scores = cosine_similarities(query_windows, self.features).max(axis=0)
+        counts = np.bincount(self.song_ids, minlength=len(self.names))
+        has_windows = counts > 0
+        starts = np.searchsorted(self.song_ids, np.flatnonzero(has_windows))
+
+        if aggregate == "max":
+            scores[has_windows] = np.maximum.reduceat(window_scores, starts)
+            return scores
+        if aggregate != "topm":
+            raise ValueError(f"Unknown window aggregate: {aggregate}")
+
+        # Sort each song's windows by descending score and keep the first top_m
+        order = np.lexsort((-window_scores, self.song_ids))
+        segment_starts = np.repeat(starts, counts[has_windows])
+        in_top = (np.arange(len(order)) - segment_starts) < top_m
+        top_ids = self.song_ids[order][in_top]
+        totals = np.bincount(top_ids, weights=window_scores[order][in_top], minlength=len(self.names))
+        scores[has_windows] = totals[has_windows] / np.minimum(counts[has_windows], top_m)
+        return scores
+
+    def search(self, query_windows, k, aggregate=WINDOW_AGGREGATE, top_m=WINDOW_TOP_M):
+        scores = self.song_scores(query_windows, aggregate=aggregate, top_m=top_m)
+        k = min(k, int(np.count_nonzero(np.isfinite(scores))))
+        indices = top_k_indices(scores, k, largest=True)[0]
+        return indices, scores[indices]
+
+    def save(self, path=WINDOW_INDEX_PATH):
+        save_npz(
+            path,
+            names=np.array(self.names, dtype=str),
+            features=self.features,
+            song_ids=self.song_ids,
+            params=np.array([self.window_size, self.window_slide]),
+        )
+        print(f"Window index saved to {path} ({len(self)} songs, {self.n_windows} windows)")
+
+    @classmethod
+    def load(cls, path=WINDOW_INDEX_PATH):
+        with np.load(path, allow_pickle=False) as data:
+            window_size, window_slide = data["params"].tolist()
+            return cls(
+                names=data["names"].tolist(),
+                features=data["features"],
+                song_ids=data["song_ids"],
+                window_size=window_size,
+                window_slide=window_slide,
+            )
+
+_cache = CachedIndex(WindowIndex.load, "window")
+
+def get_cached_window_index(path=WINDOW_INDEX_PATH):
+    """Load the window index from disk, reloading only when the file has changed."""
+    return _cache.get(path)
+
+def set_cached_window_index(index, path=WINDOW_INDEX_PATH):
+    """Persist the window index and make it the active index for this process."""
+    return _cache.set(index, path)
@@ -0,0 +1,54 @@
+import os
+import numpy as np
+from routes.audio import extract_melody, create_feature_vector, cosine_similarity, extract_feature_vectors, PARALLEL_MIN_FILES
+from routes.audio_index import AudioIndex
+
+MUSIC_AUDIOS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app", "music_audios")
+
+def catalogue_paths(count):
+    names = sorted(name for name in os.listdir(MUSIC_AUDIOS) if name.endswith('.mid'))
+    return [os.path.join(MUSIC_AUDIOS, name) for name in names[:count]]
+
+def test_feature_matrix_matches_per_file_vectors(tmp_path):
+    empty = tmp_path / "empty.mid"
+    empty.write_bytes(b"not a midi file")
+    paths = catalogue_paths(5) + [str(empty)]
+
+    features = extract_feature_vectors(paths, workers=1)
+    assert features.shape == (6, 638) and features.dtype == np.float32
+    for row, path in zip(features[:5], paths):
+        np.testing.assert_allclose(row, create_feature_vector(extract_melody(path)), rtol=1e-6)
+    # Unreadable files keep an all-zero row
+    assert not features[5].any()
+
+def test_search_matches_pairwise_cosine():
+    rng = np.random.default_rng(0)
+    features = rng.random((20, 638)).astype(np.float32)
+    features[[3, 11]] = 0  # files without notes
+    index = AudioIndex([f"{i}.mid" for i in range(20)], features)
+    queries = rng.random((2, 638))
+
+    indices, scores = index.search(queries, 25)
+    for query, row_indices, row_scores in zip(queries, indices, scores):
+        expected = np.array([cosine_similarity(query, row) for row in features])
+        expected[[3, 11]] = -np.inf
+        np.testing.assert_array_equal(row_indices, np.argsort(-expected, kind='stable')[:18])
+        np.testing.assert_allclose(row_scores, np.sort(expected)[::-1][:18], rtol=1e-5)
+
+def test_add_replaces_rows_by_name():
+    rng = np.random.default_rng(0)
+    index = AudioIndex(["a.mid", "b.mid", "c.mid"], rng.random((3, 638)))
+    replacement = rng.random((1, 638))
+    index.add(["b.mid"], replacement)
+
+    assert index.names == ["a.mid", "c.mid", "b.mid"]
+    np.testing.assert_array_equal(index.rows_for(["b.mid", "a.mid"]), [2, 0])
+    assert index.search(replacement, 1)[0].tolist() == [[2]]
+
+def test_process_pool_matches_serial_extraction():
+    paths = catalogue_paths(PARALLEL_MIN_FILES + 6)
+    serial = extract_feature_vectors(paths, workers=1)
+    parallel = extract_feature_vectors(paths, workers=2)
+
+    assert serial.any(axis=1).all()
+    np.testing.assert_array_equal(parallel, serial)
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+from routes import audio
+from routes.dtw import banded_dtw, dtw_rerank
+from routes.ngram_index import NgramIndex
+
+def naive_dtw(query, window, band):
+    """Cell-by-cell DTW over the same Sakoe-Chiba band, normalized by path length."""
+    m, n = len(query), len(window)
+    band = max(band, abs(m - n))
+    D = np.full((m + 1, n + 1), np.inf)
+    D[0, 0] = 0
+    for i in range(1, m + 1):
+        for j in range(1, n + 1):
+            if abs(i * (n / m) - j) <= band:
+                D[i, j] = abs(query[i - 1] - window[j - 1]) + min(D[i - 1, j - 1], D[i - 1, j], D[i, j - 1])
+    return D[m, n] / (m + n)
+
+@pytest.mark.parametrize("m, n, band", [(12, 12, 2), (12, 12, 0), (9, 14, 3), (14, 9, 1), (10, 10, 100)])
+def test_banded_dtw_matches_naive_dp(m, n, band):
+    rng = np.random.default_rng(m * n + band)
+    query, windows = rng.standard_normal(m), rng.standard_normal((4, n))
+
+    expected = [naive_dtw(query, window, band) for window in windows]
+    np.testing.assert_allclose(banded_dtw(query, windows, band), expected, rtol=1e-5)
+
+def test_banded_dtw_of_identical_sequence_is_zero():
+    query = np.random.default_rng(0).standard_normal(16)
+    assert banded_dtw(query, query[None, :], band=2)[0] == 0
+
+def test_wider_band_never_costs_more():
+    rng = np.random.default_rng(1)
+    query, windows = rng.standard_normal(20), rng.standard_normal((8, 20))
+    narrow, wide = banded_dtw(query, windows, band=1), banded_dtw(query, windows, band=20)
+    assert (wide <= narrow + 1e-6).all()
+
+def songs():
+    rng = np.random.default_rng(0)
+    return {f"{i}.mid": 60 + rng.integers(-7, 8, size=80) for i in range(6)}
+
+def test_dtw_rerank_finds_transposed_excerpt():
+    catalogue = songs()
+    query = catalogue["4.mid"][30:50] + 5
+    candidates = ["0.mid", "1.mid", "2.mid", "3.mid", "4.mid", "5.mid"]
+    reranked = dtw_rerank(query, candidates, catalogue.get, band=3)
+
+    assert reranked[0] == ("4.mid", pytest.approx(1.0))
+    assert sorted(name for name, _ in reranked) == candidates
+    assert [score for _, score in reranked] == sorted((score for _, score in reranked), reverse=True)
+
+def test_dtw_rerank_keeps_order_of_songs_not_reranked():
+    catalogue = dict(songs(), **{"empty.mid": []})
+    reranked = dtw_rerank(catalogue["1.mid"][:20], ["empty.mid", "0.mid", "1.mid"], catalogue.get, band=3, budget_ms=0)
+    assert reranked == [("empty.mid", None), ("0.mid", None), ("1.mid", None)]
+
+    reranked = dtw_rerank(catalogue["1.mid"][:20], ["empty.mid", "0.mid", "1.mid"], catalogue.get, band=3)
+    assert [name for name, _ in reranked] == ["1.mid", "0.mid", "empty.mid"]
+    assert reranked[-1] == ("empty.mid", None)
+
+def test_rerank_with_dtw_keeps_each_songs_score(monkeypatch):
+    catalogue = songs()
+    index = NgramIndex.empty().add(list(catalogue), list(catalogue.values()))
+    monkeypatch.setattr(audio, "load_or_build_ngram_index", lambda folder: index)
+    query_notes = [(t, pitch) for t, pitch in enumerate(catalogue["2.mid"][10:30])]
+
+    names = ["0.mid", "1.mid", "2.mid", "3.mid", "4.mid"]
+    scores = [0.9, 0.8, 0.7, 0.6, 0.5]
+    reranked_names, reranked_scores = audio.rerank_with_dtw(query_notes, "unused", names, scores, top_k=3)
+
+    assert reranked_names[0] == "2.mid"
+    assert sorted(reranked_names[:3]) == names[:3]
+    assert reranked_names[3:] == names[3:]
+    assert dict(zip(reranked_names, reranked_scores)) == dict(zip(names, scores))
@@ -0,0 +1,60 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from routes import executor
+
+@pytest.fixture
+def pool(monkeypatch):
+    # Threads stand in for the process pool so the test can share state with the calls
+    pool = ThreadPoolExecutor(max_workers=4)
+    monkeypatch.setattr(executor, "get_executor", lambda: pool)
+    monkeypatch.setattr(executor, "RETRIEVAL_MAX_CONCURRENCY", 2)
+    monkeypatch.setattr(executor, "_semaphore", None)
+    monkeypatch.setattr(executor, "_stats", {"queued": 0, "running": 0, "completed": 0, "failed": 0})
+    yield pool
+    pool.shutdown(wait=True)
+
+def test_concurrency_is_capped_and_counted(pool):
+    lock = threading.Lock()
+    running, peak = [0], [0]
+
+    def search(query):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.02)
+        with lock:
+            running[0] -= 1
+        if query == 3:
+            raise ValueError("bad query")
+        return query * 10
+
+    async def main():
+        calls = [executor.run_retrieval(search, query) for query in range(6)]
+        return await asyncio.gather(*calls, return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert results[:3] + results[4:] == [0, 10, 20, 40, 50]
+    assert isinstance(results[3], ValueError)
+    assert peak[0] == 2
+    stats = executor.retrieval_stats()
+    assert (stats["queue_depth"], stats["running"], stats["completed"], stats["failed"]) == (0, 0, 5, 1)
+
+def test_cancelled_waiter_leaves_the_queue(pool):
+    release = threading.Event()
+
+    async def main():
+        busy = [asyncio.ensure_future(executor.run_retrieval(release.wait, 5)) for _ in range(2)]
+        waiting = asyncio.ensure_future(executor.run_retrieval(sum, [1, 2]))
+        await asyncio.sleep(0.05)
+        assert executor.retrieval_stats()["queue_depth"] == 1
+        waiting.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(*busy)
+
+    asyncio.run(main())
+    stats = executor.retrieval_stats()
+    assert (stats["queue_depth"], stats["running"], stats["completed"]) == (0, 0, 2)
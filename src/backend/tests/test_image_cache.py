@@ -0,0 +1,43 @@
+import os
+import numpy as np
+from routes.image_cache import ImageFeatureCache
+
+def test_copies_share_one_cached_vector(tmp_path):
+    (tmp_path / "a.png").write_bytes(b"cover")
+    (tmp_path / "copy.png").write_bytes(b"cover")
+    cache = ImageFeatureCache(2, 2, cache_dir=str(tmp_path / "cache"))
+
+    assert cache.get(str(tmp_path / "a.png")) is None
+    cache.put(str(tmp_path / "a.png"), [1, 2, 3, 4])
+    np.testing.assert_array_equal(cache.get(str(tmp_path / "copy.png")), [1, 2, 3, 4])
+    assert len([f for f in os.listdir(cache.cache_dir) if f.endswith(".npy")]) == 1
+
+def test_changed_file_misses(tmp_path):
+    path = tmp_path / "a.png"
+    path.write_bytes(b"cover")
+    cache = ImageFeatureCache(2, 2, cache_dir=str(tmp_path / "cache"))
+    cache.put(str(path), [1, 2, 3, 4])
+
+    path.write_bytes(b"new cover")
+    os.utime(path, (0, 12345))
+    assert cache.get(str(path)) is None
+
+def test_wrong_size_vectors_are_ignored(tmp_path):
+    (tmp_path / "a.png").write_bytes(b"cover")
+    ImageFeatureCache(2, 2, cache_dir=str(tmp_path / "cache")).put(str(tmp_path / "a.png"), [1, 2, 3])
+    assert ImageFeatureCache(2, 2, cache_dir=str(tmp_path / "cache")).get(str(tmp_path / "a.png")) is None
+
+def test_manifest_persists_and_evict_drops_unreferenced(tmp_path):
+    for name, content in (("a.png", b"A"), ("b.png", b"B"), ("copy.png", b"A")):
+        (tmp_path / name).write_bytes(content)
+    cache = ImageFeatureCache(2, 2, cache_dir=str(tmp_path / "cache"))
+    for name in ("a.png", "b.png", "copy.png"):
+        cache.put(str(tmp_path / name), [0, 0, 0, 0])
+    cache.save_manifest()
+
+    reloaded = ImageFeatureCache(2, 2, cache_dir=str(tmp_path / "cache"))
+    assert sorted(reloaded.manifest) == ["a.png", "b.png", "copy.png"]
+    # a.png's vector is still used by its copy
+    assert reloaded.evict(["copy.png"]) == 1
+    assert reloaded.get(str(tmp_path / "copy.png")) is not None
+    assert sorted(ImageFeatureCache(2, 2, cache_dir=str(tmp_path / "cache")).manifest) == ["copy.png"]
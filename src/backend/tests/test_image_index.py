@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+from routes.image_index import ImageIndex
+
+N_COMPONENTS = 5
+
+def low_rank_images(n, n_features=60, rank=N_COMPONENTS, noise=0.01, seed=0):
+    """Rows close to a rank-dimensional subspace, so the top components are well defined."""
+    rng = np.random.default_rng(seed)
+    basis = rng.standard_normal((rank, n_features))
+    weights = rng.standard_normal((n, rank)) * np.linspace(10, 3, rank)
+    return weights @ basis + 5 + noise * rng.standard_normal((n, n_features))
+
+def fit(names, images, n_components=N_COMPONENTS):
+    mean = images.mean(axis=0)
+    _, _, Vt = np.linalg.svd(images - mean, full_matrices=False)
+    components = Vt[:n_components]
+    return ImageIndex(names, mean, components, (images - mean) @ components.T, width=6, height=10)
+
+def names(n, start=0):
+    return [f"{i}.png" for i in range(start, start + n)]
+
+def test_save_and_load_round_trip(tmp_path):
+    images = low_rank_images(20)
+    index = fit(names(20), images)
+    path = str(tmp_path / "image_index.npz")
+    index.save(path)
+
+    loaded = ImageIndex.load(path)
+    assert loaded.names == index.names
+    assert (loaded.width, loaded.height) == (6, 10)
+    assert loaded.n_samples == 20
+    for attr in ("mean", "components", "projected", "singular_values"):
+        np.testing.assert_allclose(getattr(loaded, attr), getattr(index, attr))
+
+def subspace_cosines(a, b):
+    """Cosines of the principal angles between the row spaces of two orthonormal bases."""
+    return np.linalg.svd(a @ b.T, compute_uv=False)
+
+def test_partial_fit_matches_full_refit():
+    images = low_rank_images(120)
+    index = fit(names(80), images[:80]).partial_fit(names(40, start=80), images[80:], batch_size=16)
+    refit = fit(names(120), images)
+
+    assert index.names == refit.names
+    assert index.n_samples == 120
+    np.testing.assert_allclose(index.mean, refit.mean)
+    assert subspace_cosines(index.components, refit.components).min() > 0.999
+    np.testing.assert_allclose(index.singular_values, refit.singular_values, rtol=1e-3)
+    # Old rows were rotated into the new basis, new rows projected into it
+    np.testing.assert_allclose(index.projected @ index.components + index.mean, images, atol=0.1)
+
+def test_partial_fit_search_finds_new_rows():
+    images = low_rank_images(60)
+    index = fit(names(50), images[:50]).partial_fit(names(10, start=50), images[50:])
+
+    query = (images[55] - index.mean) @ index.components.T
+    indices, scores = index.search(query, 1)
+    assert index.names[indices[0, 0]] == "55.png"
+    assert scores[0, 0] == pytest.approx(1, abs=1e-6)
+
+def test_remove_keeps_basis_and_other_rows():
+    images = low_rank_images(10)
+    index = fit(names(10), images)
+    components, kept = index.components.copy(), index.projected[[0, 2, 4, 5, 6, 7, 8, 9]]
+    index.sq_norms  # cached before the removal
+
+    index.remove(["1.png", "3.png", "missing.png"])
+    assert index.names == [f"{i}.png" for i in (0, 2, 4, 5, 6, 7, 8, 9)]
+    np.testing.assert_array_equal(index.components, components)
+    np.testing.assert_array_equal(index.projected, kept)
+    np.testing.assert_allclose(index.sq_norms, (kept ** 2).sum(axis=1))
+
+def test_search_matches_brute_force():
+    images = low_rank_images(30)
+    index = fit(names(30), images)
+    queries = (low_rank_images(3, seed=1) - index.mean) @ index.components.T
+
+    indices, scores = index.search(queries, 4)
+    for query, row_indices, row_scores in zip(queries, indices, scores):
+        distances = np.array([np.linalg.norm(query - row) for row in index.projected])
+        np.testing.assert_array_equal(row_indices, np.argsort(distances)[:4])
+        np.testing.assert_allclose(row_scores, 1 - np.sort(distances)[:4] / distances.max())
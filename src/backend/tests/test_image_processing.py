@@ -0,0 +1,35 @@
+import numpy as np
+from PIL import Image
+from routes.image import (
+    PARALLEL_MIN_IMAGES, convert_grayscale, resize_image, flatten_image, load_image_vector, process_image_paths,
+)
+
+def album_covers(folder, count, size=(40, 30)):
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(count):
+        path = folder / f"{i}.{'png' if i % 2 else 'jpg'}"
+        Image.fromarray(rng.integers(0, 256, size=size + (3,), dtype=np.uint8)).save(path)
+        paths.append(str(path))
+    return paths
+
+def test_vector_matches_the_original_pipeline(tmp_path):
+    path = album_covers(tmp_path, 2)[1]  # a PNG, so decoding is lossless
+    original = flatten_image(resize_image(convert_grayscale(path), 12, 10))
+
+    vector = load_image_vector(path, 12, 10)
+    assert vector.dtype == np.uint8 and vector.shape == (120,)
+    # The original truncates the luma to uint8 where PIL rounds it
+    assert np.abs(vector.astype(int) - original.astype(int)).max() <= 2
+
+def test_parallel_decode_matches_serial(tmp_path):
+    paths = album_covers(tmp_path, PARALLEL_MIN_IMAGES + 4)
+    broken = tmp_path / "broken.png"
+    broken.write_bytes(b"not an image")
+    paths.insert(3, str(broken))
+
+    serial, serial_paths = process_image_paths(paths, 12, 10, workers=1, use_cache=False)
+    parallel, parallel_paths = process_image_paths(paths, 12, 10, workers=2, use_cache=False)
+
+    assert serial_paths == parallel_paths == paths[:3] + paths[4:]
+    np.testing.assert_array_equal(parallel, serial)
@@ -0,0 +1,253 @@
+import io
+import os
+import zipfile
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+from models import Base, MusicAudio, ContentHash
+from ingest import (
+    BulkIngestor, iter_zip_members, load_aliases, sync_content_hashes, is_partial_upload, remove_partial_uploads, scan_folder, reconcile_table,
+)
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+@pytest.fixture(params=[1, 1000], ids=["batch-1", "batch-1000"])
+def upload(request, db, tmp_path):
+    """upload({name: content, ...}) stores the files as one upload and returns the duplicate_of results."""
+    def upload(files):
+        ingestor = BulkIngestor(db, batch_size=request.param)
+        results = {
+            name: ingestor.store(MusicAudio, name, f"/music_audios/{name}", io.BytesIO(content), str(tmp_path / name))
+            for name, content in files.items()
+        }
+        ingestor.flush()
+        return results
+    return upload
+
+def on_disk(tmp_path):
+    return {name: (tmp_path / name).read_bytes() for name in sorted(os.listdir(tmp_path))}
+
+def rows(db):
+    return sorted(db.scalars(select(MusicAudio.name)))
+
+def canonical_names(db):
+    return sorted(db.scalars(select(ContentHash.name)))
+
+def assert_aliases_resolve(db, tmp_path):
+    for alias, canonical in load_aliases(db, MusicAudio).items():
+        assert (tmp_path / canonical).exists(), f"{alias} points at missing {canonical}"
+        assert canonical not in load_aliases(db, MusicAudio), f"{alias} points at alias {canonical}"
+
+def test_duplicate_becomes_alias(db, tmp_path, upload):
+    assert upload({"a.mid": b"X", "b.mid": b"X"}) == {"a.mid": None, "b.mid": "a.mid"}
+    assert on_disk(tmp_path) == {"a.mid": b"X"}
+    assert rows(db) == ["a.mid"]
+    assert load_aliases(db, MusicAudio) == {"b.mid": "a.mid"}
+
+def test_overwriting_canonical_promotes_alias(db, tmp_path, upload):
+    upload({"a.mid": b"X", "b.mid": b"X", "c.mid": b"X"})
+    assert upload({"a.mid": b"Y"}) == {"a.mid": None}
+
+    assert on_disk(tmp_path) == {"a.mid": b"Y", "b.mid": b"X"}
+    assert rows(db) == ["a.mid", "b.mid"]
+    assert canonical_names(db) == ["a.mid", "b.mid"]
+    assert load_aliases(db, MusicAudio) == {"c.mid": "b.mid"}
+
+def test_canonical_turned_alias_hands_content_over(db, tmp_path, upload):
+    upload({"a.mid": b"X", "c.mid": b"Z", "e.mid": b"Z"})
+    assert upload({"c.mid": b"X"}) == {"c.mid": "a.mid"}
+
+    assert on_disk(tmp_path) == {"a.mid": b"X", "e.mid": b"Z"}
+    assert rows(db) == ["a.mid", "e.mid"]
+    assert load_aliases(db, MusicAudio) == {"c.mid": "a.mid"}
+    assert_aliases_resolve(db, tmp_path)
+
+def test_no_alias_of_alias_within_one_upload(db, tmp_path, upload):
+    upload({"a.mid": b"X", "c.mid": b"Z", "e.mid": b"Z", "f.mid": b"Z"})
+    # c hands Z to e, then e hands it to f
+    upload({"c.mid": b"X", "e.mid": b"X"})
+
+    assert on_disk(tmp_path) == {"a.mid": b"X", "f.mid": b"Z"}
+    assert rows(db) == ["a.mid", "f.mid"]
+    assert load_aliases(db, MusicAudio) == {"c.mid": "a.mid", "e.mid": "a.mid"}
+    assert_aliases_resolve(db, tmp_path)
+
+def test_alias_uploaded_with_new_content_becomes_file(db, tmp_path, upload):
+    upload({"a.mid": b"X", "b.mid": b"X"})
+    assert upload({"b.mid": b"Y"}) == {"b.mid": None}
+
+    assert on_disk(tmp_path) == {"a.mid": b"X", "b.mid": b"Y"}
+    assert rows(db) == ["a.mid", "b.mid"]
+    assert load_aliases(db, MusicAudio) == {}
+
+def sync(db, tmp_path, changed=()):
+    names = os.listdir(tmp_path)
+    sync_content_hashes(db, MusicAudio, str(tmp_path), names, set(changed))
+    db.commit()
+
+def test_sync_moves_aliases_to_remaining_copy(db, tmp_path, upload):
+    upload({"a.mid": b"X", "b.mid": b"X"})
+    os.rename(tmp_path / "a.mid", tmp_path / "moved.mid")
+    sync(db, tmp_path)
+
+    assert canonical_names(db) == ["moved.mid"]
+    assert load_aliases(db, MusicAudio) == {"b.mid": "moved.mid"}
+
+def test_sync_keeps_aliases_of_changed_file(db, tmp_path, upload):
+    upload({"a.mid": b"X", "b.mid": b"X"})
+    (tmp_path / "a.mid").write_bytes(b"Y")
+    sync(db, tmp_path, changed=["a.mid"])
+
+    assert canonical_names(db) == ["a.mid"]
+    assert load_aliases(db, MusicAudio) == {"b.mid": "a.mid"}
+
+def test_sync_moves_aliases_of_changed_file_to_copy(db, tmp_path, upload):
+    upload({"a.mid": b"X", "b.mid": b"X"})
+    (tmp_path / "copy.mid").write_bytes(b"X")
+    (tmp_path / "a.mid").write_bytes(b"Y")
+    sync(db, tmp_path, changed=["a.mid"])
+
+    assert load_aliases(db, MusicAudio) == {"b.mid": "copy.mid"}
+    assert_aliases_resolve(db, tmp_path)
+
+def test_sync_drops_aliases_of_vanished_content(db, tmp_path, upload):
+    upload({"a.mid": b"X", "b.mid": b"X", "c.mid": b"Z"})
+    os.remove(tmp_path / "a.mid")
+    sync(db, tmp_path)
+
+    assert canonical_names(db) == ["c.mid"]
+    assert load_aliases(db, MusicAudio) == {}
+
+def test_sync_alias_name_now_a_file(db, tmp_path, upload):
+    upload({"a.mid": b"X", "b.mid": b"X"})
+    (tmp_path / "b.mid").write_bytes(b"B")
+    sync(db, tmp_path)
+
+    assert load_aliases(db, MusicAudio) == {}
+    assert canonical_names(db) == ["a.mid", "b.mid"]
+
+def test_rows_are_upserted_by_name(db):
+    first = BulkIngestor(db)
+    first.add(MusicAudio, "a.mid", "/old/a.mid")
+    first.flush()
+    row_id = db.scalar(select(MusicAudio.id))
+
+    # A second ingestor (another worker) writing the same name updates the row in place
+    second = BulkIngestor(db)
+    second.add(MusicAudio, "a.mid", "/music_audios/a.mid")
+    second.flush()
+
+    assert db.execute(select(MusicAudio.id, MusicAudio.path)).all() == [(row_id, "/music_audios/a.mid")]
+
+def test_failed_write_leaves_no_partial_file(db, tmp_path):
+    class Broken(io.BytesIO):
+        def read(self, size=-1):
+            raise OSError("connection reset")
+
+    ingestor = BulkIngestor(db)
+    with pytest.raises(OSError):
+        ingestor.store(MusicAudio, "a.mid", "/music_audios/a.mid", Broken(), str(tmp_path / "a.mid"))
+    assert os.listdir(tmp_path) == []
+
+def test_leftover_partial_uploads_are_skipped_and_removed(tmp_path):
+    (tmp_path / "a.mid").write_bytes(b"X")
+    (tmp_path / ".a.mid.x1y2.part").write_bytes(b"X")
+    assert not is_partial_upload("a.mid")
+    assert is_partial_upload(".a.mid.x1y2.part")
+
+    assert remove_partial_uploads(str(tmp_path)) == 0  # may still be written by another worker
+    assert remove_partial_uploads(str(tmp_path), max_age=-1) == 1
+    assert os.listdir(tmp_path) == ["a.mid"]
+
+def reconcile(db, tmp_path, indexed_names=frozenset()):
+    files = scan_folder(str(tmp_path), lambda name: name.endswith(".mid"))
+    changed, removed = reconcile_table(db, MusicAudio, files, "/music_audios", indexed_names)
+    db.commit()
+    return sorted(changed), sorted(removed)
+
+def row_ids(db):
+    return dict(db.execute(select(MusicAudio.name, MusicAudio.id)).all())
+
+def test_reconcile_only_touches_what_changed(db, tmp_path):
+    for name in ("a.mid", "b.mid", "c.mid", "notes.txt"):
+        (tmp_path / name).write_bytes(b"X")
+    (tmp_path / ".d.mid.x1y2.part").write_bytes(b"X")
+    assert reconcile(db, tmp_path) == (["a.mid", "b.mid", "c.mid"], [])
+    ids = row_ids(db)
+
+    (tmp_path / "b.mid").write_bytes(b"changed")
+    os.remove(tmp_path / "c.mid")
+    (tmp_path / "e.mid").write_bytes(b"X")
+    assert reconcile(db, tmp_path) == (["b.mid", "e.mid"], ["c.mid"])
+
+    assert rows(db) == ["a.mid", "b.mid", "e.mid"]
+    assert {name: row_ids(db)[name] for name in ("a.mid", "b.mid")} == {"a.mid": ids["a.mid"], "b.mid": ids["b.mid"]}
+    assert db.scalar(select(MusicAudio.size).where(MusicAudio.name == "b.mid")) == len(b"changed")
+    assert reconcile(db, tmp_path) == ([], [])
+
+def test_reconcile_fills_missing_stats_without_reindexing(db, tmp_path):
+    (tmp_path / "a.mid").write_bytes(b"X")
+    # Rows from before the size/mtime columns existed
+    db.add(MusicAudio(name="a.mid", path="/music_audios/a.mid"))
+    db.commit()
+    row_id = db.scalar(select(MusicAudio.id))
+
+    assert reconcile(db, tmp_path) == ([], [])
+    assert db.execute(select(MusicAudio.id, MusicAudio.size)).all() == [(row_id, 1)]
+
+def test_reconcile_skips_files_the_indexes_already_have(db, tmp_path):
+    (tmp_path / "a.mid").write_bytes(b"X")
+    (tmp_path / "b.mid").write_bytes(b"Y")
+    # A lost database must not re-index the whole catalogue
+    assert reconcile(db, tmp_path, indexed_names={"a.mid"}) == (["b.mid"], [])
+    assert rows(db) == ["a.mid", "b.mid"]
+
+def test_each_full_batch_is_committed(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    Base.metadata.create_all(engine)
+    writer, reader = sessionmaker(bind=engine)(), sessionmaker(bind=engine)()
+    ingestor = BulkIngestor(writer, batch_size=2)
+
+    seen = []
+    for name in ("a.mid", "b.mid", "c.mid", "d.mid", "e.mid"):
+        ingestor.add(MusicAudio, name, f"/music_audios/{name}")
+        # Another connection sees every batch as soon as it is full
+        seen.append(len(reader.scalars(select(MusicAudio.name)).all()))
+    assert seen == [0, 2, 2, 4, 4]
+    assert ingestor.committed[MusicAudio] == {"a.mid", "b.mid", "c.mid", "d.mid"}
+
+    ingestor.flush()
+    assert sorted(reader.scalars(select(MusicAudio.name))) == ["a.mid", "b.mid", "c.mid", "d.mid", "e.mid"]
+    assert ingestor.rows_written == 5
+    writer.close()
+    reader.close()
+    engine.dispose()
+
+def test_zip_members_stream_into_the_folder(db, tmp_path):
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zip_ref:
+        zip_ref.writestr("songs/", "")
+        zip_ref.writestr("songs/a.MID", b"X")
+        zip_ref.writestr("../../escape.mid", b"Y")
+        zip_ref.writestr("songs\\b.mid", b"X")
+        zip_ref.writestr("readme.txt", b"text")
+
+    ingestor = BulkIngestor(db)
+    with zipfile.ZipFile(archive) as zip_ref:
+        members = list(iter_zip_members(zip_ref, (".mid", ".midi")))
+        assert [name for _, name in members] == ["a.MID", "escape.mid", "b.mid"]
+        # Only base names are used, so "../" entries stay inside the folder
+        for info, name in members:
+            with zip_ref.open(info) as source:
+                ingestor.store(MusicAudio, name, f"/music_audios/{name}", source, str(tmp_path / name))
+    ingestor.flush()
+
+    assert on_disk(tmp_path) == {"a.MID": b"X", "escape.mid": b"Y"}
+    assert load_aliases(db, MusicAudio) == {"b.mid": "a.MID"}
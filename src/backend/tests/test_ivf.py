@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+from routes.image_index import ImageIndex
+from routes.ivf import IVFIndex
+
+def clustered_index(n=400, n_features=16, n_clusters=20, seed=0):
+    """ImageIndex whose projected rows form well separated clusters."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((n_clusters, n_features)) * 10
+    projected = centers[rng.integers(n_clusters, size=n)] + rng.standard_normal((n, n_features))
+    names = [f"{i}.png" for i in range(n)]
+    return ImageIndex(names, np.zeros(n_features), np.eye(n_features), projected, width=4, height=4)
+
+def test_max_distances_match_brute_force():
+    index = clustered_index()
+    queries = np.random.default_rng(1).standard_normal((5, 16)) * 10
+    expected = np.linalg.norm(queries[:, None, :] - index.projected[None, :, :], axis=2).max(axis=1)
+
+    np.testing.assert_allclose(index.max_distances(queries, block_size=16)[:, 0], expected)
+    np.testing.assert_allclose(index.max_distances(queries, block_size=1000)[:, 0], expected)
+
+def test_probing_every_cell_is_exact():
+    index = clustered_index()
+    ivf = IVFIndex.build(index)
+    assert ivf.n_cells == 20
+    assert sorted(ivf.rows.tolist()) == list(range(len(index)))
+
+    for query in index.projected[::40]:
+        exact_indices, exact_scores = index.search(query, 10)
+        indices, scores = ivf.search(index, query, 10, nprobe=ivf.n_cells)
+        np.testing.assert_array_equal(indices, exact_indices)
+        np.testing.assert_allclose(scores, exact_scores)
+
+def test_recall_with_few_probes():
+    index = clustered_index()
+    ivf = IVFIndex.build(index)
+
+    found = 0
+    for query in index.projected:
+        exact = set(index.search(query, 5)[0][0].tolist())
+        found += len(exact & set(ivf.search(index, query, 5, nprobe=2)[0][0].tolist()))
+    assert found / (5 * len(index)) > 0.95
+
+def test_follow_keeps_cells_and_places_new_rows():
+    grown = clustered_index(n=450)
+    index = ImageIndex(grown.names[:400], grown.mean, grown.components, grown.projected[:400], width=4, height=4)
+    ivf = IVFIndex.build(index)
+    grown.remove([f"{i}.png" for i in range(10)])
+
+    followed = ivf.follow(grown)
+    assert followed.matches(grown)
+    assert followed.n_assigned == 50
+    # Rows that shared a cell still do, and no two cells were merged
+    old_label = dict(zip(ivf.names, ivf.labels.tolist()))
+    cells = {(old_label[name], label) for name, label in zip(grown.names, followed.labels.tolist()) if name in old_label}
+    assert len(cells) == len({old for old, _ in cells}) == len({new for _, new in cells})
+
+    for query in grown.projected[-50:]:
+        exact_indices, _ = grown.search(query, 5)
+        indices, _ = followed.search(grown, query, 5, nprobe=2)
+        assert set(indices[0].tolist()) == set(exact_indices[0].tolist())
+
+def test_save_and_load(tmp_path):
+    index = clustered_index()
+    ivf = IVFIndex.build(index)
+    path = str(tmp_path / "image_ivf.npz")
+    ivf.save(path)
+
+    loaded = IVFIndex.load(path)
+    assert loaded.matches(index)
+    np.testing.assert_array_equal(loaded.labels, ivf.labels)
+    np.testing.assert_array_equal(loaded.centroids, ivf.centroids)
+
+@pytest.mark.parametrize("n_assigned, needs_recluster", [(0, False), (100, False), (101, True)])
+def test_needs_recluster(n_assigned, needs_recluster):
+    ivf = IVFIndex.build(clustered_index())
+    ivf.n_assigned = n_assigned
+    assert ivf.needs_recluster(fraction=0.25) == needs_recluster
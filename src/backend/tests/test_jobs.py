@@ -0,0 +1,146 @@
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+
+pytest.importorskip("basic_pitch")
+pytest.importorskip("sounddevice")
+
+from fastapi import HTTPException
+from routes.mic import jobs
+from routes.mic.jobs import QUEUED, RECORDING, CONVERTING, DONE, FAILED, CANCELLED
+
+def eventually(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+def wait_until_finished(job):
+    eventually(lambda: job.status in jobs.FINISHED)
+    return job
+
+class FakeDevices:
+    """Microphone and converter stand-ins that record the job status they saw."""
+
+    def __init__(self, tmp_path):
+        self.tmp_path = tmp_path
+        self.seen = []
+        self.record_error = None
+        self.convert_error = None
+        self.recorded = True
+        self.recording_started = threading.Event()
+        self.release_recording = threading.Event()
+        self.release_recording.set()
+        self.release_conversion = threading.Event()
+        self.release_conversion.set()
+
+    def record_wav(self, path, duration, cancel_event):
+        job = next(job for job in jobs._jobs.values() if job.wav_path == path)
+        self.seen.append(job.status)
+        self.recording_started.set()
+        self.release_recording.wait(5)
+        if self.record_error:
+            raise self.record_error
+        return path if self.recorded and not cancel_event.is_set() else None
+
+    def wav_to_midi(self, wav_path, output_dir):
+        job = next(job for job in jobs._jobs.values() if job.wav_path == wav_path)
+        self.seen.append(job.status)
+        self.release_conversion.wait(5)
+        if self.convert_error:
+            raise self.convert_error
+        midi_path = self.tmp_path / f"{job.id}.mid"
+        midi_path.write_bytes(b"MThd")
+        return str(midi_path)
+
+@pytest.fixture
+def devices(monkeypatch, tmp_path):
+    devices = FakeDevices(tmp_path)
+    conversion_executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(jobs, "_jobs", OrderedDict())
+    monkeypatch.setattr(jobs, "_executor", None)
+    monkeypatch.setattr(jobs, "INPUT_DIR", str(tmp_path))
+    monkeypatch.setattr(jobs, "record_wav", devices.record_wav)
+    monkeypatch.setattr(jobs, "wav_to_midi", devices.wav_to_midi)
+    monkeypatch.setattr(jobs, "get_conversion_executor", lambda: conversion_executor)
+    yield devices
+    devices.release_recording.set()
+    devices.release_conversion.set()
+    jobs.shutdown_job_executor()
+    conversion_executor.shutdown(wait=True)
+
+def test_job_records_then_converts(devices):
+    job = jobs.submit_recording_job(duration=1)
+    wait_until_finished(job)
+
+    assert devices.seen == [RECORDING, CONVERTING]
+    assert job.status == DONE and job.error is None
+    assert job.to_dict()["midi_file"] == f"{job.id}.mid"
+    assert jobs.latest_finished_job() is job
+
+def test_recording_interrupted_by_the_device(devices):
+    devices.recorded = False
+    assert wait_until_finished(jobs.submit_recording_job(duration=1)).status == CANCELLED
+    assert devices.seen == [RECORDING]
+
+@pytest.mark.parametrize("stage", ["record", "convert"])
+def test_errors_fail_the_job(devices, stage):
+    setattr(devices, f"{stage}_error", RuntimeError("device busy"))
+    job = wait_until_finished(jobs.submit_recording_job(duration=1))
+
+    assert (job.status, job.error) == (FAILED, "device busy")
+    assert jobs.latest_finished_job() is None
+
+def test_cancel_while_recording(devices):
+    devices.release_recording.clear()
+    job = jobs.submit_recording_job(duration=1)
+    assert devices.recording_started.wait(5)
+
+    jobs.cancel_job(job.id)
+    devices.release_recording.set()
+    assert wait_until_finished(job).status == CANCELLED
+    assert devices.seen == [RECORDING]
+
+def test_cancel_while_converting_discards_the_output(devices):
+    devices.release_conversion.clear()
+    job = jobs.submit_recording_job(duration=1)
+    eventually(lambda: job.status == CONVERTING)
+
+    jobs.cancel_job(job.id)
+    assert job.status == CONVERTING  # conversion can't be interrupted
+    devices.release_conversion.set()
+
+    assert wait_until_finished(job).status == CANCELLED
+    assert not any(devices.tmp_path.glob("*.mid"))
+
+def test_cancel_before_start_and_pending_limit(devices, monkeypatch):
+    monkeypatch.setattr(jobs, "RECORDING_MAX_PENDING", 2)
+    devices.release_recording.clear()
+    running = jobs.submit_recording_job(duration=1)
+    assert devices.recording_started.wait(5)
+    waiting = [jobs.submit_recording_job(duration=1) for _ in range(2)]
+    assert [job.status for job in waiting] == [QUEUED, QUEUED]
+
+    with pytest.raises(HTTPException) as error:
+        jobs.submit_recording_job(duration=1)
+    assert error.value.status_code == 429
+
+    assert jobs.cancel_job(waiting[0].id).status == CANCELLED
+    devices.release_recording.set()
+    assert wait_until_finished(running).status == DONE
+    assert wait_until_finished(waiting[1]).status == DONE
+    assert devices.seen.count(RECORDING) == 2
+
+def test_history_keeps_the_latest_finished_jobs(devices, monkeypatch):
+    monkeypatch.setattr(jobs, "RECORDING_JOB_HISTORY", 2)
+    finished = [wait_until_finished(jobs.submit_recording_job(duration=1)) for _ in range(4)]
+    # Pruning runs right after the last status change
+    eventually(lambda: len(jobs._jobs) == 2)
+
+    assert list(jobs._jobs) == [job.id for job in finished[2:]]
+    with pytest.raises(HTTPException) as error:
+        jobs.get_job(finished[0].id)
+    assert error.value.status_code == 404
+    assert sorted(path.name for path in devices.tmp_path.glob("*.mid")) == sorted(f"{job.id}.mid" for job in finished[2:])
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+from routes.audio_index import FEATURE_DIM
+from routes.lsh import LSHIndex, LSH_SEED
+
+def vectors(count, seed=0):
+    return np.random.default_rng(seed).standard_normal((count, FEATURE_DIM)).astype(np.float32)
+
+def names(count, start=0):
+    return [f"{i}.mid" for i in range(start, start + count)]
+
+def empty_index(n_tables=8, n_bits=10, seed=LSH_SEED):
+    return LSHIndex([], np.zeros((0, n_tables)), n_tables=n_tables, n_bits=n_bits, seed=seed)
+
+def bucket_rows(index):
+    """Every table's buckets as {code: sorted rows}, for comparing two indexes."""
+    return [{code: sorted(rows.tolist()) for code, rows in bucket.items()} for bucket in index.buckets]
+
+def test_vector_is_candidate_of_itself_and_near_copies():
+    data = vectors(50)
+    index = empty_index().insert(names(50), data)
+
+    for row in (0, 17, 49):
+        assert row in index.candidates(data[row], multiprobe=False)
+    near = data[17] + 0.01 * vectors(1, seed=1)[0]
+    assert 17 in index.candidates(near)
+
+def test_insert_and_remove_match_a_fresh_build():
+    data = vectors(30)
+    index = empty_index().insert(names(20), data[:20]).insert(names(10, start=20), data[20:])
+    index.remove(["3.mid", "25.mid"])
+    # Re-inserting a name replaces its row
+    index.insert(["7.mid"], data[7:8] * -1)
+
+    kept = [i for i in range(30) if i not in (3, 7, 25)]
+    expected = empty_index().insert([f"{i}.mid" for i in kept] + ["7.mid"], np.vstack([data[kept], -data[7:8]]))
+    assert index.names == expected.names
+    np.testing.assert_array_equal(index.codes, expected.codes)
+    assert bucket_rows(index) == bucket_rows(expected)
+
+def test_save_and_load_keep_hyperplanes(tmp_path):
+    data = vectors(20)
+    index = empty_index(seed=7).insert(names(20), data)
+    path = str(tmp_path / "audio_lsh.npz")
+    index.save(path)
+
+    loaded = LSHIndex.load(path)
+    assert not loaded.planes_from_seed
+    assert (loaded.n_tables, loaded.n_bits, loaded.seed) == (8, 10, 7)
+    np.testing.assert_array_equal(loaded.hyperplanes, index.hyperplanes)
+    np.testing.assert_array_equal(loaded.hash(data), index.codes)
+    assert bucket_rows(loaded) == bucket_rows(index)
+
+def test_files_without_hyperplanes_are_flagged(tmp_path):
+    index = empty_index().insert(names(5), vectors(5))
+    path = str(tmp_path / "audio_lsh.npz")
+    np.savez(path, names=np.array(index.names), codes=index.codes, params=np.array([8, 10, index.seed]))
+
+    assert LSHIndex.load(path).planes_from_seed
+
+def test_n_bits_must_fit_in_a_code():
+    with pytest.raises(ValueError):
+        empty_index(n_bits=64)
@@ -0,0 +1,84 @@
+import os
+import pytest
+from mido import MidiFile, MidiTrack, Message, MetaMessage
+from routes.midi_scan import MidiScanError, scan_note_ons, read_note_ons
+
+MUSIC_AUDIOS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app", "music_audios")
+
+def mido_note_ons(path, channel=0):
+    """The mido loop scan_note_ons replaced."""
+    notes = []
+    current_time = 0
+    for track in MidiFile(path).tracks:
+        for msg in track:
+            current_time += msg.time
+            if isinstance(msg, Message) and msg.type == 'note_on' and msg.velocity > 0 and msg.channel == channel:
+                notes.append((current_time, msg.note))
+    return notes
+
+def fixture_midis(count=3):
+    names = sorted(name for name in os.listdir(MUSIC_AUDIOS) if name.endswith('.mid'))
+    return [os.path.join(MUSIC_AUDIOS, name) for name in names[:count]]
+
+@pytest.mark.parametrize("path", fixture_midis(), ids=os.path.basename)
+def test_matches_mido_on_catalogue_files(path):
+    assert read_note_ons(path, max_notes=10 ** 6) == mido_note_ons(path)
+
+def test_matches_mido_with_mixed_events(tmp_path):
+    first, second = MidiTrack(), MidiTrack()
+    first.extend([
+        MetaMessage('set_tempo', tempo=500000, time=0),
+        Message('program_change', program=5, time=0),
+        Message('note_on', note=60, velocity=80, time=10),
+        # mido writes these with running status
+        Message('note_on', note=60, velocity=0, time=5),
+        Message('note_on', note=62, velocity=80, time=5),
+        Message('note_on', note=64, velocity=90, channel=1, time=3),
+        Message('sysex', data=[1, 2, 3], time=2),
+        Message('pitchwheel', pitch=100, time=1),
+        Message('note_on', note=65, velocity=70, time=4),
+        Message('note_off', note=65, velocity=0, time=4),
+        MetaMessage('marker', text='chorus', time=0),
+        Message('note_on', note=67, velocity=70, time=6),
+    ])
+    second.extend([
+        Message('note_on', note=48, velocity=50, time=7),
+        Message('aftertouch', value=30, time=1),
+        Message('note_on', note=50, velocity=50, time=2),
+    ])
+    path = str(tmp_path / "mixed.mid")
+    midi = MidiFile()
+    midi.tracks.extend([first, second])
+    midi.save(path)
+
+    notes = read_note_ons(path)
+    assert notes == mido_note_ons(path)
+    assert [pitch for _, pitch in notes] == [60, 62, 65, 67, 48, 50]
+    assert read_note_ons(path, channel=1) == mido_note_ons(path, channel=1) == [(23, 64)]
+
+def midi_bytes(*tracks):
+    header = b'MThd' + (6).to_bytes(4, 'big') + bytes([0, 1, 0, len(tracks), 0, 96])
+    return header + b''.join(b'MTrk' + len(track).to_bytes(4, 'big') + track for track in tracks)
+
+def test_running_status_and_zero_velocity():
+    track = bytes([
+        0x00, 0x90, 60, 100,  # note_on
+        0x10, 62, 100,  # running status note_on
+        0x10, 60, 0,  # running status note_on with velocity 0 (a note_off)
+        0x10, 64, 1,
+        0x00, 0xFF, 0x2F, 0x00,
+    ])
+    assert scan_note_ons(midi_bytes(track)) == [(0, 60), (16, 62), (48, 64)]
+
+def test_max_notes():
+    track = bytes([0x00, 0x90, 60, 100] + [0x01, 61, 100] * 10)
+    assert scan_note_ons(midi_bytes(track), max_notes=3) == [(0, 60), (1, 61), (2, 61)]
+
+@pytest.mark.parametrize("data", [
+    b'RIFF0000WAVE',
+    midi_bytes(bytes([0x00, 0x90, 60])),  # cut inside a message
+    midi_bytes(bytes([0x00, 60, 100])),  # running status with nothing to run on
+])
+def test_invalid_data(data):
+    with pytest.raises(MidiScanError):
+        scan_note_ons(data)
@@ -0,0 +1,66 @@
+import numpy as np
+from routes.ngram_index import NgramIndex, interval_ngrams
+
+def melodies(count, length=40, seed=0):
+    rng = np.random.default_rng(seed)
+    # Few distinct steps so songs share grams and posting lists have many entries
+    return {f"{i}.mid": 60 + np.cumsum(rng.integers(-2, 3, size=length)) % 24 for i in range(count)}
+
+def assert_same_index(index, expected):
+    assert index.names == expected.names
+    for attr in ("keys", "starts", "posting_song", "posting_offset", "pitches", "pitch_starts"):
+        np.testing.assert_array_equal(getattr(index, attr), getattr(expected, attr), err_msg=attr)
+
+def test_interval_ngrams_ignore_transposition():
+    melody = [60, 62, 64, 65, 67, 65]
+    assert len(interval_ngrams(melody, n=4)) == 2
+    np.testing.assert_array_equal(interval_ngrams(melody, n=4), interval_ngrams(np.add(melody, 5), n=4))
+    assert len(interval_ngrams(melody[:4], n=4)) == 0
+
+def test_incremental_add_matches_one_build():
+    songs = melodies(12)
+    names, pitches = list(songs), list(songs.values())
+    index = NgramIndex.empty()
+    for start in range(0, 12, 5):
+        index.add(names[start:start + 5], pitches[start:start + 5])
+
+    assert_same_index(index, NgramIndex.empty().add(names, pitches))
+
+def test_remove_matches_build_without_removed():
+    songs = melodies(10)
+    index = NgramIndex.empty().add(list(songs), list(songs.values()))
+    index.remove(["2.mid", "7.mid", "missing.mid"])
+
+    kept = {name: pitches for name, pitches in songs.items() if name not in ("2.mid", "7.mid")}
+    assert_same_index(index, NgramIndex.empty().add(list(kept), list(kept.values())))
+
+def test_re_adding_a_song_replaces_it():
+    songs = melodies(4)
+    index = NgramIndex.empty().add(list(songs), list(songs.values()))
+    changed = melodies(1, seed=1)["0.mid"]
+    index.add(["1.mid"], [changed])
+
+    rebuilt = {"0.mid": songs["0.mid"], "2.mid": songs["2.mid"], "3.mid": songs["3.mid"], "1.mid": changed}
+    assert_same_index(index, NgramIndex.empty().add(list(rebuilt), list(rebuilt.values())))
+    np.testing.assert_array_equal(index.pitch_sequence("1.mid"), changed)
+
+def test_candidates_find_transposed_excerpt():
+    songs = melodies(20)
+    index = NgramIndex.empty().add(list(songs), list(songs.values()))
+    query = songs["13.mid"][10:22] - 3
+
+    order, scores = index.candidates(query, limit=5)
+    assert index.names[order[0]] == "13.mid"
+    assert list(scores) == sorted(scores, reverse=True)
+
+def test_pitch_sequence(tmp_path):
+    songs = melodies(3)
+    index = NgramIndex.empty().add(list(songs), list(songs.values()))
+    path = str(tmp_path / "ngram_index.npz")
+    index.save(path)
+    loaded = NgramIndex.load(path)
+
+    np.testing.assert_array_equal(loaded.pitch_sequence("1.mid"), songs["1.mid"])
+    assert loaded.pitch_sequence("missing.mid") is None
+    loaded.remove(["0.mid"])
+    np.testing.assert_array_equal(loaded.pitch_sequence("2.mid"), songs["2.mid"])
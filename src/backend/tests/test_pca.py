@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+from routes.pca import PCA_SOLVERS, choose_solver, truncated_svd, reconstruction_error
+
+def centered(n_samples, n_features, n_strong=8, seed=0):
+    """A few strong directions over a weak noise floor, in a random basis."""
+    rng = np.random.default_rng(seed)
+    spectrum = np.concatenate([np.geomspace(100, 20, n_strong), np.full(n_features - n_strong, 0.5)])
+    basis, _ = np.linalg.qr(rng.standard_normal((n_features, n_features)))
+    X = (rng.standard_normal((n_samples, n_features)) * spectrum) @ basis.T
+    return X - X.mean(axis=0)
+
+@pytest.mark.parametrize("shape, n_components, solver", [
+    ((40, 4000), 10, "gram"),  # N << D
+    ((5000, 4000), 10, "randomized"),  # too many samples for the Gram matrix
+    ((500, 600), 10, "randomized"),
+    ((40, 4000), 30, "full"),  # most of the rank requested
+    ((20, 30), 12, "full"),
+])
+def test_choose_solver(shape, n_components, solver):
+    assert choose_solver(*shape, n_components) == solver
+
+@pytest.mark.parametrize("solver", PCA_SOLVERS)
+def test_solvers_match_exact_svd(solver):
+    X = centered(60, 300)
+    components, singular_values = truncated_svd(X, 8, solver=solver)
+    _, S, Vt = np.linalg.svd(X, full_matrices=False)
+
+    assert components.shape == (8, 300)
+    np.testing.assert_allclose(components @ components.T, np.eye(8), atol=1e-6)
+    np.testing.assert_allclose(singular_values, S[:8], rtol=1e-4)
+    # Same subspace: every principal angle with the exact components is ~0
+    np.testing.assert_allclose(np.linalg.svd(components @ Vt[:8].T, compute_uv=False), 1, atol=1e-4)
+    assert reconstruction_error(X, components) == pytest.approx(reconstruction_error(X, Vt[:8]), rel=1e-4)
+
+def test_gram_drops_null_directions():
+    # 5 samples centered to rank 4: the fifth direction has no right singular vector
+    X = centered(5, 50)
+    components, singular_values = truncated_svd(X, 5, solver="gram")
+    assert len(components) == len(singular_values) == 4
+    assert np.isfinite(components).all()
+
+def test_unknown_solver():
+    with pytest.raises(ValueError, match="Unknown PCA solver"):
+        truncated_svd(centered(5, 10), 2, solver="qr")
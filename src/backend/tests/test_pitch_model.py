@@ -0,0 +1,45 @@
+import threading
+import time
+import pytest
+
+pytest.importorskip("basic_pitch")
+
+from routes.mic import pitch_model
+
+class FakeModel:
+    loads = 0
+
+    def __init__(self, path):
+        time.sleep(0.05)  # long enough for every caller to race for the first load
+        FakeModel.loads += 1
+        self.path = path
+        self.batches = []
+
+    def predict(self, batch):
+        self.batches.append(batch.shape)
+
+def test_model_is_loaded_once_per_process(monkeypatch):
+    FakeModel.loads = 0
+    monkeypatch.setattr(pitch_model, "Model", FakeModel)
+    monkeypatch.setattr(pitch_model, "_model", None)
+
+    models = []
+    threads = [threading.Thread(target=lambda: models.append(pitch_model.get_basic_pitch_model())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert FakeModel.loads == 1
+    assert all(model is models[0] for model in models)
+    assert models[0].path == pitch_model.BASIC_PITCH_MODEL_PATH
+
+def test_warm_up_runs_one_silent_window(monkeypatch):
+    FakeModel.loads = 0
+    monkeypatch.setattr(pitch_model, "Model", FakeModel)
+    monkeypatch.setattr(pitch_model, "_model", None)
+
+    model = pitch_model.warm_basic_pitch_model()
+    assert pitch_model.get_basic_pitch_model() is model
+    assert model.batches == [(1, pitch_model.AUDIO_N_SAMPLES, 1)]
+    assert FakeModel.loads == 1
@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+from routes.similarity import squared_euclidean_distances, top_k_indices
+
+@pytest.mark.parametrize("k", [0, 1, 5, 20, 25])
+@pytest.mark.parametrize("largest", [True, False])
+def test_top_k_indices_matches_full_sort(k, largest):
+    # Integer scores so there are ties at the cut
+    scores = np.random.default_rng(0).integers(0, 6, size=(4, 20)).astype(float)
+    expected = np.argsort(-scores if largest else scores, axis=1, kind='stable')[:, :k]
+
+    indices = top_k_indices(scores, k, largest=largest)
+    assert indices.shape == (4, min(k, 20))
+    # argpartition may pick a different member of a tie at the cut, so compare the scores
+    np.testing.assert_array_equal(np.take_along_axis(scores, indices, axis=1),
+                                  np.take_along_axis(scores, expected, axis=1))
+
+def test_top_k_indices_one_row():
+    assert top_k_indices(np.array([0.2, 0.9, 0.5]), 2).tolist() == [[1, 2]]
+
+def test_squared_euclidean_distances():
+    rng = np.random.default_rng(0)
+    queries, data = rng.standard_normal((3, 8)), rng.standard_normal((10, 8))
+    expected = ((queries[:, None, :] - data[None, :, :]) ** 2).sum(axis=2)
+
+    np.testing.assert_allclose(squared_euclidean_distances(queries, data), expected)
+    # A row identical to the query must not come out slightly negative
+    assert squared_euclidean_distances(data[4] * 1e4, data * 1e4)[0, 4] == 0
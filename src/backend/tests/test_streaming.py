@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("basic_pitch")
+pytest.importorskip("librosa")
+
+from routes.mic import streaming
+from routes.mic.streaming import StreamingRecognizer
+from routes.mic.transcribe import seconds_to_ticks
+
+SAMPLE_RATE = 100
+NOTE_SAMPLES = 10  # shorter than half the overlap, so some chunk always sees a note whole
+
+def fake_notes_from_buffer(audio, sample_rate, start_time=0.0):
+    """Stand-in transcriber: a note is a run of its pitch, reported only once the run has ended.
+
+    Runs cut by the end of the buffer are missed, like a note Basic Pitch
+    hears only the start of; runs cut by the start are still reported.
+    """
+    notes = []
+    for i in np.flatnonzero(audio):
+        if (i == 0 or audio[i - 1] == 0) and (audio[i:] == 0).any():
+            notes.append((seconds_to_ticks(start_time + i / sample_rate), int(audio[i])))
+    return notes
+
+def stream(n_samples, note_every=15):
+    audio = np.zeros(n_samples, dtype=np.float32)
+    notes = []
+    for n, start in enumerate(range(5, n_samples - NOTE_SAMPLES - 1, note_every)):
+        pitch = 60 + n % 12
+        audio[start:start + NOTE_SAMPLES] = pitch
+        notes.append((seconds_to_ticks(start / SAMPLE_RATE), pitch))
+    return audio, notes
+
+@pytest.fixture
+def searches(monkeypatch):
+    """Calls made to the catalogue search; every search ranks a.mid clearly first."""
+    calls = []
+
+    def search_audio(notes, audio_folder, n, mode, rerank):
+        calls.append(list(notes))
+        return ["a.mid", "b.mid"], [0.9, 0.5]
+
+    monkeypatch.setattr(streaming, "notes_from_buffer", fake_notes_from_buffer)
+    monkeypatch.setattr(streaming, "search_audio", search_audio)
+    return calls
+
+@pytest.mark.parametrize("feed_size", [1000, 200, 37, 7])
+def test_every_note_is_kept_once_across_chunk_overlaps(searches, feed_size):
+    audio, expected = stream(1000)
+    recognizer = StreamingRecognizer("unused", SAMPLE_RATE, chunk_seconds=2.0, overlap_seconds=0.5)
+
+    results = []
+    for start in range(0, len(audio), feed_size):
+        results.extend(recognizer.feed(audio[start:start + feed_size]))
+    assert len(results) == 5
+    results.extend(recognizer.finish())
+
+    assert recognizer.notes == expected
+    assert recognizer.seconds == pytest.approx(10.0)
+    # The buffer only ever holds the overlap tail plus unprocessed audio
+    assert len(recognizer.buffer) <= recognizer.overlap_samples
+    assert [result["notes"] for result in results] == [len(notes) for notes in searches]
+
+def test_finish_transcribes_the_remainder(searches):
+    audio, expected = stream(290)
+    recognizer = StreamingRecognizer("unused", SAMPLE_RATE, chunk_seconds=2.0, overlap_seconds=0.5)
+
+    assert len(recognizer.feed(audio)) == 1
+    assert recognizer.finish()[0]["seconds"] == pytest.approx(2.9)
+    assert recognizer.notes == expected
+
+def test_becomes_confident_once_ranking_is_stable(searches):
+    audio, _ = stream(1000)
+    recognizer = StreamingRecognizer("unused", SAMPLE_RATE, chunk_seconds=2.0, overlap_seconds=0.5)
+
+    confident = [result["confident"] for result in recognizer.feed(audio)]
+    assert confident == [False] * (streaming.STREAM_STABLE_UPDATES - 1) + [True] * (6 - streaming.STREAM_STABLE_UPDATES)
+    assert recognizer.should_stop()
+    assert not recognizer.should_stop(stop_when_confident=False, max_seconds=60)
+
+def test_sample_rate_must_be_positive():
+    with pytest.raises(ValueError):
+        StreamingRecognizer("unused", 0)
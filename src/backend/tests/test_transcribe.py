@@ -0,0 +1,49 @@
+import io
+import numpy as np
+import pytest
+
+pytest.importorskip("basic_pitch")
+pytest.importorskip("librosa")
+
+from scipy.io import wavfile
+from routes.mic import transcribe
+from routes.mic.transcribe import (
+    TICKS_PER_SECOND, to_float_mono, decode_wav_bytes, decode_pcm_bytes, notes_from_buffer,
+)
+
+def test_ticks_match_basic_pitch_midi_files():
+    # 120 bpm at pretty_midi's 220 ticks per beat
+    assert TICKS_PER_SECOND == 440
+
+@pytest.mark.parametrize("samples, expected", [
+    (np.array([0, 16384, -32768], dtype=np.int16), [0, 0.5, -1]),
+    (np.array([128, 255, 0], dtype=np.uint8), [0, 127 / 128, -1]),
+    (np.array([[0.5, -0.5], [1.0, 0.0]], dtype=np.float64), [0, 0.5]),
+])
+def test_to_float_mono(samples, expected):
+    audio = to_float_mono(samples)
+    assert audio.dtype == np.float32
+    np.testing.assert_allclose(audio, expected, atol=1e-4)
+
+def test_decode_wav_and_pcm_bytes():
+    stereo = np.array([[1000, 3000], [-2000, -4000]], dtype=np.int16)
+    buffer = io.BytesIO()
+    wavfile.write(buffer, 16000, stereo)
+    audio, sample_rate = decode_wav_bytes(buffer.getvalue())
+    assert sample_rate == 16000
+    np.testing.assert_allclose(audio, [2000 / 32768, -3000 / 32768])
+
+    # A trailing half frame is dropped
+    pcm, sample_rate = decode_pcm_bytes(stereo.tobytes() + b"\x01", 8000, channels=2)
+    assert sample_rate == 8000
+    np.testing.assert_array_equal(pcm, audio)
+    with pytest.raises(ValueError):
+        decode_pcm_bytes(b"", 0)
+
+def test_notes_from_buffer(monkeypatch):
+    # Basic Pitch note events: (start s, end s, pitch, amplitude, bends), not in onset order
+    events = [(1.0, 1.5, 64, 0.8, None), (0.5, 0.9, 62, 0.7, None), (1.0, 1.2, 60, 0.9, None)]
+    monkeypatch.setattr(transcribe, "transcribe_buffer", lambda audio, sample_rate: (None, events))
+
+    assert notes_from_buffer(np.zeros(10), 22050) == [(220, 62), (440, 60), (440, 64)]
+    assert notes_from_buffer(np.zeros(10), 22050, max_notes=2, start_time=2.0) == [(1100, 62), (1320, 60)]
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+from routes.audio_index import FEATURE_DIM
+from routes.window_index import WindowIndex
+
+def unit(*entries):
+    """A FEATURE_DIM vector with the given (position, value) entries."""
+    vector = np.zeros(FEATURE_DIM, dtype=np.float32)
+    for position, value in entries:
+        vector[position] = value
+    return vector
+
+def window_with_similarity(cosine):
+    """Unit window whose cosine similarity with unit((0, 1)) is the given value."""
+    return unit((0, cosine), (1, np.sqrt(1 - cosine ** 2)))
+
+QUERY = unit((0, 1))
+
+@pytest.fixture
+def index():
+    index = WindowIndex([], np.zeros((0, FEATURE_DIM)), [], window_size=40, window_slide=8)
+    return index.add(["a.mid", "b.mid", "c.mid", "d.mid"], [
+        [window_with_similarity(s) for s in (0.1, 0.9, 0.5, 0.7)],
+        [window_with_similarity(s) for s in (0.8, 0.2)],
+        np.zeros((0, FEATURE_DIM)),  # too short for a single window
+        [window_with_similarity(0.95)],
+    ])
+
+def test_max_aggregate(index):
+    scores = index.song_scores(QUERY, aggregate="max")
+    np.testing.assert_allclose(scores, [0.9, 0.8, -np.inf, 0.95], rtol=1e-5)
+
+def test_topm_averages_best_windows_of_each_song(index):
+    scores = index.song_scores(QUERY, aggregate="topm", top_m=3)
+    # d has fewer than top_m windows and is averaged over the ones it has
+    np.testing.assert_allclose(scores, [(0.9 + 0.7 + 0.5) / 3, (0.8 + 0.2) / 2, -np.inf, 0.95], rtol=1e-5)
+
+def test_topm_uses_best_query_window(index):
+    query = [unit((1, 1)), QUERY]
+    scores = index.song_scores(query, aggregate="topm", top_m=2)
+    # Each database window takes its best match over both query windows
+    b = [max(s, np.sqrt(1 - s ** 2)) for s in (0.8, 0.2)]
+    assert scores[1] == pytest.approx(sum(b) / 2, rel=1e-5)
+
+def test_search_skips_songs_without_windows(index):
+    indices, scores = index.search(QUERY, 10, aggregate="topm", top_m=3)
+    assert [index.names[i] for i in indices] == ["d.mid", "a.mid", "b.mid"]
+    assert np.isfinite(scores).all()
+
+def test_remove_renumbers_songs(index):
+    index.remove(["a.mid"])
+    assert index.names == ["b.mid", "c.mid", "d.mid"]
+    assert index.song_ids.tolist() == [0, 0, 2]
+    np.testing.assert_allclose(index.song_scores(QUERY, aggregate="topm", top_m=3), [0.5, -np.inf, 0.95], rtol=1e-5)
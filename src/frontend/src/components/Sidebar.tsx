@@ -298,31 +298,50 @@ const MicrophoneModal: React.FC<MicModalProps> = ({ isOpen, onClose }) => {
       });
 
       if (response.ok) {
+        const { job_id } = await response.json();
         setIsRecording(true);
         setError(null);
-        console.log("Recording started...");
+        console.log("Recording started...", job_id);
+
+        try {
+          // Poll the recording job until it finishes (queued -> recording -> converting -> done)
+          const finishedStatuses = ["done", "failed", "cancelled"];
+          let status = "queued";
+          while (!finishedStatuses.includes(status)) {
+            await new Promise((resolve) => setTimeout(resolve, 1000));
+            const statusResponse = await fetch(`http://localhost:8000/api/recording-jobs/${job_id}`);
+            if (!statusResponse.ok) {
+              throw new Error("Failed to fetch recording status");
+            }
+            status = (await statusResponse.json()).status;
+            if (status === "converting") {
+              setIsRecording(false);
+              setIsProcessing(true);
+            }
+          }
 
-        setTimeout(async () => {
           setIsRecording(false);
           setIsProcessing(true);
+          if (status !== "done") {
+            throw new Error(`Recording ${status}`);
+          }
 
-          try {
-            const audioResponse = await fetch("http://localhost:8000/get-recorded-audio/");
+          const audioResponse = await fetch(`http://localhost:8000/api/recording-jobs/${job_id}/result`);
 
-            if (!audioResponse.ok) {
-              throw new Error("Failed to fetch recorded audio");
-            }
+          if (!audioResponse.ok) {
+            throw new Error("Failed to fetch recorded audio");
+          }
 
-            const audioBlob = await audioResponse.blob();
-            const audioFile = new File([audioBlob], "recorded_audio.mid", { type: "audio/mid" });
+          const audioBlob = await audioResponse.blob();
+          const audioFile = new File([audioBlob], "recorded_audio.mid", { type: "audio/mid" });
 
-            await fetchDataFromApi(audioFile);
-          } catch (error) {
-            console.error("Error fetching or processing audio:", error);
-            setError("Error during audio processing.");
-            setIsProcessing(false);
-          }
-        }, 30000);
+          await fetchDataFromApi(audioFile);
+        } catch (error) {
+          console.error("Error fetching or processing audio:", error);
+          setError("Error during audio processing.");
+          setIsRecording(false);
+          setIsProcessing(false);
+        }
       } else {
         console.error("Failed to start recording");
         setError("Failed to start recording");